@@ -0,0 +1,161 @@
+"""
+Benchmark of the graph queries on seeded random DAGs (see `random_dags`). For every kind of graph and size it times
+ - parse: parsing the model string
+ - construct: building the causal graph (including the path annotations)
+ - update_paths: recomputing all path annotations
+ - check_backdoor_criterion: checking the parents of the treatment as adjustment set
+ - get_adjustment_sets: listing the minimal adjustment sets, stopped after max_sets sets or the time budget
+ - get_backdoor_paths: enumerating all backdoor paths (exponential, so only up to max_path_nodes nodes)
+ - cytoscape, cytoscape_rerun: building the cytoscape elements for the first time and again without changes
+Every operation runs on a fresh graph and the fastest of the repeats is reported. The results are appended as json
+lines to the output file, one record per operation, tagged with the commit, so regressions can be tracked, e.g.
+    python benchmark.py --sizes 10 100 1000 10000 --output benchmark.jsonl
+"""
+import argparse
+import itertools
+import json
+import platform
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import random_dags
+import utils
+from causal_graph import CausalGraph, parse_model_string
+from identify.backdoor import check_backdoor_criterion, iter_adjustment_sets
+
+SIZES = (10, 100, 1000, 10000)
+
+
+@dataclass
+class BenchmarkResult:
+    """
+    The timing of one operation.
+    :param kind: the kind of random graph
+    :param n_nodes: the number of nodes
+    :param n_edges: the number of edges
+    :param seed: the seed of the graph
+    :param operation: the name of the operation
+    :param seconds: the fastest time of all repeats
+    :param repeats: the number of repeats
+    :param count: the number of results (adjustment sets, paths), if any
+    :param truncated: True, if the operation was stopped early
+    """
+    kind: str
+    n_nodes: int
+    n_edges: int
+    seed: int
+    operation: str
+    seconds: float
+    repeats: int
+    count: Optional[int] = None
+    truncated: bool = False
+
+
+def _time(operation: Callable[[Any], Any], setup: Callable[[], Any], repeats: int) -> Tuple[float, Any]:
+    best, result = float("inf"), None
+    for _ in range(repeats):
+        argument = setup()
+        start = time.perf_counter()
+        result = operation(argument)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def _collect(sets: Iterable[Any], max_sets: int, time_budget: float) -> Tuple[int, bool]:
+    deadline = time.perf_counter() + time_budget
+    count = 0
+    for _ in itertools.islice(sets, max_sets):
+        count += 1
+        if time.perf_counter() > deadline:
+            return count, True
+    return count, count == max_sets
+
+
+def iter_benchmarks(kinds: Iterable[str] = tuple(random_dags.GENERATORS), sizes: Iterable[int] = SIZES, seed: int = 0,
+        repeats: int = 3, max_sets: int = 100, time_budget: float = 10., max_path_nodes: int = 30) \
+        -> Iterator[BenchmarkResult]:
+    """
+    Time all operations, see the module documentation.
+    :param kinds: the kinds of random graphs
+    :param sizes: the numbers of nodes
+    :param seed: the seed of the graphs
+    :param repeats: the number of repeats of every operation
+    :param max_sets: the maximal number of adjustment sets listed
+    :param time_budget: the time in seconds after which the listing of adjustment sets is stopped
+    :param max_path_nodes: the maximal number of nodes of graphs, whose backdoor paths are enumerated
+    :return: a generator of results
+    """
+    for kind, n in itertools.product(kinds, sizes):
+        template = random_dags.random_model(kind, n, seed)
+        treatment, outcome = template.treatment, template.outcome
+        edges = sorted(template.edges)
+        lines = random_dags.get_model_lines(edges, treatment, outcome)
+
+        def construct() -> CausalGraph:
+            return CausalGraph(set(template.nodes), set(edges), treatment, outcome, set(), set())
+
+        def record(operation: str, seconds: float, count: Optional[int] = None, truncated: bool = False):
+            return BenchmarkResult(kind, n, len(edges), seed, operation, seconds, repeats, count, truncated)
+
+        yield record("parse", _time(parse_model_string, lambda: lines, repeats)[0])
+        yield record("construct", _time(lambda _: construct(), lambda: None, repeats)[0])
+        yield record("update_paths", _time(lambda m: m.update_paths(full=True), construct, repeats)[0])
+        if treatment is None:
+            continue  # no causal effect to identify
+
+        parents = set(template.graph.predecessors(treatment))
+        seconds, _ = _time(lambda m: check_backdoor_criterion(m, treatment, outcome, parents), construct, repeats)
+        yield record("check_backdoor_criterion", seconds)
+        seconds, (count, truncated) = _time(
+            lambda m: _collect(iter_adjustment_sets(m, treatment, outcome), max_sets, time_budget), construct, repeats)
+        yield record("get_adjustment_sets", seconds, count, truncated)
+        if n <= max_path_nodes:
+            seconds, paths = _time(lambda m: m.get_backdoor_paths(treatment, outcome), construct, repeats)
+            yield record("get_backdoor_paths", seconds, len(paths))
+
+        def serialized() -> CausalGraph:
+            model = construct()
+            utils.get_cytoscape_params_from_model(model)
+            return model
+
+        yield record("cytoscape", _time(utils.get_cytoscape_params_from_model, construct, repeats)[0])
+        yield record("cytoscape_rerun", _time(utils.get_cytoscape_params_from_model, serialized, repeats)[0])
+
+
+def _get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(args: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the graph queries on random DAGs")
+    kinds = list(random_dags.GENERATORS)
+    parser.add_argument("--kinds", nargs="+", default=kinds, choices=kinds)
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--max-sets", type=int, default=100)
+    parser.add_argument("--time-budget", type=float, default=10.)
+    parser.add_argument("--max-path-nodes", type=int, default=30)
+    parser.add_argument("--output", default="benchmark.jsonl", help="the json lines file the results are appended to")
+    args = parser.parse_args(args)
+
+    run = {"commit": _get_commit(), "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+           "python": platform.python_version()}
+    results = iter_benchmarks(args.kinds, args.sizes, args.seed, args.repeats, args.max_sets, args.time_budget,
+                              args.max_path_nodes)
+    with open(args.output, "a") as f:
+        for result in results:
+            f.write(json.dumps({**run, **asdict(result)}) + "\n")
+            f.flush()
+            print(f"{result.kind:>12} {result.n_nodes:>6} {result.operation:<25} {result.seconds * 1000:10.2f} ms",
+                  file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,14 +1,18 @@
 import re
+import threading
+import time
 from collections import Counter
-from dataclasses import dataclass
+from contextlib import contextmanager
+from dataclasses import dataclass, field
 from enum import IntFlag
-from functools import reduce
-from operator import ior
-from typing import Any, Dict, List, Optional, Set, Tuple, Union
+from typing import Any, Callable, Dict, FrozenSet, Hashable, Iterable, Iterator, List, Optional, Set, Tuple, Union
 from functools import lru_cache
 import networkx as nx
+import numpy as np
 
+import instrumentation
 import utils
+from graph_core import BitsetGraph
 
 
 class NodeAttribute(IntFlag):
@@ -20,18 +24,9 @@ class NodeAttribute(IntFlag):
 
     @classmethod
     def parse(cls, attr: str) -> "NodeAttribute":
-        attr = attr.lower()
-        if attr == "regular":
-            return cls.REGULAR
-        elif attr in ["treatment", "t"]:
-            return cls.TREATMENT
-        elif attr in ["outcome", "o"]:
-            return cls.OUTCOME
-        elif attr in ["adjusted", "a"]:
-            return cls.ADJUSTED
-        elif attr in ["unobserved", "u"]:
-            return cls.UNOBSERVED
-        else:
+        try:
+            return _ATTRIBUTE_NAMES[attr.lower()]
+        except KeyError:
             print(f"Can't parse node attribute: '{attr}'")
             # raise ValueError(f"Can't parse '{attr}'")
             return cls.REGULAR
@@ -43,6 +38,19 @@ class NodeAttribute(IntFlag):
             return self.name.lower()
 
 
+_ATTRIBUTE_NAMES = {
+    "regular": NodeAttribute.REGULAR,
+    "treatment": NodeAttribute.TREATMENT,
+    "t": NodeAttribute.TREATMENT,
+    "outcome": NodeAttribute.OUTCOME,
+    "o": NodeAttribute.OUTCOME,
+    "adjusted": NodeAttribute.ADJUSTED,
+    "a": NodeAttribute.ADJUSTED,
+    "unobserved": NodeAttribute.UNOBSERVED,
+    "u": NodeAttribute.UNOBSERVED,
+}
+
+
 @dataclass
 class Node:
     name: str
@@ -50,6 +58,93 @@ class Node:
     meta: Optional[Any] = None
 
 
+@dataclass(frozen=True)
+class ConditionalIndependence:
+    x: str
+    y: str
+    conditioning_set: FrozenSet[str] = frozenset()
+
+    def __str__(self) -> str:
+        if not self.conditioning_set:
+            return f"{self.x} ⟂ {self.y}"
+        return f"{self.x} ⟂ {self.y} | {', '.join(sorted(self.conditioning_set))}"
+
+
+class QueryCache:
+    """
+    Memoizes structural queries of a graph.
+    The ancestors and descendants of every node are cached individually and only dropped, if a mutation affects them.
+    All other query results belong to the structural version of the graph, which is increased by every mutation.
+    The cache can be shared by threads (see `identify.identify`): lookups and updates hold a lock, while results are
+    computed without it, so a result computed for an outdated version is discarded.
+    """
+    def __init__(self):
+        self.version = 0
+        self.ancestors: Dict[str, FrozenSet[str]] = {}
+        self.descendants: Dict[str, FrozenSet[str]] = {}
+        self.hits = 0
+        self.misses = 0
+        self._results: Dict[Hashable, Any] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        with self._lock:
+            try:
+                result = self._results[key]
+                self.hits += 1
+                return result
+            except KeyError:
+                self.misses += 1
+                version = self.version
+        result = compute()
+        with self._lock:
+            if self.version == version:
+                result = self._results.setdefault(key, result)
+        return result
+
+    def invalidate(self, changed_descendants: Iterable[str] = (), changed_ancestors: Iterable[str] = ()) -> None:
+        """
+        Start a new structural version.
+        :param changed_descendants: nodes whose descendants changed
+        :param changed_ancestors: nodes whose ancestors changed
+        """
+        with self._lock:
+            self.version += 1
+            self._results = {}
+            for node in changed_descendants:
+                self.descendants.pop(node, None)
+            for node in changed_ancestors:
+                self.ancestors.pop(node, None)
+
+
+@dataclass
+class GraphPatch:
+    """
+    A batch of changes of a causal graph, see `CausalGraph.apply_patch`.
+    Removals are applied before additions and role changes come last.
+    """
+    added_nodes: List[str] = field(default_factory=list)
+    added_edges: List[Tuple[str, str]] = field(default_factory=list)
+    removed_nodes: List[str] = field(default_factory=list)
+    removed_edges: List[Tuple[str, str]] = field(default_factory=list)
+    updated_nodes: List[Tuple[str, NodeAttribute]] = field(default_factory=list)
+
+    def add_node(self, node: str) -> None:
+        self.added_nodes.append(node)
+
+    def add_edge(self, source: str, target: str) -> None:
+        self.added_edges.append((source, target))
+
+    def remove_node(self, node: str) -> None:
+        self.removed_nodes.append(node)
+
+    def remove_edge(self, source: str, target: str) -> None:
+        self.removed_edges.append((source, target))
+
+    def update_node(self, node: str, attr: NodeAttribute) -> None:
+        self.updated_nodes.append((node, attr))
+
+
 @dataclass
 class CausalGraph:
     nodes: Set[str] = None
@@ -60,17 +155,33 @@ class CausalGraph:
     unobserved: Set[str] = None
     # compounds: Dict[Set[str]] = None
     _graph: nx.DiGraph = None
+    _causal_edges: Set[Tuple[str, str]] = None
+    _biasing_edges: Set[Tuple[str, str]] = None
+    _outdated_paths: Set[str] = None
+    # the states of the open backdoor trails, which are updated after changes (see `_get_biasing_edges`)
+    _trails: Optional["_TrailGraph"] = None
+    _cache: QueryCache = None
+    _core: BitsetGraph = None
+    # builds the networkx graph on first access, if the private state was restored by a loader
+    _graph_loader: Optional[Callable[[], nx.DiGraph]] = None
+    # the revision, in which every node and edge was added, removed or changed its attributes last
+    _revision: int = 0
+    _changes: Dict[Hashable, int] = field(default_factory=dict)
 
     def __post_init__(self):
-        self._build_graph()
+        # loaders (see `serialize.load_model`) pass in the complete private state restored from a file
+        if self._graph is None and self._graph_loader is None:
+            self._build_graph()
 
     def _build_graph(self):
         self._graph = nx.DiGraph()
+        self._cache = QueryCache()
 
         if self.nodes is not None:
             self._graph.add_nodes_from(self.nodes, observed=True, parent="all")
         if self.edges is not None:
             self._graph.add_edges_from(self.edges)
+        self._core = BitsetGraph(self._graph.nodes, self._graph.edges)
 
         # set node attributes
         node_attrs = {}
@@ -83,22 +194,118 @@ class CausalGraph:
         if self.unobserved is not None:
             node_attrs.update({n: {"observed": False} for n in self.unobserved})
         nx.set_node_attributes(self._graph, node_attrs)
-        self.update_paths()
+        self.update_paths(full=True)
 
     @property
-    def graph(self):
+    def graph(self) -> nx.DiGraph:
+        if self._graph is None:
+            self._graph = self._graph_loader()
+            self._graph_loader = None
         return self._graph
 
-    def update_paths(self):
-        causal_edges = [e for path in self.get_causal_paths(as_edge_list=True) for e in path]
-        biasing_edges = [e for path in self.get_biasing_paths(as_edge_list=True) for e in path]
+    @property
+    def core(self) -> BitsetGraph:
+        """The bitset representation of the graph for reachability queries."""
+        return self._core
+
+    def get_cached(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Memoize a result derived from the structure of the graph until the graph changes."""
+        return self._cache.get(key, compute)
+
+    @property
+    def version(self) -> int:
+        """The structural version of the graph, which changes with every added or removed node or edge."""
+        return self._cache.version
+
+    @property
+    def revision(self) -> int:
+        """The revision of the graph, which changes with every change of a node or edge, including its attributes."""
+        return self._revision
+
+    def get_changes(self, since: int) -> List[Hashable]:
+        """
+        Get the nodes and edges, which were added, removed or changed their attributes after a revision.
+        :param since: the previous revision
+        :return: the changed node names and (source, target) pairs
+        """
+        if since >= self._revision:
+            return []
+        return [key for key, revision in self._changes.items() if revision > since]
+
+    def _record_changes(self, keys: Iterable[Hashable]) -> None:
+        self._revision += 1
+        revision = self._revision
+        for key in keys:
+            self._changes[key] = revision
+
+    @instrumentation.instrument()
+    def update_paths(self, full: bool = False):
+        """
+        Update the 'causal' and 'biasing' flags of all edges, which lie on a causal path or an open backdoor path.
+        Only the annotations outdated by a change since the last update are recomputed and only the edges whose flag
+        changed are written back to the graph. The causal edges take linear time. The biasing edges are maintained
+        incrementally: after adding or removing edges and nodes or (un)adjusting nodes, only the trails around the
+        changed nodes are followed again (see `_get_biasing_edges`), while changing treatment or outcome recomputes them.
+        :param full: recompute both annotations and rewrite the flags of all edges
+        """
+        if full or self._outdated_paths is None:
+            self._outdated_paths = {"causal", "biasing"}
+            self._causal_edges = None
+            self._biasing_edges = None
+            self._trails = None
+
+        if "causal" in self._outdated_paths:
+            self._causal_edges = self._update_edge_flag("causal", self._causal_edges, self._get_causal_edges())
+        if "biasing" in self._outdated_paths:
+            self._biasing_edges = self._update_edge_flag("biasing", self._biasing_edges, self._get_biasing_edges())
+        self._outdated_paths.clear()
 
-        edge_attrs = {e: {
-            "causal": e in causal_edges,
-            "biasing": e in biasing_edges
-        } for e in self._graph.edges()}
+    def _update_edge_flag(self, flag: str, old_edges: Optional[Set[Tuple[str, str]]],
+            new_edges: Set[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        changed_edges = self.graph.edges() if old_edges is None else old_edges.symmetric_difference(new_edges)
+        nx.set_edge_attributes(self.graph, {e: {flag: e in new_edges} for e in changed_edges})
+        self._record_changes(changed_edges)
+        return new_edges
 
-        nx.set_edge_attributes(self._graph, edge_attrs)
+    def _invalidate_paths(self, *annotations: str, nodes: Optional[Iterable[str]] = None) -> None:
+        """
+        Mark path annotations as outdated.
+        :param annotations: the outdated annotations, defaults to all
+        :param nodes: the changed nodes, whose trails are followed again by the next update, all if None
+        """
+        if self._outdated_paths is None:
+            return
+        annotations = annotations or ("causal", "biasing")
+        self._outdated_paths.update(annotations)
+        if "biasing" in annotations and self._trails is not None:
+            if nodes is None:
+                self._trails = None
+            else:
+                self._trails.changed_nodes.update(nodes)
+
+    @instrumentation.instrument(items=len)
+    def _get_causal_edges(self) -> Set[Tuple[str, str]]:
+        if self.treatment is None or self.outcome is None:
+            return set()
+        # an edge is part of a causal path, iff its source is reachable from the treatment and
+        # the outcome is reachable from its target
+        from_treatment = self.get_descendants(self.treatment) | {self.treatment}
+        to_outcome = self.get_ancestors(self.outcome) | {self.outcome}
+        return set(self.graph.subgraph(from_treatment & to_outcome).edges())
+
+    @instrumentation.instrument(items=len)
+    def _get_biasing_edges(self) -> Set[Tuple[str, str]]:
+        if self.treatment is None or self.outcome is None:
+            self._trails = None
+            return set()
+        # an edge is biasing, iff one of its steps lies on an active trail from the treatment through a backdoor to
+        # the outcome, which doesn't revisit a node (i.e. on an open backdoor path)
+        trails = self._trails
+        if trails is None or (trails.treatment, trails.outcome) != (self.treatment, self.outcome):
+            self._trails = _TrailGraph(self.graph, self._core, self.treatment, self.outcome, self.adjusted)
+        else:
+            trails.update(self.adjusted)
+        return self._trails.get_biasing_edges()
 
     def get_node_attributes(self, node: str) -> NodeAttribute:
         if self.treatment == node:
@@ -113,12 +320,40 @@ class CausalGraph:
             return NodeAttribute.REGULAR
 
     def add_node(self, node_id: str) -> None:
-        self.nodes.add(node_id)
-        self._graph.add_node(node_id, observed=True)
+        self.add_nodes([node_id])
+
+    def add_nodes(self, nodes: Iterable[str]) -> None:
+        """Add all nodes, which aren't part of the graph yet."""
+        nodes = [n for n in dict.fromkeys(nodes) if n not in self.graph]
+        if not nodes:
+            return
+        self.nodes.update(nodes)
+        self.graph.add_nodes_from(nodes, observed=True)
+        self._record_changes(nodes)
+        for node in nodes:
+            self._core.add_node(node)
+        self._cache.invalidate()
 
     def add_edge(self, source: str, target: str) -> None:
-        self.edges.add((source, target))
-        self._graph.add_edge(source, target)
+        self.add_edges([(source, target)])
+
+    def add_edges(self, edges: Iterable[Tuple[str, str]]) -> None:
+        """
+        Add all edges (and their nodes), which aren't part of the graph yet.
+        The cached closures are invalidated once for all edges, the path annotations are only marked as outdated.
+        """
+        edges = [e for e in dict.fromkeys(edges) if not self.graph.has_edge(*e)]
+        if not edges:
+            return
+        self._invalidate_cache(edges)
+        new_nodes = [n for n in dict.fromkeys(n for e in edges for n in e) if n not in self.graph]
+        self.nodes.update(new_nodes)
+        self.graph.add_nodes_from(new_nodes, observed=True)
+        self.edges.update(edges)
+        self.graph.add_edges_from(edges, causal=False, biasing=False)
+        self._record_changes(new_nodes + edges)
+        self._core.add_edges(edges)
+        self._invalidate_paths(nodes=[n for e in edges for n in e])
 
     def update_node(self, node: str, attr: NodeAttribute) -> str:
         new_node_attrs = None
@@ -154,28 +389,146 @@ class CausalGraph:
                 self.unobserved.remove(node)
 
         if new_node_attrs is not None:
-            nx.set_node_attributes(self._graph, new_node_attrs)
+            nx.set_node_attributes(self.graph, new_node_attrs)
+            self._record_changes(new_node_attrs)
+        if attr in [NodeAttribute.TREATMENT, NodeAttribute.OUTCOME]:
+            self._invalidate_paths()
+        elif attr in [NodeAttribute.ADJUSTED, NodeAttribute.REGULAR]:
+            self._invalidate_paths("biasing", nodes=[node])
 
     def set_node_position(self, node: str, x, y) -> None:
         node_attr = {"position": {"x": x, "y": y}}
-        nx.set_node_attributes(self._graph, {node: node_attr})
+        nx.set_node_attributes(self.graph, {node: node_attr})
+        self._record_changes([node])
 
     def delete_node(self, node_id: str) -> None:
-        if self.treatment == node_id:
+        self.remove_nodes([node_id])
+
+    def remove_nodes(self, nodes: Iterable[str]) -> None:
+        """
+        Remove the nodes together with their edges and roles.
+        Only the edges incident to the nodes are touched and the cached closures are invalidated once for all nodes.
+        :raises KeyError: if a node isn't part of the graph
+        """
+        nodes = set(nodes)
+        missing = [n for n in nodes if n not in self.graph]
+        if missing:
+            raise KeyError(f"Unknown nodes {', '.join(sorted(missing))}")
+        if self.treatment in nodes:
             self.treatment = None
-        if self.outcome == node_id:
+        if self.outcome in nodes:
             self.outcome = None
-        if node_id in self.adjusted:
-            self.adjusted.remove(node_id)
-        if node_id in self.unobserved:
-            self.unobserved.remove(node_id)
-        self.nodes.remove(node_id)
-        self.edges = {(s, t) for s, t in self.edges if s != node_id and t != node_id}
-        self._graph.remove_node(node_id)
+        for role in (self.adjusted, self.unobserved):
+            if role is not None:
+                role.difference_update(nodes)
+        self._invalidate_cache([(n, n) for n in nodes])
+        self.nodes.difference_update(nodes)
+        incident_edges = list(self.graph.in_edges(nodes)) + list(self.graph.out_edges(nodes))
+        self.edges.difference_update(incident_edges)
+        self.graph.remove_nodes_from(nodes)
+        self._record_changes(list(nodes) + incident_edges)
+        self._core.remove_nodes(nodes)
+        self._invalidate_paths(nodes=[n for e in incident_edges for n in e] + list(nodes))
 
     def delete_edge(self, source: str, target: str) -> None:
-        self.edges.remove((source, target))
-        self._graph.remove_edge(source, target)
+        self.remove_edges([(source, target)])
+
+    def remove_edges(self, edges: Iterable[Tuple[str, str]]) -> None:
+        """
+        Remove the edges, invalidating the cached closures once for all of them.
+        :raises KeyError: if an edge isn't part of the graph
+        """
+        edges = list(dict.fromkeys(edges))
+        missing = [e for e in edges if not self.graph.has_edge(*e)]
+        if missing:
+            raise KeyError(f"Unknown edges {', '.join(f'{s}->{t}' for s, t in missing)}")
+        if not edges:
+            return
+        self._invalidate_cache(edges)
+        self.edges.difference_update(edges)
+        self.graph.remove_edges_from(edges)
+        self._record_changes(edges)
+        self._core.remove_edges(edges)
+        self._invalidate_paths(nodes=[n for e in edges for n in e])
+
+    def apply_patch(self, patch: GraphPatch) -> None:
+        """
+        Apply a batch of changes: first the removed edges and nodes, then the added nodes and edges, then the role
+        changes. The path annotations are recomputed once at the end.
+        The patch is validated before anything is changed, so a failed patch leaves the graph untouched.
+        :param patch: the changes
+        :raises KeyError: if a removed node or edge isn't part of the graph or an updated node isn't part of the patched
+            graph
+        :raises ValueError: if the added edges create a cycle
+        """
+        missing_nodes = [n for n in dict.fromkeys(patch.removed_nodes) if n not in self.graph]
+        missing_edges = [e for e in dict.fromkeys(patch.removed_edges) if not self.graph.has_edge(*e)]
+        removed_nodes = set(patch.removed_nodes)
+        added_nodes = set(patch.added_nodes) | {n for e in patch.added_edges for n in e}
+        missing_nodes += [n for n in dict.fromkeys(n for n, _ in patch.updated_nodes)
+                          if n not in added_nodes and (n not in self.graph or n in removed_nodes)]
+        if missing_nodes or missing_edges:
+            missing = missing_nodes + [f"{s}->{t}" for s, t in missing_edges]
+            raise KeyError(f"Unknown nodes or edges {', '.join(missing)}, the patch isn't applied")
+        cyclic_edges = self._get_cyclic_edges(patch)
+        if cyclic_edges:
+            cyclic = ", ".join(f"{s}->{t}" for s, t in cyclic_edges)
+            raise ValueError(f"The edges {cyclic} would create a cycle, the patch isn't applied")
+        if patch.removed_edges:
+            self.remove_edges(patch.removed_edges)
+        if patch.removed_nodes:
+            self.remove_nodes(patch.removed_nodes)
+        self.add_nodes(patch.added_nodes)
+        self.add_edges(patch.added_edges)
+        for node, attr in patch.updated_nodes:
+            self.update_node(node, attr)
+        self.update_paths()
+
+    def _get_cyclic_edges(self, patch: GraphPatch) -> List[Tuple[str, str]]:
+        # an added edge closes a cycle if its source is reachable from its target in the patched graph, removals can't
+        # create a cycle, so only the added edges are checked
+        if not patch.added_edges:
+            return []
+        kept = nx.restricted_view(self.graph, patch.removed_nodes, patch.removed_edges)
+        added: Dict[str, List[str]] = {}
+        for s, t in patch.added_edges:
+            added.setdefault(s, []).append(t)
+        cyclic = []
+        for source, target in dict.fromkeys(patch.added_edges):
+            visited, stack = {target}, [target]
+            while stack and source not in visited:
+                node = stack.pop()
+                for successor in [*(kept.successors(node) if node in kept else ()), *added.get(node, ())]:
+                    if successor not in visited:
+                        visited.add(successor)
+                        stack.append(successor)
+            if source in visited:
+                cyclic.append((source, target))
+        return cyclic
+
+    @contextmanager
+    def transaction(self) -> Iterator[GraphPatch]:
+        """
+        Collect changes in a patch, which is applied when the block is left without an exception (otherwise all changes
+        are discarded). The graph itself doesn't change within the block, e.g.
+            with model.transaction() as patch:
+                patch.add_edge("a", "b")
+                patch.remove_node("c")
+        :return: the patch collecting the changes
+        """
+        patch = GraphPatch()
+        yield patch
+        self.apply_patch(patch)
+
+    def _invalidate_cache(self, edges: List[Tuple[str, str]]) -> None:
+        # adding or removing the edges source -> target changes the descendants of the sources and their ancestors
+        # as well as the ancestors of the targets and their descendants; all other closures stay valid
+        core = self._core
+        sources = {s for s, _ in edges}
+        targets = {t for _, t in edges}
+        changed_descendants = sources | core.nodes(core.ancestors(core.mask(sources, ignore_missing=True)))
+        changed_ancestors = targets | core.nodes(core.descendants(core.mask(targets, ignore_missing=True)))
+        self._cache.invalidate(changed_descendants, changed_ancestors)
 
     def as_string(self) -> str:
         edges = [f"{s}[{str(self.get_node_attributes(s))}]->{t}[{str(self.get_node_attributes(t))}]" for s, t in
@@ -185,30 +538,45 @@ class CausalGraph:
     def get_causal_paths(self, as_edge_list: bool = False) -> List[List[Tuple]]:
         if self.treatment is None or self.outcome is None:
             return []
+        return self._cache.get(("causal_paths", self.treatment, self.outcome, as_edge_list),
+                               lambda: self._get_causal_paths(as_edge_list))
 
+    @instrumentation.instrument(items=len)
+    def _get_causal_paths(self, as_edge_list: bool = False) -> List[List[Tuple]]:
         if as_edge_list:
-            paths = nx.all_simple_edge_paths(self._graph, self.treatment, self.outcome)
+            paths = nx.all_simple_edge_paths(self.graph, self.treatment, self.outcome)
         else:
-            paths = nx.all_simple_paths(self._graph, self.treatment, self.outcome)
+            paths = nx.all_simple_paths(self.graph, self.treatment, self.outcome)
         return list(paths)
 
     def get_biasing_paths(self, as_edge_list: bool = True) -> List[List[Tuple]]:
         if self.treatment is None or self.outcome is None:
             return []
-        backdoor_paths = self.get_backdoor_paths(self.treatment, self.outcome, as_edge_list=True)
-        biasing_paths = [path for path in backdoor_paths if not self.is_path_blocked(path, self.adjusted)]
-        if not as_edge_list:
-            biasing_paths = [utils.edge_path_to_node_path(p) for p in biasing_paths]
-        return biasing_paths
+        if self.d_separated(self.treatment, self.outcome, self.adjusted, backdoor=True):
+            return []  # every backdoor path is blocked, there is no need to enumerate them
+
+        def compute():
+            backdoor_paths = self.get_backdoor_paths(self.treatment, self.outcome, as_edge_list=True)
+            biasing_paths = [path for path in backdoor_paths if not self.is_path_blocked(path, self.adjusted)]
+            if not as_edge_list:
+                biasing_paths = [utils.edge_path_to_node_path(p) for p in biasing_paths]
+            return biasing_paths
+        key = ("biasing_paths", self.treatment, self.outcome, frozenset(self.adjusted or ()), as_edge_list)
+        return self._cache.get(key, compute)
 
     def get_backdoor_paths(self, source: str, target: str, as_edge_list: bool = False):
-        undirected_graph = self._graph.to_undirected()
+        return self._cache.get(("backdoor_paths", source, target, as_edge_list),
+                               lambda: self._get_backdoor_paths(source, target, as_edge_list))
+
+    @instrumentation.instrument(items=len)
+    def _get_backdoor_paths(self, source: str, target: str, as_edge_list: bool = False):
+        undirected_graph = self.get_undirected_graph()
         # by definition a backdoor path is any path to the target node, which starts
         # with an edge pointing to the source node (i.e. back door)
         backdoor_paths = [
             pth
             for pth in nx.all_simple_paths(undirected_graph, source=source, target=target)
-            if self._graph.has_edge(pth[1], pth[0])]
+            if self.graph.has_edge(pth[1], pth[0])]
 
         if as_edge_list:
             backdoor_edge_paths = []
@@ -217,7 +585,7 @@ class CausalGraph:
             for path in backdoor_paths:
                 fixed_path = []
                 for s, t in zip(path, path[1:]):
-                    fixed_path.append((s, t) if self._graph.has_edge(s, t) else (t, s))
+                    fixed_path.append((s, t) if self.graph.has_edge(s, t) else (t, s))
                 backdoor_edge_paths.append(fixed_path)
             backdoor_paths = backdoor_edge_paths
         return backdoor_paths
@@ -225,42 +593,720 @@ class CausalGraph:
     def is_path_blocked(self, path: List[Tuple], conditioning_set: Optional[Set] = None) -> bool:
         # rule 1 (unconditional separation): is there no collider
         target_counts = Counter([target for src, target in path])
-        path_nodes = set([node for edge in path for node in edge])
         colliders = {node for node, c in target_counts.items() if c > 1}
         if conditioning_set is None or len(conditioning_set) == 0:
             return len(colliders) > 0
 
-        # rule 2 (blocking by conditioning): is a variable on the path conditioned on
-        # only variables on the path are valid blockers
-        blocking_nodes = conditioning_set.union(colliders).intersection(path_nodes)
+        # rule 2 (blocking by conditioning): is a non-collider on the path conditioned on
+        # the end points of the path are the only nodes, which are part of a single edge
+        node_counts = Counter([node for edge in path for node in edge])
+        inner_nodes = {node for node, c in node_counts.items() if c > 1}
+        if not inner_nodes.difference(colliders).isdisjoint(conditioning_set):
+            return True
 
-        # rule 3 (conditioning on colliders): paths blocked by colliders
-        # which are conditioned on (or its descendants) are 'open'
-        collider_descendants = {n: nx.descendants(self._graph, n) for n in colliders}
-        descendants = reduce(set.union, collider_descendants.values(), set())
+        # rule 3 (conditioning on colliders): colliders which are conditioned on
+        # (or one of its descendants) are 'open', all others block the path
+        return any(c not in conditioning_set and self.get_descendants(c).isdisjoint(conditioning_set)
+                   for c in colliders)
 
-        defused_colliders = colliders.union(descendants).intersection(conditioning_set)
-        blocking_nodes = blocking_nodes.difference(defused_colliders)
+    @instrumentation.instrument()
+    def d_separated(self, x: Union[str, Set[str]], y: Union[str, Set[str]],
+            z: Optional[Set[str]] = None, backdoor: bool = False) -> bool:
+        """
+        Check if the nodes x and y are d-separated by the conditioning set z.
+        Instead of enumerating all paths between x and y, the nodes reachable from x via an active trail are
+        collected (Bayes-ball algorithm), which takes linear time in the size of the graph.
+        :param x: a node or a set of nodes
+        :param y: a node or a set of nodes
+        :param z: the conditioning set
+        :param backdoor: only consider paths, which start with an edge pointing into x (i.e. backdoor paths)
+        :return: True if every path between x and y is blocked by z
+        """
+        x = frozenset([x]) if isinstance(x, str) else frozenset(x)
+        y = frozenset([y]) if isinstance(y, str) else frozenset(y)
+        z = frozenset(z or ())
+        return self._cache.get(("d_separated", x, y, z, backdoor),
+                               lambda: self.get_d_connected_nodes(x, z, backdoor=backdoor).isdisjoint(y))
 
-        return len(blocking_nodes) > 0
+    def d_separated_many(self, queries: Iterable[Tuple], backdoor: bool = False,
+            profile: bool = False) -> Union[np.ndarray, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Check many d-separation statements (x ⟂ y | z) at once.
+        Queries with the same conditioning set share its ancestors (i.e. the open colliders) and queries with the same
+        x and z share the set of nodes d-connected to x, so testing another y is a single bitwise and.
+        :param queries: tuples of (x, y) or (x, y, z), where x and y are a node or a set of nodes and z is a set of nodes
+        :param backdoor: only consider paths, which start with an edge pointing into x (i.e. backdoor paths)
+        :param profile: additionally return the time spent on every query in seconds
+        :return: a boolean array, which is True for every query whose x and y are d-separated by z
+            (and the array of timings, if profiling is enabled)
+        """
+        queries = list(queries)
+        separated = np.zeros(len(queries), dtype=bool)
+        timings = np.zeros(len(queries)) if profile else None
+        open_colliders = {}
+        d_connected = {}
+
+        for i, (x, y, *z) in enumerate(queries):
+            start = time.perf_counter() if profile else 0.
+            x_mask, y_mask = self._get_node_mask(x), self._get_node_mask(y)
+            z_mask = self._core.mask(z[0] or (), ignore_missing=True) if z else 0
+            reachable = d_connected.get((x_mask, z_mask))
+            if reachable is None:
+                # without backdoors, the open colliders only depend on the conditioning set
+                ignored_parents = x_mask if backdoor else 0
+                colliders = open_colliders.get((z_mask, ignored_parents))
+                if colliders is None:
+                    colliders = open_colliders[(z_mask, ignored_parents)] = \
+                        self._core.get_open_colliders(z_mask, ignored_parents)
+                reachable = d_connected[(x_mask, z_mask)] = \
+                    self._core.d_connected(x_mask, z_mask, backdoor=backdoor, open_colliders=colliders)
+            separated[i] = not reachable & y_mask
+            if profile:
+                timings[i] = time.perf_counter() - start
+
+        if profile:
+            return separated, timings
+        return separated
+
+    def _get_node_mask(self, nodes: Union[str, Iterable[str]]) -> int:
+        nodes = [nodes] if isinstance(nodes, str) else nodes
+        for node in nodes:
+            if node not in self._core:
+                raise nx.NodeNotFound(f"Node '{node}' is not part of the graph")
+        return self._core.mask(nodes)
+
+    @instrumentation.instrument(items=len)
+    def get_d_connected_nodes(self, sources: Set[str], conditioning_set: Optional[Set[str]] = None,
+            backdoor: bool = False) -> Set[str]:
+        """
+        Get all nodes which are connected to the source nodes by at least one path that isn't blocked by the
+        conditioning set (Koller & Friedman, 2009, Algorithm 3.1).
+        :param sources: the nodes from which the active trails start
+        :param conditioning_set: the nodes conditioned on
+        :param backdoor: ignore the outgoing edges of the source nodes, so only backdoor paths are followed
+        :return: the d-connected nodes (without nodes of the conditioning set)
+        """
+        # the traversal runs on the bitset representation of the graph
+        source_mask = self._get_node_mask(sources)
+        conditioning_mask = self._core.mask(conditioning_set or (), ignore_missing=True)
+        return self._core.nodes(self._core.d_connected(source_mask, conditioning_mask, backdoor=backdoor))
+
+    def get_descendants(self, node: str) -> FrozenSet[str]:
+        descendants = self._cache.descendants.get(node)
+        if descendants is None:
+            # only the computation is timed, the lookup is too frequent and cheap to be instrumented
+            with instrumentation.timer("causal_graph.CausalGraph.get_descendants"):
+                descendants_mask = self._core.get_descendants(self._get_node_id(node))
+                descendants = self._cache.descendants[node] = frozenset(self._core.nodes(descendants_mask))
+        return descendants
+
+    def get_ancestors(self, node: str) -> FrozenSet[str]:
+        ancestors = self._cache.ancestors.get(node)
+        if ancestors is None:
+            # only the computation is timed, the lookup is too frequent and cheap to be instrumented
+            with instrumentation.timer("causal_graph.CausalGraph.get_ancestors"):
+                ancestors_mask = self._core.get_ancestors(self._get_node_id(node))
+                ancestors = self._cache.ancestors[node] = frozenset(self._core.nodes(ancestors_mask))
+        return ancestors
+
+    def get_ancestral_set(self, nodes: Iterable[str], ignore_outgoing: Iterable[str] = ()) -> Set[str]:
+        """
+        Get the given nodes together with all their ancestors.
+        :param nodes: the nodes
+        :param ignore_outgoing: the outgoing edges of these nodes are ignored (e.g. the treatment for backdoor graphs)
+        :return: the ancestral set
+        """
+        mask = self._core.mask(nodes)
+        return self._core.nodes(mask | self._core.ancestors(mask, ignored_parents=self._core.mask(ignore_outgoing)))
+
+    def _get_node_id(self, node: str) -> int:
+        try:
+            return self._core.ids[node]
+        except KeyError:
+            raise nx.NetworkXError(f"The node {node} is not in the digraph.")
+
+    def get_undirected_graph(self) -> nx.Graph:
+        """Get an undirected copy of the graph, which must not be modified."""
+        return self._cache.get("undirected_graph", self._to_undirected)
+
+    @instrumentation.instrument()
+    def _to_undirected(self) -> nx.Graph:
+        return self.graph.to_undirected()
+
+    def get_topological_order(self) -> List[str]:
+        return self._cache.get("topological_order", lambda: list(nx.lexicographical_topological_sort(self.graph)))
+
+    @instrumentation.instrument()
+    def implied_independencies(self) -> Iterator[ConditionalIndependence]:
+        """
+        Stream a basis of the conditional independencies between observed nodes implied by the graph.
+        Every node is independent of each non-adjacent non-descendant given its parents (local Markov property), so
+        there is one statement per missing edge, which takes O(1) per pair instead of searching over node triples.
+        If a parent is unobserved, the observed ancestors of both nodes are used as conditioning set instead,
+        which separates the nodes if any set of observed nodes does (van der Zander et al., 2019).
+        :return: a generator of conditional independencies
+        """
+        unobserved = self.unobserved or set()
+        preceding_nodes = []
+        for node in self.get_topological_order():
+            if node in unobserved:
+                continue
+            parents = set(self.graph.predecessors(node))
+            children = set(self.graph.successors(node))
+            for other in preceding_nodes:
+                if other in parents or other in children:
+                    continue
+                # the other node precedes the node in topological order and therefore isn't a descendant
+                if parents.isdisjoint(unobserved):
+                    yield ConditionalIndependence(node, other, frozenset(parents))
+                else:
+                    conditioning_set = self.get_ancestral_set({node, other}) - unobserved - {node, other}
+                    if self.d_separated(node, other, conditioning_set):
+                        yield ConditionalIndependence(node, other, frozenset(conditioning_set))
+            preceding_nodes.append(node)
 
     def get_post_treatment_nodes(self):
-        return nx.descendants(self._graph, self.treatment)
+        return self.get_descendants(self.treatment)
 
     def get_unobserved_nodes(self):
         return self.unobserved
 
 
+def _get_trail_edges(trail: List[Tuple]) -> Iterator[Tuple[str, str]]:
+    for (node, _, _), (next_node, up, _) in zip(trail, trail[1:]):
+        yield (next_node, node) if up else (node, next_node)
+
+
+def _get_state_edge(state: Tuple) -> Tuple[str, str]:
+    # the edge, over which a state was entered
+    node, up, previous = state
+    return (node, previous) if up else (previous, node)
+
+
+class _SearchLimitReached(Exception):
+    pass
+
+
+class _ReachedStates:
+    """
+    The states reached from a set of roots in a graph of states, which is kept up to date, while steps are added to and
+    removed from the graph. Every reached state has a parent in a spanning tree, so removing a step only affects the
+    states below its target in the tree: they are reattached to other reached states, if possible.
+    :param successors: the states following a state, which are computed when the state is reached
+    :param predecessors: the states preceding a state
+    """
+    def __init__(self, successors: Callable[[Tuple], Iterable[Tuple]],
+            predecessors: Callable[[Tuple], Iterable[Tuple]]):
+        self.successors = successors
+        self.predecessors = predecessors
+        self.parent: Dict[Tuple, Optional[Tuple]] = {}
+        # the number of steps from a root in the tree, which is the distance, unless the tree was repaired
+        self.depth: Dict[Tuple, int] = {}
+        self._children: Dict[Tuple, Set[Tuple]] = {}
+
+    def __contains__(self, state: Tuple) -> bool:
+        return state in self.parent
+
+    def add_roots(self, roots: Iterable[Tuple]) -> List[Tuple]:
+        """Reach the roots and all states reachable from them, returning the newly reached states."""
+        roots = [r for r in roots if r not in self.parent]
+        for root in roots:
+            self._attach(root, None)
+        return self._extend(roots)
+
+    def add_steps(self, steps: Iterable[Tuple[Tuple, Tuple]]) -> List[Tuple]:
+        """Follow new steps from reached states, returning the newly reached states."""
+        targets = []
+        for state, next_state in steps:
+            if state in self.parent and next_state not in self.parent:
+                self._attach(next_state, state)
+                targets.append(next_state)
+        return self._extend(targets)
+
+    def remove_steps(self, steps: Iterable[Tuple[Tuple, Tuple]], states: Iterable[Tuple] = ()) -> List[Tuple]:
+        """
+        Update the reached states after steps and states were removed from the graph.
+        :return: the states, which aren't reached anymore
+        """
+        removed = set(states)
+        orphans = set()
+        to_visit = [t for s, t in steps if t in self.parent and self.parent[t] == s]
+        to_visit.extend(s for s in removed if s in self.parent)
+        while to_visit:
+            state = to_visit.pop()
+            if state not in orphans:
+                orphans.add(state)
+                to_visit.extend(self._children.get(state, ()))
+        for state in orphans:
+            parent = self.parent.pop(state)
+            del self.depth[state]
+            self._children.pop(state, None)
+            if parent is not None and parent not in orphans:
+                self._children[parent].discard(state)
+
+        reattached = []
+        for state in orphans - removed:
+            parent = next((p for p in self.predecessors(state) if p in self.parent), None)
+            if parent is not None:
+                self._attach(state, parent)
+                reattached.append(state)
+        self._extend(reattached)
+        return [s for s in orphans if s not in self.parent]
+
+    def _attach(self, state: Tuple, parent: Optional[Tuple]) -> None:
+        self.parent[state] = parent
+        if parent is None:
+            self.depth[state] = 0
+        else:
+            self.depth[state] = self.depth[parent] + 1
+            self._children.setdefault(parent, set()).add(state)
+
+    def _extend(self, states: List[Tuple]) -> List[Tuple]:
+        # breadth first search from the given, reached states
+        reached = list(states)
+        for state in reached:
+            for next_state in self.successors(state):
+                if next_state not in self.parent:
+                    self._attach(next_state, state)
+                    reached.append(next_state)
+        return reached
+
+
+class _TrailGraph:
+    """
+    The graph of the states of the active trails from the treatment through a backdoor, in which every edge on an open
+    backdoor path to the outcome is certified by a trail, which doesn't revisit a node.
+    A state is a tuple of a node, a flag if the node was reached from one of its children ('up') or from one of its
+    parents, and the previous node, as a trail never returns over the edge it came from.
+
+    The states reached from the treatment and the states, from which the outcome is reached, are kept across changes
+    of the graph (see `update`): only the steps from the states at changed nodes are recomputed and only the trails
+    certifying an edge, which pass a changed node, are checked again. An edge is a candidate, if a step over it
+    connects both sets of states. The shortest trails are tried first, as they rarely overlap. Otherwise a step is
+    excluded, if a node lies on every trail to the step as well as on every trail from the step to the outcome
+    (dominators), before the trails are searched exhaustively. The exhaustive search is limited (see
+    `MAX_SEARCH_STEPS`): an edge, for which it doesn't finish, is treated as biasing.
+    :param graph: the graph, which is read at every update
+    :param core: the bitset representation of the graph
+    :param treatment: the treatment node
+    :param outcome: the outcome node
+    :param adjusted: the adjusted nodes
+    """
+    MAX_SEARCH_STEPS = 100_000
+
+    def __init__(self, graph: nx.DiGraph, core: BitsetGraph, treatment: str, outcome: str, adjusted: Set[str]):
+        self.graph = graph
+        self.core = core
+        self.treatment = treatment
+        self.outcome = outcome
+        self.start = (treatment, True, None)
+        # the nodes changed since the last update
+        self.changed_nodes: Set[str] = set()
+        self.conditioning_set, self.open_colliders = self._get_conditioning_set(adjusted)
+        self.next_states: Dict[Tuple, List[Tuple]] = {}
+        self.previous_states: Dict[Tuple, Set[Tuple]] = {}
+        self.states_by_node: Dict[str, Set[Tuple]] = {}
+        self.from_start = _ReachedStates(self._expand, self.previous_states.__getitem__)
+        self.to_outcome = _ReachedStates(self.previous_states.__getitem__, self.next_states.__getitem__)
+        # the states reached from both sides by the edge they were entered over, i.e. the candidate edges
+        self.candidates: Dict[Tuple[str, str], Set[Tuple]] = {}
+        # the certified edges by the id of their trail, the edges without such a trail and the undecided edges
+        self.certified: Dict[Tuple[str, str], int] = {}
+        self.refuted: Set[Tuple[str, str]] = set()
+        self.undecided: Set[Tuple[str, str]] = set()
+        self._trails: Dict[int, List[Tuple]] = {}
+        self._trails_by_node: Dict[str, Set[int]] = {}
+        self._next_trail_id = 0
+        self._dominators = None
+
+        self.from_start.add_roots([self.start])
+        self._add_candidates(self.to_outcome.add_roots(self.states_by_node.get(outcome, ())))
+        self._certify(list(self.candidates))
+
+    def get_biasing_edges(self) -> Set[Tuple[str, str]]:
+        return set(self.certified) | self.undecided
+
+    def update(self, adjusted: Set[str]) -> None:
+        """Update the states and the certified edges after the nodes in `changed_nodes` or the adjusted nodes changed."""
+        conditioning_set, open_colliders = self._get_conditioning_set(adjusted)
+        changed = self.changed_nodes | (conditioning_set ^ self.conditioning_set) | \
+            (open_colliders ^ self.open_colliders)
+        self.changed_nodes = set()
+        self.conditioning_set, self.open_colliders = conditioning_set, open_colliders
+        self._dominators = None
+
+        # the steps from the states at changed nodes follow the new graph: the removed steps are applied first
+        removed_steps, added_steps = [], []
+        for node in changed:
+            for state in self.states_by_node.get(node, ()):
+                old_states = self.next_states[state]
+                new_states = self._get_next_states(state)
+                if new_states != old_states:
+                    removed_steps.extend((state, s) for s in old_states if s not in new_states)
+                    added_steps.extend((state, s) for s in new_states if s not in old_states)
+                    self.next_states[state] = [s for s in old_states if s in new_states]
+        for state, next_state in removed_steps:
+            self.previous_states[next_state].discard(state)
+        unreached = self.from_start.remove_steps(removed_steps)
+        self._remove_states(unreached)
+        self._remove_candidates(self.to_outcome.remove_steps([(t, s) for s, t in removed_steps], unreached))
+
+        added_steps = [(s, t) for s, t in added_steps if s in self.from_start]
+        for state, next_state in added_steps:
+            self.next_states[state].append(next_state)
+            self.previous_states.setdefault(next_state, set()).add(state)
+        reached = self.from_start.add_steps(added_steps)
+        added_steps.extend((s, t) for s in reached for t in self.next_states[s])
+        new_candidates = self.to_outcome.add_roots(s for s in reached if s[0] == self.outcome)
+        new_candidates += self.to_outcome.add_steps([(t, s) for s, t in added_steps])
+        self._add_candidates(new_candidates)
+
+        # the trails passing a changed node might be broken; a new trail to the outcome uses a new step
+        for trail_id in set().union(*(self._trails_by_node.get(n, ()) for n in changed)):
+            trail = self._trails[trail_id]
+            if not all(t in self.next_states.get(s, ()) for s, t in zip(trail, trail[1:])):
+                self._remove_trail(trail_id)
+        if any(t in self.to_outcome for _, t in added_steps):
+            self.refuted.clear()
+            self.undecided.clear()
+        self.refuted.intersection_update(self.candidates)
+        self.undecided.intersection_update(self.candidates)
+        self._certify([e for e in self.candidates
+                       if e not in self.certified and e not in self.refuted and e not in self.undecided])
+
+    def find_simple_trail(self, steps: List[Tuple[Tuple, Tuple]]) -> Optional[List[Tuple]]:
+        """
+        Find a trail from the start to the outcome through one of the steps, which doesn't revisit a node.
+        :return: the states of the trail or None, if there is none
+        :raises _SearchLimitReached: if the exhaustive search takes more than MAX_SEARCH_STEPS steps
+        """
+        for state, next_state in steps:
+            head = _follow(self.from_start.parent, state)[::-1]
+            tail = _follow(self.to_outcome.parent, next_state)
+            # the shortest trails, otherwise the shortest trail avoiding the nodes of the other part
+            trail = head + tail
+            if not _is_simple(trail):
+                trail = head + self._find_tail(next_state, head)
+            if not self._is_trail(trail):
+                trail = self._find_head(state, tail) + tail
+            if self._is_trail(trail):
+                return trail
+        steps = [step for step in steps if not self._is_blocked(*step)]
+        return self._search(set(steps)) if steps else None
+
+    def _get_conditioning_set(self, adjusted: Set[str]) -> Tuple[Set[str], Set[str]]:
+        # a collider is only open, if it is conditioned on or one of its descendants is
+        conditioning_set = {n for n in adjusted or () if n in self.core}
+        open_colliders = self.core.nodes(self.core.get_open_colliders(self.core.mask(conditioning_set)))
+        return conditioning_set, open_colliders
+
+    def _get_next_states(self, state: Tuple) -> List[Tuple]:
+        node, up, previous = state
+        if node == self.outcome or node not in self.graph:
+            return []
+        next_states = []
+        if node not in self.conditioning_set:
+            if up:
+                next_states.extend((p, True, node) for p in self.graph.predecessors(node))
+            if node != self.treatment:
+                next_states.extend((c, False, node) for c in self.graph.successors(node))
+        if not up and node in self.open_colliders:
+            next_states.extend((p, True, node) for p in self.graph.predecessors(node))
+        # a backdoor path never returns to its start
+        return [s for s in next_states if s[0] != previous and s[0] != self.treatment]
+
+    def _expand(self, state: Tuple) -> List[Tuple]:
+        next_states = self.next_states.get(state)
+        if next_states is None:
+            next_states = self.next_states[state] = self._get_next_states(state)
+            self.states_by_node.setdefault(state[0], set()).add(state)
+            self.previous_states.setdefault(state, set())
+            for next_state in next_states:
+                self.previous_states.setdefault(next_state, set()).add(state)
+        return next_states
+
+    def _remove_states(self, states: List[Tuple]) -> None:
+        for state in states:
+            for next_state in self.next_states.pop(state):
+                previous_states = self.previous_states.get(next_state)
+                if previous_states is not None:
+                    previous_states.discard(state)
+            del self.previous_states[state]
+            self.states_by_node[state[0]].discard(state)
+
+    def _add_candidates(self, states: List[Tuple]) -> None:
+        for state in states:
+            if state != self.start:
+                self.candidates.setdefault(_get_state_edge(state), set()).add(state)
+
+    def _remove_candidates(self, states: List[Tuple]) -> None:
+        for state in states:
+            if state != self.start:
+                edge = _get_state_edge(state)
+                self.candidates[edge].discard(state)
+                if not self.candidates[edge]:
+                    del self.candidates[edge]
+
+    def _certify(self, edges: List[Tuple[str, str]]) -> None:
+        for edge in edges:
+            if edge in self.certified:
+                continue  # certified by the trail of an earlier edge
+            steps = [(s, t) for t in self.candidates[edge] for s in self.previous_states[t]]
+            try:
+                trail = self.find_simple_trail(steps)
+            except _SearchLimitReached:
+                self.undecided.add(edge)
+                continue
+            if trail is None:
+                self.refuted.add(edge)
+            else:
+                self._add_trail(trail)
+
+    def _add_trail(self, trail: List[Tuple]) -> None:
+        trail_id = self._next_trail_id
+        self._next_trail_id += 1
+        for edge in _get_trail_edges(trail):
+            self.certified.setdefault(edge, trail_id)
+            self.refuted.discard(edge)
+            self.undecided.discard(edge)
+        self._trails[trail_id] = trail
+        for node, _, _ in trail:
+            self._trails_by_node.setdefault(node, set()).add(trail_id)
+
+    def _remove_trail(self, trail_id: int) -> None:
+        trail = self._trails.pop(trail_id)
+        for edge in _get_trail_edges(trail):
+            if self.certified.get(edge) == trail_id:
+                del self.certified[edge]
+        for node, _, _ in trail:
+            self._trails_by_node[node].discard(trail_id)
+
+    def _is_trail(self, trail: List[Tuple]) -> bool:
+        return bool(trail) and trail[0] == self.start and trail[-1][0] == self.outcome and _is_simple(trail)
+
+    def _find_tail(self, state: Tuple, head: List[Tuple]) -> List[Tuple]:
+        return _find_trail(self.next_states, state, self.to_outcome.depth, {s[0] for s in head})
+
+    def _find_head(self, state: Tuple, tail: List[Tuple]) -> List[Tuple]:
+        return _find_trail(self.previous_states, state, self.from_start.depth, {s[0] for s in tail})[::-1]
+
+    def _is_blocked(self, state: Tuple, next_state: Tuple) -> bool:
+        # the dominators are computed on the states without their previous node, which only allows more trails
+        if self._dominators is None:
+            graph = nx.DiGraph()
+            sink = object()
+            for s, next_states in self.next_states.items():
+                graph.add_edges_from((s[:2], n[:2]) for n in next_states)
+            graph.add_edges_from((s[:2], sink) for s in self.to_outcome.parent if s[0] == self.outcome)
+            self._dominators = (nx.immediate_dominators(graph, self.start[:2]),
+                                nx.immediate_dominators(graph.reverse(copy=False), sink), sink)
+        dominators, post_dominators, sink = self._dominators
+        return not _get_dominating_nodes(dominators, state[:2], self.start[:2]).isdisjoint(
+            _get_dominating_nodes(post_dominators, next_state[:2], sink))
+
+    def _search(self, steps: Set[Tuple[Tuple, Tuple]]) -> Optional[List[Tuple]]:
+        # depth first search, which only follows states from which the next goal (one of the steps, then the
+        # outcome) can still be reached without revisiting a node; exponential in the worst case, so it's limited
+        step_states = {state for state, _ in steps}
+        budget = [self.MAX_SEARCH_STEPS]
+
+        def can_reach(state: Tuple, used: bool, visited: Set[str]) -> bool:
+            seen, to_visit = {state}, [state]
+            while to_visit:
+                current = to_visit.pop()
+                if current[0] == self.outcome if used else current in step_states:
+                    return True
+                budget[0] -= 1
+                if budget[0] < 0:
+                    raise _SearchLimitReached()
+                for next_state in self.next_states.get(current, ()):
+                    if next_state not in seen and next_state in self.to_outcome and next_state[0] not in visited:
+                        seen.add(next_state)
+                        to_visit.append(next_state)
+            return False
+
+        trail, visited, used_at = [self.start], {self.start[0]}, None
+        candidates = [iter(self.next_states.get(self.start, ()))]
+        while candidates:
+            next_state = next(candidates[-1], None)
+            if next_state is None:
+                candidates.pop()
+                visited.discard(trail.pop()[0])
+                if used_at == len(trail):
+                    used_at = None
+                continue
+            if next_state not in self.to_outcome or next_state[0] in visited:
+                continue
+            used = used_at is not None or (trail[-1], next_state) in steps
+            if next_state[0] == self.outcome:
+                if used:
+                    return trail + [next_state]
+                continue
+            visited.add(next_state[0])
+            if not can_reach(next_state, used, visited):
+                visited.discard(next_state[0])
+                continue
+            if used_at is None and used:
+                used_at = len(trail)
+            trail.append(next_state)
+            candidates.append(iter(self.next_states.get(next_state, ())))
+        return None
+
+
+def _find_trail(next_states: Dict[Tuple, Iterable[Tuple]], source: Tuple, distances: Dict[Tuple, int],
+        blocked: Set[str]) -> List[Tuple]:
+    """
+    Find a trail from the source to a state with distance 0, which doesn't enter a blocked node or revisit a node, by
+    a depth first search preferring the closest states. It usually walks straight to the end, but it doesn't find every
+    trail, as every state is only entered once.
+    :return: the states of the trail or an empty list, if none was found
+    """
+    trail, nodes, seen = [], set(), set()
+    candidates = [iter([source])]
+    while candidates:
+        state = next(candidates[-1], None)
+        if state is None:
+            candidates.pop()
+            if trail:
+                nodes.discard(trail.pop()[0])
+            continue
+        if state in seen or state[0] in blocked or state[0] in nodes:
+            continue
+        seen.add(state)
+        trail.append(state)
+        nodes.add(state[0])
+        if distances[state] == 0:
+            return trail
+        closest = sorted((s for s in next_states.get(state, ()) if s in distances), key=distances.__getitem__)
+        candidates.append(iter(closest))
+    return []
+
+
+def _follow(previous: Dict[Tuple, Optional[Tuple]], state: Tuple) -> List[Tuple]:
+    trail = []
+    while state is not None:
+        trail.append(state)
+        state = previous[state]
+    return trail
+
+
+def _is_simple(trail: List[Tuple]) -> bool:
+    return len({s[0] for s in trail}) == len(trail)
+
+
+def _get_dominating_nodes(dominators: Dict[Any, Any], state: Tuple, root: Any) -> Set[str]:
+    nodes = set()
+    while state != root:
+        nodes.add(state[0])
+        state = dominators[state]
+    return nodes
+
+
+class ModelParseError(ValueError):
+    """
+    All errors found while parsing a model string.
+    :param errors: the line number (starting at 1) and the message of every error
+    """
+    def __init__(self, errors: List[Tuple[int, str]]):
+        self.errors = errors
+        super().__init__("\n".join(f"line {line}: {message}" for line, message in errors))
+
+
+# edge operators and the statement separator, the node declarations are the parts in between
+_MODEL_TOKENS = re.compile(r"(->|<-|--|∈|;)")
+
+
+def parse_node(declaration: str) -> Node:
+    """
+    Parse a node declaration 'name[attribute, ..., key=value, ...]'. Attributes are the roles of the node (see
+    NodeAttribute.parse), key-value pairs are collected as meta data of the node.
+    :param declaration: the node declaration
+    :return: the node
+    :raises ValueError: if the declaration is malformed or contains an unknown attribute
+    """
+    name, bracket, attributes = declaration.partition("[")
+    name = name.strip()
+    if not name:
+        raise ValueError(f"Missing node name in '{declaration.strip()}'")
+    node = Node(name)
+    if not bracket:
+        return node
+    attributes, bracket, rest = attributes.partition("]")
+    if not bracket or rest.strip():
+        raise ValueError(f"Malformed node attributes in '{declaration.strip()}'")
+    for attribute in attributes.split(","):
+        key, is_meta, value = attribute.partition("=")
+        key = key.strip()
+        if is_meta:
+            node.meta = node.meta or {}
+            node.meta[key] = value.strip()
+        elif key:
+            try:
+                node.attribute |= _ATTRIBUTE_NAMES[key.lower()]
+            except KeyError:
+                raise ValueError(f"Unknown node attribute '{key}' of node '{name}'") from None
+    return node
+
+
 def normalize_node(node_name: str) -> Tuple[str, NodeAttribute]:
-    attrs = NodeAttribute.REGULAR
-    match = re.search(r"(.*)\[(.*)\]", node_name)
-    if match:
-        node_name, attributes = match.groups()
-        try:
-            attrs = reduce(ior, [NodeAttribute.parse(a) for a in attributes.split(",") if a], NodeAttribute.REGULAR)
-        except ValueError as exc:
-            print(f"Can't parse node attributes: '{attributes}': {exc}")
-    return node_name, attrs
+    node = parse_node(node_name)
+    return node.name, node.attribute
+
+
+def iter_model_statements(lines: Iterable[str],
+        errors: Optional[List[Tuple[int, str]]] = None) -> Iterator[Tuple[int, Node, str, Node]]:
+    """
+    Lazily tokenize the lines of a model string into statements 'source operator target'.
+    Every line may contain several statements separated by ';' and chains like 'a -> b <- c', which yield one
+    statement per operator. Node declarations, which occur repeatedly, are parsed once.
+    :param lines: any iterable of lines, e.g. a list of strings or a file object
+    :param errors: malformed statements are skipped and their line number and message are appended to this list,
+        if it is given, otherwise a ModelParseError is raised for the first one
+    :return: a generator of (line number, source, operator, target); the operator is one of '->', '<-', '--' and '∈'
+    """
+    nodes: Dict[str, Node] = {}
+
+    def get_node(declaration: str) -> Node:
+        node = nodes.get(declaration)
+        if node is None:
+            node = nodes[declaration] = parse_node(declaration)
+        return node
+
+    for line_number, line in enumerate(lines, start=1):
+        tokens = _MODEL_TOKENS.split(line)
+        if len(tokens) == 3 and tokens[1] != ";":
+            # fast path for the common case of a single edge
+            try:
+                source, target = get_node(tokens[0]), get_node(tokens[2])
+            except ValueError as exc:
+                if errors is None:
+                    raise ModelParseError([(line_number, str(exc))]) from None
+                errors.append((line_number, str(exc)))
+                continue
+            yield line_number, source, tokens[1], target
+            continue
+        # the statements of the line are delimited by the separators (or the line ends)
+        start = 0
+        for end in [i for i in range(1, len(tokens), 2) if tokens[i] == ";"] + [len(tokens)]:
+            statement = tokens[start:end]
+            start = end + 1
+            if len(statement) == 1:
+                if statement[0].strip():
+                    message = (f"No valid edge direction specified in '{statement[0].strip()}'. "
+                               f"Expecting one of '->', '<-', '--' or '∈'")
+                    if errors is None:
+                        raise ModelParseError([(line_number, message)])
+                    errors.append((line_number, message))
+                continue
+            try:
+                declared = [get_node(d) for d in statement[::2]]
+            except ValueError as exc:
+                if errors is None:
+                    raise ModelParseError([(line_number, str(exc))]) from None
+                errors.append((line_number, str(exc)))
+                continue
+            for i, operator in enumerate(statement[1::2]):
+                yield line_number, declared[i], operator, declared[i + 1]
 
 
 def parse_edges(lines: Union[List[str], str], sep: str = ";") -> List[Tuple[Node, Node]]:
@@ -275,61 +1321,78 @@ def parse_edges(lines: Union[List[str], str], sep: str = ";") -> List[Tuple[Node
     return edges
 
 
-def parse_model_string(model_string: Union[str, List[str]]) -> CausalGraph:
+def get_confounder_name(a: str, b: str) -> str:
+    """Get the name of the unobserved node, which represents the bidirected edge a -- b."""
+    return "U_" + "_".join(sorted((a, b)))
+
+
+@instrumentation.instrument()
+def parse_model_string(model_string: Union[str, Iterable[str]]) -> CausalGraph:
+    """
+    Parse a causal graph from its edges. Every line contains edges 'a -> b' or 'b <- a', bidirected edges 'a -- b'
+    representing unobserved confounding, or compound memberships 'a ∈ b'. Several statements per line are separated
+    by ';' and may be chained ('a -> b <- c'). The roles of the nodes (see NodeAttribute) are set by the attribute
+    suffix, e.g. 'x[T] -> y[outcome, name=Outcome]'.
+    The lines are parsed in a single pass and the graph is built from all edges at once.
+    :param model_string: the lines as one string, or any iterable of lines, like a list or a file object
+    :return: the causal graph
+    :raises ModelParseError: listing every error of the model string with its line number
+    """
     treatment = None
     outcome = None
     adjusted = set()
     unobserved = set()
-    nodes = set()
-    edges = set()
+    nodes: Dict[str, None] = {}
+    edges: Dict[Tuple[str, str], None] = {}
     compounds = {}
+    meta = {}
+    errors = []
 
-    lines = model_string.split("\n") if isinstance(model_string, str) else model_string
-    for line in lines:
-        is_compound = False
-        if "->" in line:
-            source, target, *_ = [n.strip() for n in line.split("->")]
-        elif "<-" in line:
-            target, source, *_ = [n.strip() for n in line.split("<-")]
-        elif "--" in line:
-            target, source, *_ = [n.strip() for n in line.split("--")]  # unobserved confounding
-            # TODO
-        elif "∈" in line:
-            source, target, *_ = [n.strip() for n in line.split("∈")]
-            is_compound = True
+    lines = model_string.splitlines() if isinstance(model_string, str) else model_string
+    for line_number, source, operator, target in iter_model_statements(lines, errors):
+        if operator == "<-":
+            source, target = target, source
+        if operator == "∈":
+            compounds.setdefault(target.name, set()).add(source.name)
+        elif operator == "--":
+            # a bidirected edge is represented by an explicit unobserved common cause
+            confounder = get_confounder_name(source.name, target.name)
+            nodes[confounder] = None
+            unobserved.add(confounder)
+            edges[(confounder, source.name)] = None
+            edges[(confounder, target.name)] = None
         else:
-            raise ValueError(f"No valid edge direction specified in '{line}'. Expecting either '->' or '<-'")
-        if len(_) > 0:
-            raise NotImplementedError("Parsing of more than one edge per line are not yet supported!")
+            edges[(source.name, target.name)] = None
 
-        source = normalize_node(source)
-        target = normalize_node(target)
+        nodes[source.name] = None
+        nodes[target.name] = None
+        for node in (source, target):
+            if not node.attribute and not node.meta:
+                continue
+            if node.meta:
+                meta.setdefault(node.name, {}).update(node.meta)
+            if node.attribute & NodeAttribute.TREATMENT:
+                if treatment is not None and treatment != node.name:
+                    errors.append((line_number, f"There is already a defined treatment: '{treatment}'. "
+                                                f"It can't be overwritten with '{node.name}'"))
+                else:
+                    treatment = node.name
+            if node.attribute & NodeAttribute.OUTCOME:
+                if outcome is not None and outcome != node.name:
+                    errors.append((line_number, f"There is already a defined outcome: '{outcome}'. "
+                                                f"It can't be overwritten with '{node.name}'"))
+                else:
+                    outcome = node.name
+            if node.attribute & NodeAttribute.UNOBSERVED:
+                unobserved.add(node.name)
+            if node.attribute & NodeAttribute.ADJUSTED:
+                adjusted.add(node.name)
 
-        if is_compound:
-            parent = compounds.get(target, set())
-            parent.add(source)
-            compounds[target] = parent
-        else:
-            edges.add((source[0], target[0]))
-
-        for node, node_attr in [source, target]:
-            nodes.add(node)
-            if node_attr == NodeAttribute.TREATMENT:
-                if treatment is not None and treatment != node:
-                    raise ValueError(
-                        f"There is already a defined treatment: '{treatment}''. It will be overwritten with {node}")
-                treatment = node
-            if node_attr == NodeAttribute.OUTCOME:
-                if outcome is not None and outcome != node:
-                    raise ValueError(
-                        f"There is already a defined outcome: '{outcome}'. It will be overwritten with {node}")
-                outcome = node
-            if node_attr == NodeAttribute.UNOBSERVED:
-                unobserved.add(node)
-            if node_attr == NodeAttribute.ADJUSTED:
-                adjusted.add(node)
-
-    model = CausalGraph(nodes, edges, treatment, outcome, adjusted, unobserved)
+    if errors:
+        raise ModelParseError(errors)
+    model = CausalGraph(set(nodes), set(edges), treatment, outcome, adjusted, unobserved)
+    if meta:
+        nx.set_node_attributes(model.graph, {node: {"meta": m} for node, m in meta.items()})
     return model
 
 
@@ -0,0 +1,397 @@
+"""
+Differential testing of the fast graph queries against the reference semantics of path enumeration: every path between
+two nodes is listed (`nx.all_simple_paths`) and checked by `CausalGraph.is_path_blocked`. Random small DAGs with random
+treatment, outcome, adjusted and unobserved nodes are generated and every property compares a fast query with its
+reference:
+ - d_separation: `d_separated` and `d_separated_many` ⟺ all paths between x and y are blocked by z
+ - backdoor_d_separation: `d_separated(backdoor=True)` ⟺ all backdoor paths are blocked by z
+ - backdoor_criterion: `check_backdoor_criterion` ⟺ no descendant of the treatment in z and all backdoor paths blocked
+ - adjustment_sets: the minimal sets of `iter_adjustment_sets` are the minimal subsets satisfying the reference
+   criterion (found by brute force)
+ - causal_edges: the 'causal' flags of `update_paths` mark the edges of `get_causal_paths`
+ - biasing_edges: the 'biasing' flags of `update_paths` mark the edges of the unblocked paths of `get_backdoor_paths`
+ - edited_path_flags: both flags stay correct, while `update_paths` maintains them across random edits (adding and
+   removing edges and nodes, adjusting nodes)
+A failing case is shrunk greedily (removing edges and nodes, dropping roles) as long as it keeps failing, and reported
+in the format of `parse_model_string`. The cases are checked in parallel, each generated from its own seed, so the
+result doesn't depend on the number of processes, e.g.
+    python differential.py --cases 10000 --jobs 8
+"""
+import argparse
+import itertools
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+import networkx as nx
+import numpy as np
+
+import utils
+from causal_graph import CausalGraph, NodeAttribute
+from identify import backdoor
+
+
+@dataclass(frozen=True)
+class Case:
+    """
+    A causal graph given by its edges, so it can be written as model string (isolated nodes can't be).
+    :param edges: the edges
+    :param treatment: the treatment node
+    :param outcome: the outcome node
+    :param adjusted: the adjusted nodes
+    :param unobserved: the unobserved nodes
+    """
+    edges: Tuple[Tuple[str, str], ...]
+    treatment: str
+    outcome: str
+    adjusted: FrozenSet[str] = frozenset()
+    unobserved: FrozenSet[str] = frozenset()
+
+    @property
+    def nodes(self) -> Set[str]:
+        return {n for e in self.edges for n in e}
+
+    def is_valid(self) -> bool:
+        nodes = self.nodes
+        return {self.treatment, self.outcome} <= nodes and self.adjusted | self.unobserved <= nodes
+
+    def to_model(self) -> CausalGraph:
+        return CausalGraph(self.nodes, set(self.edges), self.treatment, self.outcome, set(self.adjusted),
+                           set(self.unobserved))
+
+    def to_model_string(self) -> str:
+        roles = {self.treatment: "T", self.outcome: "O", **{n: "A" for n in self.adjusted},
+                 **{n: "U" for n in self.unobserved}}
+        lines = []
+        for source, target in self.edges:
+            # the roles are written at the first occurrence of a node
+            lines.append(f"{source}{_role(roles.pop(source, None))} -> {target}{_role(roles.pop(target, None))}")
+        return "\n".join(lines)
+
+
+def _role(role: Optional[str]) -> str:
+    return f"[{role}]" if role else ""
+
+
+@dataclass
+class Counterexample:
+    """
+    A case, for which a property doesn't hold.
+    :param property: the name of the property
+    :param case_index: the index of the generated case
+    :param case: the shrunk case
+    :param message: the description of the mismatch
+    """
+    property: str
+    case_index: int
+    case: Case
+    message: str
+
+    def __str__(self) -> str:
+        return f"{self.property} (case {self.case_index}): {self.message}\n{self.case.to_model_string()}"
+
+
+def random_case(rng: np.random.Generator, max_nodes: int = 7, edge_probability: float = 0.4,
+        role_probability: float = 0.25) -> Case:
+    """
+    Generate a random DAG with at least one edge and random roles.
+    :param rng: the random generator
+    :param max_nodes: the maximal number of nodes
+    :param edge_probability: the probability of every edge from an earlier to a later node of a random order
+    :param role_probability: the probability of every other node to be adjusted (or else unobserved)
+    :return: the case
+    """
+    while True:
+        n = int(rng.integers(2, max_nodes + 1))
+        names = [f"v{i}" for i in rng.permutation(n)]
+        edges = tuple((names[i], names[j]) for i, j in itertools.combinations(range(n), 2)
+                      if rng.random() < edge_probability)
+        nodes = sorted({v for e in edges for v in e})
+        if len(nodes) >= 2:
+            break
+    treatment, outcome = (nodes[i] for i in rng.choice(len(nodes), 2, replace=False))
+    others = [v for v in nodes if v not in (treatment, outcome)]
+    adjusted = frozenset(v for v in others if rng.random() < role_probability)
+    unobserved = frozenset(v for v in others if v not in adjusted and rng.random() < role_probability)
+    return Case(edges, treatment, outcome, adjusted, unobserved)
+
+
+def _iter_paths(model: CausalGraph, x: str, y: str, backdoor: bool = False) -> Iterator[List[Tuple[str, str]]]:
+    # the simple paths between x and y as edges in their direction in the graph
+    for path in nx.all_simple_paths(model.get_undirected_graph(), x, y):
+        edge_path = utils.node_path_to_edge_path(path, model.graph)
+        if not backdoor or edge_path[0][1] == x:
+            yield edge_path
+
+
+def reference_d_separated(model: CausalGraph, x: str, y: str, z: Set[str], backdoor: bool = False) -> bool:
+    return all(model.is_path_blocked(path, z) for path in _iter_paths(model, x, y, backdoor))
+
+
+def reference_backdoor_criterion(model: CausalGraph, treatment: str, outcome: str, z: Set[str]) -> bool:
+    return z.isdisjoint(model.get_descendants(treatment)) and \
+        reference_d_separated(model, treatment, outcome, z, backdoor=True)
+
+
+def _subsets(nodes: Iterable[str], rng: np.random.Generator, n: int) -> List[Set[str]]:
+    nodes = sorted(nodes)
+    return [{v for v in nodes if rng.random() < 0.3} for _ in range(n)]
+
+
+def _queries(model: CausalGraph, rng: np.random.Generator, n: int = 5) -> List[Tuple[str, str, Set[str]]]:
+    nodes = sorted(model.nodes)
+    queries = []
+    for _ in range(n):
+        x, y = (nodes[i] for i in rng.choice(len(nodes), 2, replace=False))
+        queries.append((x, y, _subsets(set(nodes) - {x, y}, rng, 1)[0]))
+    return queries
+
+
+# every property returns a description of the mismatch or None; the generator makes the queries reproducible
+Property = Callable[[CausalGraph, np.random.Generator], Optional[str]]
+
+
+def _check_d_separation(model: CausalGraph, rng: np.random.Generator) -> Optional[str]:
+    queries = _queries(model, rng)
+    batch = model.d_separated_many(queries)
+    for (x, y, z), separated in zip(queries, batch):
+        expected = reference_d_separated(model, x, y, z)
+        if model.d_separated(x, y, z) != expected or bool(separated) != expected:
+            return f"{x} ⟂ {y} | {_format(z)} should be {expected}"
+    return None
+
+
+def _check_backdoor_d_separation(model: CausalGraph, rng: np.random.Generator) -> Optional[str]:
+    for x, y, z in _queries(model, rng):
+        expected = reference_d_separated(model, x, y, z, backdoor=True)
+        if model.d_separated(x, y, z, backdoor=True) != expected:
+            return f"backdoor {x} ⟂ {y} | {_format(z)} should be {expected}"
+    return None
+
+
+def _check_backdoor_criterion(model: CausalGraph, rng: np.random.Generator) -> Optional[str]:
+    treatment, outcome = model.treatment, model.outcome
+    for z in [set(model.adjusted)] + _subsets(model.nodes - {treatment, outcome}, rng, 4):
+        expected = reference_backdoor_criterion(model, treatment, outcome, z)
+        if backdoor.check_backdoor_criterion(model, treatment, outcome, z) != expected:
+            return f"backdoor criterion of {_format(z)} should be {expected}"
+    return None
+
+
+def _check_adjustment_sets(model: CausalGraph, rng: np.random.Generator) -> Optional[str]:
+    treatment, outcome = model.treatment, model.outcome
+    allowed = sorted(model.nodes - {treatment, outcome} - model.unobserved - model.get_descendants(treatment))
+    valid = [set(s) for k in range(len(allowed) + 1) for s in itertools.combinations(allowed, k)
+             if reference_backdoor_criterion(model, treatment, outcome, set(s))]
+    expected = {frozenset(s) for s in valid if not any(other < s for other in valid)}
+    actual = [frozenset(s) for s in backdoor.iter_adjustment_sets(model)]
+    if len(actual) != len(set(actual)) or set(actual) != expected:
+        return f"minimal adjustment sets {_format_sets(actual)} should be {_format_sets(expected)}"
+    return None
+
+
+def _check_causal_edges(model: CausalGraph, rng: np.random.Generator) -> Optional[str]:
+    expected = {e for path in model.get_causal_paths(as_edge_list=True) for e in path}
+    return _compare_flags(model, "causal", expected)
+
+
+def _check_biasing_edges(model: CausalGraph, rng: np.random.Generator) -> Optional[str]:
+    paths = model.get_backdoor_paths(model.treatment, model.outcome, as_edge_list=True)
+    expected = {e for path in paths if not model.is_path_blocked(path, model.adjusted) for e in path}
+    return _compare_flags(model, "biasing", expected)
+
+
+def _check_edited_path_flags(model: CausalGraph, rng: np.random.Generator, n_edits: int = 4) -> Optional[str]:
+    model.update_paths()
+    edits = []
+    for _ in range(n_edits):
+        edits.append(_edit(model, rng))
+        message = _check_causal_edges(model, rng) or _check_biasing_edges(model, rng)
+        if message is not None:
+            return f"after {', '.join(edits)}: {message}"
+    return None
+
+
+def _edit(model: CausalGraph, rng: np.random.Generator) -> str:
+    order = model.get_topological_order()
+    others = [n for n in order if n not in (model.treatment, model.outcome)]
+    kind = int(rng.integers(4))
+    if kind == 0 and len(order) > 1:
+        # an edge along the topological order keeps the graph acyclic, a new node becomes its source
+        i, j = sorted(rng.choice(len(order), 2, replace=False))
+        source = order[i] if rng.random() < 0.8 else f"n{len(model.nodes)}"
+        model.add_edge(source, order[j])
+        return f"add {source}->{order[j]}"
+    if kind == 1 and model.edges:
+        edge = sorted(model.edges)[int(rng.integers(len(model.edges)))]
+        model.remove_edges([edge])
+        return f"remove {edge[0]}->{edge[1]}"
+    if kind == 2 and others:
+        node = others[int(rng.integers(len(others)))]
+        model.remove_nodes([node])
+        return f"remove {node}"
+    if not others:
+        return "none"
+    node = others[int(rng.integers(len(others)))]
+    adjusted = node in model.adjusted
+    model.update_node(node, NodeAttribute.REGULAR if adjusted else NodeAttribute.ADJUSTED)
+    return f"{'unadjust' if adjusted else 'adjust'} {node}"
+
+
+def _compare_flags(model: CausalGraph, flag: str, expected: Set[Tuple[str, str]]) -> Optional[str]:
+    model.update_paths()
+    actual = {e for e, attrs in model.graph.edges.items() if attrs.get(flag)}
+    if actual != expected:
+        return f"{flag} edges {_format_edges(actual)} should be {_format_edges(expected)}"
+    return None
+
+
+def _format(nodes: Iterable[str]) -> str:
+    return "{" + ", ".join(sorted(nodes)) + "}"
+
+
+def _format_sets(sets: Iterable[FrozenSet[str]]) -> str:
+    return "[" + ", ".join(sorted(_format(s) for s in sets)) + "]"
+
+
+def _format_edges(edges: Iterable[Tuple[str, str]]) -> str:
+    return "{" + ", ".join(f"{s}->{t}" for s, t in sorted(edges)) + "}"
+
+
+PROPERTIES: Dict[str, Property] = {
+    "d_separation": _check_d_separation,
+    "backdoor_d_separation": _check_backdoor_d_separation,
+    "backdoor_criterion": _check_backdoor_criterion,
+    "adjustment_sets": _check_adjustment_sets,
+    "causal_edges": _check_causal_edges,
+    "biasing_edges": _check_biasing_edges,
+    "edited_path_flags": _check_edited_path_flags,
+}
+
+
+def check_case(case: Case, check: Property, seed: int = 0) -> Optional[str]:
+    """
+    Check a property on a case.
+    :param case: the case
+    :param check: the property
+    :param seed: the seed of the random queries of the property
+    :return: the description of the mismatch or None, if the property holds
+    """
+    try:
+        return check(case.to_model(), np.random.default_rng(seed))
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+
+def _iter_smaller_cases(case: Case) -> Iterator[Case]:
+    for node in sorted(case.nodes - {case.treatment, case.outcome}):
+        yield replace(case, edges=tuple(e for e in case.edges if node not in e),
+                      adjusted=case.adjusted - {node}, unobserved=case.unobserved - {node})
+    for i in range(len(case.edges)):
+        yield replace(case, edges=case.edges[:i] + case.edges[i + 1:])
+    for node in sorted(case.adjusted):
+        yield replace(case, adjusted=case.adjusted - {node})
+    for node in sorted(case.unobserved):
+        yield replace(case, unobserved=case.unobserved - {node})
+
+
+def shrink(case: Case, check: Property, seed: int = 0) -> Tuple[Case, str]:
+    """
+    Shrink a failing case greedily: nodes and edges are removed and roles dropped, as long as the property still fails.
+    Removed nodes take their roles with them; nodes, which lose all their edges, disappear.
+    :param case: the failing case
+    :param check: the property
+    :param seed: the seed of the random queries of the property
+    :return: the smallest failing case found and its mismatch
+    """
+    message = check_case(case, check, seed)
+    shrunk = True
+    while shrunk:
+        shrunk = False
+        for smaller in _iter_smaller_cases(case):
+            if not smaller.is_valid():
+                continue
+            smaller = replace(smaller, adjusted=smaller.adjusted & smaller.nodes,
+                              unobserved=smaller.unobserved & smaller.nodes)
+            smaller_message = check_case(smaller, check, seed)
+            if smaller_message is not None:
+                case, message, shrunk = smaller, smaller_message, True
+                break
+    return case, message
+
+
+# the parameters of a worker process, set once by the initializer instead of being sent with every batch
+_worker_state = {}
+
+
+def _init_worker(properties: List[str], max_nodes: int) -> None:
+    _worker_state.update(properties=properties, max_nodes=max_nodes)
+
+
+def _run_case(index_and_seed: Tuple[int, np.random.SeedSequence]) -> List[Counterexample]:
+    index, seed = index_and_seed
+    case_seed, query_seed = seed.generate_state(2)
+    case = random_case(np.random.default_rng(case_seed), _worker_state["max_nodes"])
+    counterexamples = []
+    for name in _worker_state["properties"]:
+        check = PROPERTIES[name]
+        if check_case(case, check, query_seed) is not None:
+            shrunk, message = shrink(case, check, query_seed)
+            counterexamples.append(Counterexample(name, index, shrunk, message))
+    return counterexamples
+
+
+def iter_counterexamples(n_cases: int = 1000, properties: Optional[Iterable[str]] = None, max_nodes: int = 7,
+        n_jobs: int = 1, seed: int = 0) -> Iterator[Counterexample]:
+    """
+    Check the properties on random cases, see the module documentation.
+    :param n_cases: the number of cases
+    :param properties: the names of the properties, all by default (see PROPERTIES)
+    :param max_nodes: the maximal number of nodes of a case
+    :param n_jobs: the number of processes
+    :param seed: the seed
+    :return: a generator of the shrunk counterexamples, in the order of the cases
+    """
+    properties = list(PROPERTIES if properties is None else properties)
+    unknown = set(properties) - set(PROPERTIES)
+    if unknown:
+        raise ValueError(f"Unknown properties {', '.join(sorted(unknown))}")
+    cases = enumerate(np.random.SeedSequence(seed).spawn(n_cases))
+    if n_jobs == 1:
+        _init_worker(properties, max_nodes)
+        try:
+            for case in cases:
+                yield from _run_case(case)
+        finally:
+            _worker_state.clear()
+        return
+
+    with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(properties, max_nodes)) as executor:
+        for counterexamples in executor.map(_run_case, cases, chunksize=64):
+            yield from counterexamples
+
+
+def main(args: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Check the fast graph queries against path enumeration")
+    parser.add_argument("--cases", type=int, default=1000)
+    parser.add_argument("--properties", nargs="+", choices=list(PROPERTIES))
+    parser.add_argument("--max-nodes", type=int, default=7)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(args)
+
+    # a mismatch usually shows up in many cases, only the smallest counterexample per property is reported
+    smallest: Dict[str, Counterexample] = {}
+    for counterexample in iter_counterexamples(args.cases, args.properties, args.max_nodes, args.jobs, args.seed):
+        previous = smallest.get(counterexample.property)
+        if previous is None or len(counterexample.case.edges) < len(previous.case.edges):
+            smallest[counterexample.property] = counterexample
+    for counterexample in smallest.values():
+        print(counterexample, end="\n\n")
+    print(f"{len(smallest)} of {len(args.properties or PROPERTIES)} properties failed", file=sys.stderr)
+    return 1 if smallest else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,214 @@
+"""
+Bootstrap confidence intervals for any estimator.
+
+An estimator is a function of the data returning the estimate, either as a float or as a result with an `ate`
+attribute (e.g. `functools.partial(adjust_backdoor, graph=model)`). Resamples are drawn in one of two ways:
+ - "index": an integer index array, the estimator is called with the resampled rows `df.take(index)`, which copies
+   the data once per replicate
+ - "weights": a vector of multinomial counts, the estimator is called as `estimator(df, weights=counts)`, so the data
+   isn't copied at all. `adjust_backdoor` and `estimate.regression.estimate_ate` support frequency weights, which
+   should be preferred for large data.
+
+Replicates are computed in batches, each with its own random generator spawned from a single seed sequence, so the
+result only depends on the seed and not on the number of processes. With more than one process the batches are spread
+across a process pool; the data and the estimator are sent to every worker once. The replicates are streamed into a
+running summary (mean, variance and P² quantile estimates), so the memory doesn't grow with the number of replicates.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+INDEX = "index"
+WEIGHTS = "weights"
+
+
+class StreamingQuantile:
+    """
+    Estimate a quantile of a stream of values in constant memory with the P² algorithm (Jain & Chlamtac, 1985), which
+    tracks five markers (minimum, the p/2, p and (1+p)/2 quantiles and maximum) and adjusts their heights by
+    piecewise parabolic interpolation.
+    :param p: the quantile, between 0 and 1
+    """
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights: List[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if self.count <= 5:
+            self.heights.append(value)
+            self.heights.sort()
+            return
+
+        h, n = self.heights, self.positions
+        if value < h[0]:
+            h[0] = value
+            k = 0
+        elif value >= h[4]:
+            h[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if h[i] <= value < h[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        # move the three inner markers towards their desired positions
+        for i in range(1, 4):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = self._parabolic(i, d)
+                if not h[i - 1] < height < h[i + 1]:
+                    height = h[i] + d * (h[i + d] - h[i]) / (n[i + d] - n[i])
+                h[i] = height
+                n[i] += d
+
+    def _parabolic(self, i: int, d: int) -> float:
+        h, n = self.heights, self.positions
+        return h[i] + d / (n[i + 1] - n[i - 1]) * (
+                (n[i] - n[i - 1] + d) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+                + (n[i + 1] - n[i] - d) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+
+    @property
+    def value(self) -> float:
+        if self.count == 0:
+            return np.nan
+        if self.count <= 5:
+            return float(np.quantile(self.heights, self.p))
+        return self.heights[2]
+
+
+class RunningSummary:
+    """
+    Summarize a stream of values by their mean, standard deviation (Welford's algorithm) and some quantiles.
+    :param quantiles: the quantiles to estimate
+    """
+
+    def __init__(self, quantiles: List[float]):
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+        self.quantiles = [StreamingQuantile(p) for p in quantiles]
+
+    def add(self, values: np.ndarray) -> None:
+        for value in values:
+            if np.isnan(value):
+                continue
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self._m2 += delta * (value - self.mean)
+            for quantile in self.quantiles:
+                quantile.add(float(value))
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self._m2 / (self.count - 1))) if self.count > 1 else np.nan
+
+
+@dataclass
+class BootstrapResult:
+    """
+    The bootstrap distribution of an estimate.
+    :param estimate: the estimate on the full data
+    :param std_error: the standard deviation of the replicates
+    :param ci_low: the lower bound of the percentile confidence interval
+    :param ci_high: the upper bound of the percentile confidence interval
+    :param n_replicates: the number of replicates, for which the estimator returned a number
+    """
+    estimate: float
+    std_error: float
+    ci_low: float
+    ci_high: float
+    n_replicates: int
+
+
+def _to_float(result: Any) -> float:
+    return float(getattr(result, "ate", result))
+
+
+# the data of a worker process, set once by the initializer instead of being sent with every batch
+_worker_state = {}
+
+
+def _init_worker(df: pd.DataFrame, estimator: Callable, resampling: str) -> None:
+    _worker_state.update(df=df, estimator=estimator, resampling=resampling)
+
+
+def _run_batch(seed: np.random.SeedSequence, batch_size: int) -> np.ndarray:
+    df, estimator, resampling = _worker_state["df"], _worker_state["estimator"], _worker_state["resampling"]
+    rng = np.random.default_rng(seed)
+    n = len(df)
+    replicates = np.empty(batch_size)
+    for i in range(batch_size):
+        index = rng.integers(0, n, n)
+        if resampling == WEIGHTS:
+            # the multiplicities of a resample are multinomial counts
+            replicates[i] = _to_float(estimator(df, weights=np.bincount(index, minlength=n).astype(float)))
+        else:
+            # a copy of the resampled rows, for estimators without weights
+            replicates[i] = _to_float(estimator(df.take(index)))
+    return replicates
+
+
+def iter_replicates(df: pd.DataFrame, estimator: Callable, n_replicates: int = 1000, resampling: str = INDEX,
+        n_jobs: int = 1, seed: int = 0, batch_size: int = 25) -> Iterator[np.ndarray]:
+    """
+    Compute the bootstrap replicates of the estimator batch by batch, see the module documentation.
+    :param df: the data
+    :param estimator: the estimator, must be picklable (e.g. a module level function or a partial) if n_jobs > 1
+    :param n_replicates: the number of replicates
+    :param resampling: draw resamples as index arrays (INDEX, copies the rows) or weight vectors (WEIGHTS, no copies)
+    :param n_jobs: the number of processes
+    :param seed: the seed of the random number generators
+    :param batch_size: the number of replicates computed at once by a worker
+    :return: a generator of batches of replicates, in the same order for any number of processes
+    """
+    if resampling not in (INDEX, WEIGHTS):
+        raise ValueError(f"Unknown resampling {resampling}")
+    batch_sizes = [min(batch_size, n_replicates - start) for start in range(0, n_replicates, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(batch_sizes))
+
+    if n_jobs == 1:
+        _init_worker(df, estimator, resampling)
+        try:
+            for batch_seed, size in zip(seeds, batch_sizes):
+                yield _run_batch(batch_seed, size)
+        finally:
+            _worker_state.clear()
+        return
+
+    with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=(df, estimator, resampling)) as executor:
+        yield from executor.map(_run_batch, seeds, batch_sizes)
+
+
+def bootstrap(df: pd.DataFrame, estimator: Callable, n_replicates: int = 1000, alpha: float = 0.05,
+        resampling: str = INDEX, n_jobs: int = 1, seed: int = 0, batch_size: int = 25) -> BootstrapResult:
+    """
+    Get the bootstrap standard error and percentile confidence interval of an estimate.
+    :param df: the data
+    :param estimator: the estimator, see the module documentation
+    :param n_replicates: the number of replicates
+    :param alpha: the confidence interval covers 1 - alpha of the bootstrap distribution
+    :param resampling: draw resamples as index arrays (INDEX, copies the rows) or weight vectors (WEIGHTS, no copies)
+    :param n_jobs: the number of processes
+    :param seed: the seed of the random number generators
+    :param batch_size: the number of replicates computed at once by a worker
+    :return: the summary of the bootstrap distribution
+    """
+    summary = RunningSummary([alpha / 2, 1 - alpha / 2])
+    for replicates in iter_replicates(df, estimator, n_replicates, resampling, n_jobs, seed, batch_size):
+        summary.add(replicates)
+    estimate = _to_float(estimator(df, weights=np.ones(len(df))) if resampling == WEIGHTS else estimator(df))
+    low, high = summary.quantiles
+    return BootstrapResult(estimate, summary.std, low.value, high.value, summary.count)
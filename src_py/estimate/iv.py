@@ -0,0 +1,138 @@
+"""
+Estimators based on the instrumental variable equation:
+ - Two-stage least squares with any number of instruments and exogenous covariates (the conditioning set)
+ - The Wald estimator for a single binary instrument
+
+Both only need moments of the data, which are accumulated chunk by chunk (see `estimate.regression`), so data, which
+doesn't fit in memory, can be streamed from an iterable of dataframes or a csv file.
+"""
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from causal_graph import CausalGraph
+from estimate.regression import SufficientStatistics, iter_data
+from identify.instrument import get_instruments
+
+
+@dataclass
+class IVEstimate:
+    """
+    The result of an instrumental variable estimator.
+    :param ate: the effect of the treatment on the outcome
+    :param std_error: the (homoscedastic) standard error of the effect, nan for the Wald estimator
+    :param first_stage_f: the F-statistic of the instruments in the first stage regression (weak instruments < 10)
+    :param instruments: the instruments
+    :param conditioning_set: the exogenous covariates
+    :param n: the number of samples used
+    """
+    ate: float
+    std_error: float
+    first_stage_f: float
+    instruments: List[str]
+    conditioning_set: List[str]
+    n: int
+
+
+def _get_instruments(graph: CausalGraph, instruments: Optional[Set[str]],
+        conditioning_set: Optional[Set[str]]) -> Tuple[List[str], List[str]]:
+    if instruments is None:
+        found = get_instruments(graph)
+        if not found:
+            raise ValueError(f"There is no instrument for {graph.treatment} -> {graph.outcome}")
+        # prefer unconditional instruments
+        found = sorted(found, key=lambda i: len(i.conditioning_set))
+        instruments = {found[0].instrument}
+        if conditioning_set is None:
+            conditioning_set = found[0].conditioning_set
+    return sorted(instruments), sorted(conditioning_set or ())
+
+
+def two_stage_least_squares(data: Union[pd.DataFrame, Iterable[pd.DataFrame], str], graph: CausalGraph,
+        instruments: Optional[Set[str]] = None, conditioning_set: Optional[Set[str]] = None,
+        chunk_size: int = 1_000_000) -> IVEstimate:
+    """
+    Estimate the effect of the treatment on the outcome by two-stage least squares.
+    The estimate β = (XᵀZ (ZᵀZ)⁻¹ ZᵀX)⁻¹ XᵀZ (ZᵀZ)⁻¹ Zᵀy, with X = [1, treatment, covariates] and
+    Z = [1, covariates, instruments], only depends on the cross products of [1, treatment, covariates, instruments, y],
+    which are accumulated in a single pass.
+    :param data: a dataframe, an iterable of dataframes (chunks) or the path of a csv file, which is read in chunks
+    :param graph: the causal graph defining treatment and outcome
+    :param instruments: the instruments, defaults to the first instrument found in the graph
+    :param conditioning_set: the exogenous covariates, defaults to the conditioning set of the found instrument
+    :param chunk_size: the number of rows processed at once
+    :return: the estimate
+    """
+    instruments, covariates = _get_instruments(graph, instruments, conditioning_set)
+    columns = [graph.treatment] + covariates + instruments
+    stats = SufficientStatistics(columns, graph.outcome)
+    for chunk, _ in iter_data(data, columns + [graph.outcome], chunk_size):
+        stats.update(chunk)
+    if stats.n == 0:
+        raise ValueError("Can't estimate the effect without any complete samples")
+
+    # indices into the moments of [1, treatment, covariates, instruments]
+    n_covariates = len(covariates)
+    x_index = list(range(2 + n_covariates))
+    z_index = [0] + list(range(2, len(columns) + 1))
+    xtx, xty = stats.xtx, stats.xty
+    ztz_inv = np.linalg.pinv(xtx[np.ix_(z_index, z_index)])
+    ztx = xtx[np.ix_(z_index, x_index)]
+    projected = ztx.T @ ztz_inv @ ztx
+    projected_inv = np.linalg.pinv(projected)
+    beta = projected_inv @ ztx.T @ ztz_inv @ xty[z_index]
+
+    # the residuals of the second stage use the treatment itself, not its projection
+    rss = stats.yty - 2 * beta @ xty[x_index] + beta @ xtx[np.ix_(x_index, x_index)] @ beta
+    dof = stats.n - len(x_index)
+    std_error = float(np.sqrt(max(rss, 0.) / dof * projected_inv[1, 1])) if dof > 0 else np.nan
+
+    # first stage: F-test of the instruments in the regression of the treatment on covariates and instruments
+    restricted = [0] + list(range(2, 2 + n_covariates))
+    rss_full = xtx[1, 1] - xtx[1, z_index] @ ztz_inv @ xtx[z_index, 1]
+    restricted_inv = np.linalg.pinv(xtx[np.ix_(restricted, restricted)])
+    rss_restricted = xtx[1, 1] - xtx[1, restricted] @ restricted_inv @ xtx[restricted, 1]
+    first_stage_dof = stats.n - len(z_index)
+    first_stage_f = ((rss_restricted - rss_full) / len(instruments)) / (rss_full / first_stage_dof) \
+        if first_stage_dof > 0 and rss_full > 0 else np.nan
+    return IVEstimate(float(beta[1]), std_error, float(first_stage_f), instruments, covariates, stats.n)
+
+
+def wald(data: Union[pd.DataFrame, Iterable[pd.DataFrame], str], graph: CausalGraph, instrument: Optional[str] = None,
+        treated: Any = 1, chunk_size: int = 1_000_000) -> IVEstimate:
+    """
+    Estimate the effect of the treatment on the outcome with a binary instrument by the Wald estimator
+    (E[Y|Z=1] - E[Y|Z=0]) / (E[X|Z=1] - E[X|Z=0]).
+    :param data: a dataframe, an iterable of dataframes (chunks) or the path of a csv file, which is read in chunks
+    :param graph: the causal graph defining treatment and outcome
+    :param instrument: the instrument, defaults to the first unconditional instrument found in the graph
+    :param treated: the value of the instrument, which encourages the treatment
+    :param chunk_size: the number of rows processed at once
+    :return: the estimate
+    """
+    if instrument is None:
+        instruments, covariates = _get_instruments(graph, None, None)
+        if covariates:
+            raise ValueError("The Wald estimator needs an unconditional instrument")
+        instrument = instruments[0]
+    columns = [instrument, graph.treatment, graph.outcome]
+
+    # counts, treatment sums and outcome sums of both values of the instrument
+    moments = np.zeros((2, 3))
+    for chunk, _ in iter_data(data, columns, chunk_size):
+        z = chunk[instrument].to_numpy() == treated
+        x = chunk[graph.treatment].to_numpy(dtype=float)
+        y = chunk[graph.outcome].to_numpy(dtype=float)
+        valid = ~(np.isnan(x) | np.isnan(y))
+        z, x, y = z[valid].astype(np.int64), x[valid], y[valid]
+        moments[:, 0] += np.bincount(z, minlength=2)
+        moments[:, 1] += np.bincount(z, weights=x, minlength=2)
+        moments[:, 2] += np.bincount(z, weights=y, minlength=2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = moments[:, 1:] / moments[:, :1]
+        ate = (means[1, 1] - means[0, 1]) / (means[1, 0] - means[0, 0])
+    n = int(moments[:, 0].sum())
+    return IVEstimate(float(ate), np.nan, np.nan, [instrument], [], n)
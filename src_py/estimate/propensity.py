@@ -0,0 +1,190 @@
+"""
+Estimators based on the treatment assignment: the propensity score e(z) = P(X=1|Z=z) of an adjustment set Z is
+sufficient to remove the confounding by Z (Rosenbaum & Rubin, 1983).
+ - Inverse propensity weighting
+ - Propensity-based stratification
+ - Matching on the propensity score or on the covariates
+
+The propensity scores are fitted by a logistic regression (iteratively reweighted least squares on NumPy arrays).
+Matching looks up the nearest neighbours in a sorted array of propensity scores (binary search) or in a KD-tree of the
+covariates, so it takes O(n log n) instead of the O(n²) of all pairwise distances.
+"""
+from dataclasses import dataclass
+from typing import Any, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+from causal_graph import CausalGraph
+from identify.backdoor import get_adjustment_sets
+
+IPW = "ipw"
+STRATIFICATION = "stratification"
+MATCHING = "matching"
+
+
+@dataclass
+class PropensityEstimate:
+    """
+    The result of a propensity score estimator.
+    :param ate: the average treatment effect
+    :param method: the estimator
+    :param adjustment_set: the covariates of the propensity model
+    :param propensity_scores: the propensity score of every complete sample (rows with missing values are skipped)
+    """
+    ate: float
+    method: str
+    adjustment_set: Set[str]
+    propensity_scores: np.ndarray
+
+
+def get_propensity_adjustment_set(graph: CausalGraph) -> Set[str]:
+    """
+    Get the covariates of the propensity model: the adjusted nodes of the graph, or else the first minimal set
+    satisfying the backdoor criterion.
+    :param graph: the causal graph
+    :return: the adjustment set
+    """
+    if graph.adjusted:
+        return set(graph.adjusted)
+    adjustment_sets = get_adjustment_sets(graph, graph.treatment, graph.outcome)
+    if not adjustment_sets:
+        raise ValueError(f"There is no set satisfying the backdoor criterion for {graph.treatment} -> {graph.outcome}")
+    return adjustment_sets[0]
+
+
+def fit_propensity_scores(z: np.ndarray, t: np.ndarray, max_iter: int = 25, tol: float = 1e-8,
+        clip: float = 1e-3) -> np.ndarray:
+    """
+    Fit a logistic regression of the treatment on the covariates by Newton's method (IRLS).
+    :param z: the covariates, one row per sample
+    :param t: the (binary) treatment
+    :param max_iter: the maximal number of Newton steps
+    :param tol: stop, once the largest change of a coefficient is below this tolerance
+    :param clip: the scores are clipped to [clip, 1 - clip] to bound the inverse weights
+    :return: the propensity scores
+    """
+    x = np.empty((len(z), z.shape[1] + 1))
+    x[:, 0] = 1.
+    # standardize the covariates, so a single tolerance fits all coefficients
+    x[:, 1:] = (z - z.mean(axis=0)) / np.where(z.std(axis=0) > 0, z.std(axis=0), 1.)
+    beta = np.zeros(x.shape[1])
+    for _ in range(max_iter):
+        p = 1 / (1 + np.exp(-(x @ beta)))
+        w = p * (1 - p)
+        step = np.linalg.lstsq((x * w[:, None]).T @ x, x.T @ (t - p), rcond=None)[0]
+        beta += step
+        if np.abs(step).max() < tol:
+            break
+    return np.clip(1 / (1 + np.exp(-(x @ beta))), clip, 1 - clip)
+
+
+def _get_arrays(df: pd.DataFrame, graph: CausalGraph, adjustment_set: Optional[Set[str]],
+        treated: Any) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray]:
+    if graph.treatment is None or graph.outcome is None:
+        raise ValueError("The graph needs a treatment and an outcome to estimate the effect")
+    columns = sorted(get_propensity_adjustment_set(graph) if adjustment_set is None else adjustment_set)
+    # rows with missing values are skipped, like in the regression estimator
+    complete = df[columns + [graph.treatment, graph.outcome]].notna().all(axis=1).to_numpy()
+    if not complete.any():
+        raise ValueError("Can't estimate the effect without any complete samples")
+    df = df[complete] if not complete.all() else df
+    z = df[columns].to_numpy(dtype=float).reshape(len(df), len(columns))
+    t = (df[graph.treatment].to_numpy() == treated).astype(float)
+    y = df[graph.outcome].to_numpy(dtype=float)
+    return columns, z, t, y
+
+
+def ipw(df: pd.DataFrame, graph: CausalGraph, adjustment_set: Optional[Set[str]] = None,
+        treated: Any = 1) -> PropensityEstimate:
+    """
+    Estimate the ATE by inverse propensity weighting. The weights are normalized within the treatment groups (Hájek
+    estimator), which is more stable than the plain Horvitz-Thompson estimator for scores close to 0 or 1.
+    :param df: the data
+    :param graph: the causal graph defining treatment and outcome
+    :param adjustment_set: the covariates of the propensity model, see `get_propensity_adjustment_set`
+    :param treated: the value of the treatment column for treated samples, all other values are control
+    :return: the estimate
+    """
+    columns, z, t, y = _get_arrays(df, graph, adjustment_set, treated)
+    e = fit_propensity_scores(z, t)
+    w_treated = t / e
+    w_control = (1 - t) / (1 - e)
+    ate = w_treated @ y / w_treated.sum() - w_control @ y / w_control.sum()
+    return PropensityEstimate(float(ate), IPW, set(columns), e)
+
+
+def stratify(df: pd.DataFrame, graph: CausalGraph, adjustment_set: Optional[Set[str]] = None, treated: Any = 1,
+        n_strata: int = 5) -> PropensityEstimate:
+    """
+    Estimate the ATE by stratifying on the quantiles of the propensity score. The effects within the strata are
+    weighted by the size of the strata, strata without treated or control samples are left out.
+    :param df: the data
+    :param graph: the causal graph defining treatment and outcome
+    :param adjustment_set: the covariates of the propensity model, see `get_propensity_adjustment_set`
+    :param treated: the value of the treatment column for treated samples, all other values are control
+    :param n_strata: the number of strata
+    :return: the estimate
+    """
+    columns, z, t, y = _get_arrays(df, graph, adjustment_set, treated)
+    e = fit_propensity_scores(z, t)
+    edges = np.quantile(e, np.linspace(0, 1, n_strata + 1)[1:-1])
+    strata = np.searchsorted(edges, e, side="right")
+
+    # bin 2 * stratum + 1 holds the treated and 2 * stratum the control samples of a stratum
+    bins = 2 * strata + t.astype(np.int64)
+    counts = np.bincount(bins, minlength=2 * n_strata).reshape(n_strata, 2)
+    sums = np.bincount(bins, weights=y, minlength=2 * n_strata).reshape(n_strata, 2)
+    positive = (counts > 0).all(axis=1)
+    if not positive.any():
+        return PropensityEstimate(np.nan, STRATIFICATION, set(columns), e)
+    means = sums[positive] / counts[positive]
+    sizes = counts[positive].sum(axis=1)
+    ate = sizes @ (means[:, 1] - means[:, 0]) / sizes.sum()
+    return PropensityEstimate(float(ate), STRATIFICATION, set(columns), e)
+
+
+def _nearest_sorted(values: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    # index of the nearest value for every query by a binary search in the sorted values
+    if len(values) == 1:
+        return np.zeros(len(queries), dtype=np.int64)
+    order = np.argsort(values, kind="stable")
+    sorted_values = values[order]
+    right = np.clip(np.searchsorted(sorted_values, queries), 1, len(values) - 1)
+    left = right - 1
+    nearest = np.where(queries - sorted_values[left] <= sorted_values[right] - queries, left, right)
+    return order[nearest]
+
+
+def match(df: pd.DataFrame, graph: CausalGraph, adjustment_set: Optional[Set[str]] = None, treated: Any = 1,
+        on_covariates: bool = False) -> PropensityEstimate:
+    """
+    Estimate the ATE by 1-nearest-neighbour matching with replacement: the missing potential outcome of every sample
+    is imputed by the outcome of the nearest sample of the other treatment group.
+    :param df: the data
+    :param graph: the causal graph defining treatment and outcome
+    :param adjustment_set: the covariates of the propensity model, see `get_propensity_adjustment_set`
+    :param treated: the value of the treatment column for treated samples, all other values are control
+    :param on_covariates: match on the standardized covariates (KD-tree) instead of the propensity score
+    :return: the estimate
+    """
+    columns, z, t, y = _get_arrays(df, graph, adjustment_set, treated)
+    e = fit_propensity_scores(z, t)
+    is_treated = t == 1
+    if is_treated.all() or not is_treated.any():
+        return PropensityEstimate(np.nan, MATCHING, set(columns), e)
+
+    if on_covariates:
+        features = (z - z.mean(axis=0)) / np.where(z.std(axis=0) > 0, z.std(axis=0), 1.)
+        _, nearest_control = cKDTree(features[~is_treated]).query(features[is_treated])
+        _, nearest_treated = cKDTree(features[is_treated]).query(features[~is_treated])
+    else:
+        nearest_control = _nearest_sorted(e[~is_treated], e[is_treated])
+        nearest_treated = _nearest_sorted(e[is_treated], e[~is_treated])
+
+    # effect of every treated sample: y - y(matched control), of every control sample: y(matched treated) - y
+    effects = np.empty(len(y))
+    effects[is_treated] = y[is_treated] - y[~is_treated][nearest_control]
+    effects[~is_treated] = y[is_treated][nearest_treated] - y[~is_treated]
+    return PropensityEstimate(float(effects.mean()), MATCHING, set(columns), e)
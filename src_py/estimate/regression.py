@@ -0,0 +1,159 @@
+"""
+Regression adjustment: the outcome is regressed on the treatment and the adjustment set. For a linear model without
+interactions E[Y|do(X=1)] - E[Y|do(X=0)] is the coefficient of the treatment, so the ATE is read off the fit instead of
+predicting on two modified copies of the data.
+
+The least squares fit only depends on the sufficient statistics XᵀX, Xᵀy and yᵀy, which are accumulated chunk by chunk.
+Data, which doesn't fit in memory, can therefore be streamed from an iterable of dataframes or a csv file.
+"""
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator, List, Optional, Set, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+import instrumentation
+from causal_graph import CausalGraph
+
+INTERCEPT = "intercept"
+
+
+@dataclass
+class SufficientStatistics:
+    """
+    The cross products of the design matrix (with intercept) and the outcome.
+    All columns are shifted by the means of the first chunk before accumulating, which keeps the cross products well
+    conditioned for columns with a large mean; the slopes are unaffected by the shift.
+    :param columns: the regressors
+    :param outcome: the regressand
+    """
+    columns: List[str]
+    outcome: str
+    n: int = 0
+    xtx: Optional[np.ndarray] = None
+    xty: Optional[np.ndarray] = None
+    yty: float = 0.
+    shift: Optional[np.ndarray] = field(default=None, repr=False)
+
+    def update(self, df: pd.DataFrame, weights: Optional[np.ndarray] = None) -> "SufficientStatistics":
+        """
+        Add the rows of a chunk, rows with missing values are skipped.
+        :param df: the chunk
+        :param weights: frequency weights of the rows (e.g. the multiplicities of a bootstrap resample)
+        :return: self
+        """
+        values = df[self.columns + [self.outcome]].to_numpy(dtype=float)
+        complete = ~np.isnan(values).any(axis=1)
+        values = values[complete]
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=float)[complete]
+        if len(values) == 0:
+            return self
+        if self.shift is None:
+            self.shift = values.mean(axis=0)
+            self.xtx = np.zeros((len(self.columns) + 1, len(self.columns) + 1))
+            self.xty = np.zeros(len(self.columns) + 1)
+        values = values - self.shift
+        x = np.empty((len(values), len(self.columns) + 1))
+        x[:, 0] = 1.
+        x[:, 1:] = values[:, :-1]
+        y = values[:, -1]
+        wx = x * weights[:, None]
+        self.n += int(round(weights.sum()))
+        self.xtx += wx.T @ x
+        self.xty += wx.T @ y
+        self.yty += float(y @ (weights * y))
+        return self
+
+
+@dataclass
+class RegressionEstimate:
+    """
+    The result of the regression adjustment.
+    :param ate: the average treatment effect, i.e. the coefficient of the treatment
+    :param std_error: the (homoscedastic) standard error of the ate
+    :param coefficients: the coefficients of the intercept and all regressors
+    :param std_errors: the standard errors of the coefficients
+    :param n: the number of samples used for the fit
+    """
+    ate: float
+    std_error: float
+    coefficients: pd.Series
+    std_errors: pd.Series
+    n: int
+
+
+def fit(stats: SufficientStatistics) -> RegressionEstimate:
+    """
+    Solve the normal equations given by the sufficient statistics.
+    :param stats: the accumulated statistics, the first column is the treatment
+    :return: the estimate
+    """
+    if stats.n == 0:
+        raise ValueError("Can't fit the regression without any complete samples")
+    # pinv handles collinear regressors (e.g. a constant adjustment column) by setting their coefficient to zero
+    xtx_inv = np.linalg.pinv(stats.xtx)
+    beta = xtx_inv @ stats.xty
+    dof = stats.n - np.linalg.matrix_rank(stats.xtx)
+    rss = max(stats.yty - beta @ stats.xty, 0.)
+    sigma2 = rss / dof if dof > 0 else np.nan
+    std_errors = np.sqrt(np.maximum(np.diag(xtx_inv), 0.) * sigma2)
+
+    # undo the shift of the columns for the intercept
+    beta = beta.copy()
+    beta[0] += stats.shift[-1] - beta[1:] @ stats.shift[:-1]
+    std_errors[0] = np.nan
+    index = [INTERCEPT] + stats.columns
+    return RegressionEstimate(float(beta[1]), float(std_errors[1]), pd.Series(beta, index=index),
+                              pd.Series(std_errors, index=index), stats.n)
+
+
+def iter_chunks(df: pd.DataFrame, chunk_size: int,
+        weights: Optional[np.ndarray] = None) -> Iterator[Tuple[pd.DataFrame, Optional[np.ndarray]]]:
+    """Iterate over row slices of the dataframe (views, no copies) and their weights."""
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start:start + chunk_size], None if weights is None else weights[start:start + chunk_size]
+
+
+def iter_data(data: Union[pd.DataFrame, Iterable[pd.DataFrame], str], columns: List[str], chunk_size: int,
+        weights: Optional[np.ndarray] = None) -> Iterator[Tuple[pd.DataFrame, Optional[np.ndarray]]]:
+    """
+    Iterate over the chunks of the data and their weights.
+    :param data: a dataframe, an iterable of dataframes (chunks) or the path of a csv file, which is read in chunks
+    :param columns: the columns, which are read from a csv file
+    :param chunk_size: the number of rows of a chunk
+    :param weights: frequency weights of the rows, only supported if the data is a single dataframe
+    :return: a generator of chunks and their weights
+    """
+    if isinstance(data, pd.DataFrame):
+        yield from iter_chunks(data, chunk_size, weights)
+        return
+    if weights is not None:
+        raise ValueError("Weights are only supported for a single dataframe")
+    if isinstance(data, str):
+        data = pd.read_csv(data, usecols=columns, chunksize=chunk_size)
+    for chunk in data:
+        yield chunk, None
+
+
+@instrumentation.instrument()
+def estimate_ate(data: Union[pd.DataFrame, Iterable[pd.DataFrame], str], graph: CausalGraph,
+        adjustment_set: Optional[Set[str]] = None, chunk_size: int = 1_000_000,
+        weights: Optional[np.ndarray] = None) -> RegressionEstimate:
+    """
+    Estimate the average treatment effect by a linear regression of the outcome on the treatment and the adjustment set.
+    :param data: a dataframe, an iterable of dataframes (chunks) or the path of a csv file, which is read in chunks
+    :param graph: the causal graph defining treatment and outcome
+    :param adjustment_set: the columns to adjust for, defaults to the adjusted nodes of the graph
+    :param chunk_size: the number of rows processed at once
+    :param weights: frequency weights of the rows, only supported if the data is a single dataframe
+    :return: the estimate
+    """
+    if graph.treatment is None or graph.outcome is None:
+        raise ValueError("The graph needs a treatment and an outcome to estimate the effect")
+    adjustment_set = graph.adjusted if adjustment_set is None else adjustment_set
+    columns = [graph.treatment] + sorted(set(adjustment_set) - {graph.treatment})
+    stats = SufficientStatistics(columns, graph.outcome)
+
+    for chunk, chunk_weights in iter_data(data, columns + [graph.outcome], chunk_size, weights):
+        stats.update(chunk, chunk_weights)
+    return fit(stats)
@@ -0,0 +1,292 @@
+"""
+Simulation studies of estimators: every replicate draws a fresh dataset from a structural causal model (see `simulate`),
+whose true effect is known, and runs all estimators on it. The estimates are summarized by their bias, standard
+deviation, root mean squared error and the coverage of their confidence intervals.
+
+An estimator is a function of the data, like in `estimate.bootstrap` (e.g. `functools.partial(estimate_ate,
+graph=model)`), returning the estimate as a float or as a result with an `ate` (or `estimate`) attribute. The interval
+is taken from `ci_low` and `ci_high` or built from `std_error` by the normal approximation; coverage is nan for
+estimators without either. Estimators raising a numerical error (see `NUMERICAL_ERRORS`, estimators report their own
+numerical failures by raising `EstimationError`) or returning nan are counted as failed, any other exception stops the
+study.
+
+Every replicate has its own seed sequence spawned from a single seed, so the result only depends on the seed and not on
+the number of processes or the batch size. The replicates are folded into the summaries in order as soon as their batch
+is done and the summaries can be saved to a checkpoint file after every batch, from which an interrupted study resumes.
+The checkpoint records the configuration of the study including a digest of the mechanisms, so it's only resumed by
+the same study.
+"""
+import hashlib
+import json
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from causal_graph import CausalGraph
+from simulate import Mechanism, Seed, StructuralCausalModel
+
+CHECKPOINT_VERSION = 2
+
+
+class EstimationError(ArithmeticError):
+    """
+    A numerical failure of an estimator on a dataset, e.g. a propensity model that doesn't converge
+    """
+
+
+# the errors of an estimator, which count as a failed replicate, e.g. a singular design matrix in a small sample
+NUMERICAL_ERRORS = (np.linalg.LinAlgError, FloatingPointError, ZeroDivisionError, EstimationError)
+
+
+@dataclass
+class EstimatorSummary:
+    """
+    The running summary of the errors (estimate - true effect) of one estimator (Welford's algorithm).
+    :param n: the number of replicates with an estimate
+    :param n_failed: the number of replicates, for which the estimator failed
+    :param mean_error: the mean error, i.e. the bias
+    :param m2: the sum of squared deviations of the errors from their mean
+    :param n_intervals: the number of replicates with a confidence interval
+    :param n_covered: the number of confidence intervals covering the true effect
+    """
+    n: int = 0
+    n_failed: int = 0
+    mean_error: float = 0.
+    m2: float = 0.
+    n_intervals: int = 0
+    n_covered: int = 0
+
+    def add(self, estimate: float, low: float, high: float, true_effect: float) -> None:
+        if np.isnan(estimate):
+            self.n_failed += 1
+            return
+        self.n += 1
+        error = estimate - true_effect
+        delta = error - self.mean_error
+        self.mean_error += delta / self.n
+        self.m2 += delta * (error - self.mean_error)
+        if not (np.isnan(low) or np.isnan(high)):
+            self.n_intervals += 1
+            self.n_covered += bool(low <= true_effect <= high)
+
+    @property
+    def bias(self) -> float:
+        return self.mean_error if self.n else np.nan
+
+    @property
+    def std(self) -> float:
+        return float(np.sqrt(self.m2 / (self.n - 1))) if self.n > 1 else np.nan
+
+    @property
+    def rmse(self) -> float:
+        return float(np.sqrt(self.m2 / self.n + self.mean_error ** 2)) if self.n else np.nan
+
+    @property
+    def coverage(self) -> float:
+        return self.n_covered / self.n_intervals if self.n_intervals else np.nan
+
+
+@dataclass
+class SimulationStudyResult:
+    """
+    The (intermediate) result of a simulation study.
+    :param true_effect: the true effect of the treatment on the outcome
+    :param n_replicates: the number of replicates done
+    :param summaries: the summary of every estimator, by name
+    """
+    true_effect: float
+    n_replicates: int = 0
+    summaries: Dict[str, EstimatorSummary] = field(default_factory=dict)
+
+    def to_frame(self) -> pd.DataFrame:
+        """Get one row per estimator with bias, std, rmse, coverage and the number of (failed) replicates."""
+        return pd.DataFrame.from_dict({
+            name: {"bias": s.bias, "std": s.std, "rmse": s.rmse, "coverage": s.coverage, "n": s.n,
+                   "n_failed": s.n_failed}
+            for name, s in self.summaries.items()
+        }, orient="index")
+
+
+def _get_estimate(result: Any, z: float) -> Tuple[float, float, float]:
+    estimate = float(getattr(result, "ate", getattr(result, "estimate", result)))
+    if hasattr(result, "ci_low") and hasattr(result, "ci_high"):
+        return estimate, float(result.ci_low), float(result.ci_high)
+    std_error = float(getattr(result, "std_error", np.nan))
+    return estimate, estimate - z * std_error, estimate + z * std_error
+
+
+def get_true_effect(scm: StructuralCausalModel, treatment: str, outcome: str, treated: Any = 1, control: Any = 0,
+        n: int = 1_000_000, seed: Seed = 0) -> float:
+    """
+    Estimate the true average effect E[Y | do(X = treated)] - E[Y | do(X = control)] from two interventional samples
+    sharing their noise.
+    :param scm: the structural causal model
+    :param treatment: the treatment node
+    :param outcome: the outcome node
+    :param treated: the value of the treatment in the treated group
+    :param control: the value of the treatment in the control group
+    :param n: the number of samples
+    :param seed: the seed
+    :return: the average effect
+    """
+    total = 0.
+    for do_treated, do_control in zip(scm.iter_samples(n, seed=seed, interventions={treatment: treated}),
+                                      scm.iter_samples(n, seed=seed, interventions={treatment: control})):
+        total += float(np.sum(do_treated[outcome].to_numpy(dtype=float) - do_control[outcome].to_numpy(dtype=float)))
+    return total / n
+
+
+# the model and estimators of a worker process, set once by the initializer instead of being sent with every batch
+_worker_state = {}
+
+
+def _init_worker(scm: StructuralCausalModel, estimators: Dict[str, Callable], n_samples: int, z: float) -> None:
+    _worker_state.update(scm=scm, estimators=estimators, n_samples=n_samples, z=z)
+
+
+def _run_batch(seeds: List[np.random.SeedSequence]) -> np.ndarray:
+    scm, estimators = _worker_state["scm"], _worker_state["estimators"]
+    results = np.full((len(seeds), len(estimators), 3), np.nan)
+    for i, seed in enumerate(seeds):
+        df = scm.sample(_worker_state["n_samples"], seed)
+        for j, estimator in enumerate(estimators.values()):
+            try:
+                results[i, j] = _get_estimate(estimator(df), _worker_state["z"])
+            except NUMERICAL_ERRORS:
+                pass  # a failed replicate
+    return results
+
+
+def _get_name(estimator: Callable) -> str:
+    function = getattr(estimator, "func", estimator)  # functools.partial
+    return getattr(function, "__name__", repr(function))
+
+
+def _get_mechanism_digest(scm: StructuralCausalModel) -> str:
+    # mechanisms, which can't be pickled (e.g. lambdas), are identified by their code
+    digest = hashlib.sha256()
+    for node in scm.order:
+        mechanism = scm.mechanisms[node]
+        try:
+            data = pickle.dumps(mechanism, protocol=4)
+        except (pickle.PicklingError, AttributeError, TypeError):
+            code = getattr(mechanism, "__code__", None)
+            data = code.co_code + repr(code.co_consts).encode() if code is not None else _get_name(mechanism).encode()
+        digest.update(repr((node, scm.parents[node])).encode())
+        digest.update(data)
+    return digest.hexdigest()
+
+
+def _load_checkpoint(path: str, config: Dict[str, Any]) -> Optional[SimulationStudyResult]:
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        checkpoint = json.load(f)
+    if checkpoint["config"] != config:
+        raise ValueError(f"The checkpoint {path} belongs to a different study")
+    return SimulationStudyResult(checkpoint["true_effect"], checkpoint["n_replicates"],
+                                 {name: EstimatorSummary(**s) for name, s in checkpoint["summaries"].items()})
+
+
+def _save_checkpoint(path: str, config: Dict[str, Any], result: SimulationStudyResult) -> None:
+    checkpoint = {"config": config, **asdict(result)}
+    # written to a temporary file first, so an interruption never leaves a broken checkpoint
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary, path)
+
+
+class SimulationStudy:
+    def __init__(self, model: CausalGraph, estimators: Union[Dict[str, Callable], List[Callable]],
+            mechanisms: Optional[Dict[str, Mechanism]] = None, n_samples: int = 1000,
+            true_effect: Optional[float] = None, treated: Any = 1, control: Any = 0, alpha: float = 0.05,
+            seed: int = 0, checkpoint: Optional[str] = None):
+        """
+        :param model: the causal graph defining treatment and outcome
+        :param estimators: the estimators by name (or a list named by their functions), must be picklable for n_jobs > 1
+        :param mechanisms: the mechanisms of the structural causal model generating the data, see `simulate`
+        :param n_samples: the number of samples of every replicate
+        :param true_effect: the true effect, estimated from 1,000,000 interventional samples if None
+        :param treated: the value of the treatment in the treated group (for the true effect)
+        :param control: the value of the treatment in the control group (for the true effect)
+        :param alpha: the confidence intervals built from standard errors cover 1 - alpha
+        :param seed: the seed of the random number generators
+        :param checkpoint: the path of a json file, which the summaries are saved to after every batch and which the
+            study resumes from, if it exists
+        """
+        if not isinstance(estimators, dict):
+            estimators = {_get_name(e): e for e in estimators}
+        self.estimators = estimators
+        self.scm = StructuralCausalModel(model, mechanisms)
+        self.n_samples = n_samples
+        self.z = float(stats.norm.ppf(1 - alpha / 2))
+        self.checkpoint = checkpoint
+        # the seeds of the replicates don't depend on their number, so a finished study can be extended
+        truth_seed, self._replicate_seed = np.random.SeedSequence(seed).spawn(2)
+        if true_effect is None:
+            true_effect = get_true_effect(self.scm, model.treatment, model.outcome, treated, control, seed=truth_seed)
+        self.config = {"version": CHECKPOINT_VERSION, "treatment": model.treatment, "outcome": model.outcome,
+                       "estimators": list(estimators), "n_samples": n_samples, "true_effect": true_effect,
+                       "alpha": alpha, "seed": seed, "mechanisms": _get_mechanism_digest(self.scm)}
+
+        result = _load_checkpoint(checkpoint, self.config) if checkpoint is not None else None
+        self.result = result or SimulationStudyResult(true_effect, 0, {name: EstimatorSummary() for name in estimators})
+
+    def iter_results(self, n_replicates: int = 1000, n_jobs: int = 1,
+            batch_size: int = 10) -> Iterator[SimulationStudyResult]:
+        """
+        Run the replicates, which aren't done yet, batch by batch.
+        :param n_replicates: the total number of replicates
+        :param n_jobs: the number of processes
+        :param batch_size: the number of replicates computed at once by a worker
+        :return: a generator of the result after every batch (the same object, updated in place)
+        """
+        seeds = self._replicate_seed.spawn(n_replicates)
+        batches = [seeds[start:start + batch_size] for start in range(self.result.n_replicates, n_replicates, batch_size)]
+        worker_args = (self.scm, self.estimators, self.n_samples, self.z)
+        if n_jobs == 1:
+            _init_worker(*worker_args)
+            try:
+                for batch in batches:
+                    yield self._fold(_run_batch(batch))
+            finally:
+                _worker_state.clear()
+            return
+
+        with ProcessPoolExecutor(n_jobs, initializer=_init_worker, initargs=worker_args) as executor:
+            for batch in executor.map(_run_batch, batches):
+                yield self._fold(batch)
+
+    def run(self, n_replicates: int = 1000, n_jobs: int = 1, batch_size: int = 10) -> SimulationStudyResult:
+        """Run the replicates, which aren't done yet, see `iter_results`."""
+        for _ in self.iter_results(n_replicates, n_jobs, batch_size):
+            pass
+        return self.result
+
+    def _fold(self, batch: np.ndarray) -> SimulationStudyResult:
+        result = self.result
+        for replicate in batch:
+            for summary, (estimate, low, high) in zip(result.summaries.values(), replicate):
+                summary.add(estimate, low, high, result.true_effect)
+        result.n_replicates += len(batch)
+        if self.checkpoint is not None:
+            _save_checkpoint(self.checkpoint, self.config, result)
+        return result
+
+
+def run_study(model: CausalGraph, estimators: Union[Dict[str, Callable], List[Callable]],
+        mechanisms: Optional[Dict[str, Mechanism]] = None, n_replicates: int = 1000, n_samples: int = 1000,
+        n_jobs: int = 1, seed: int = 0, checkpoint: Optional[str] = None, **kwargs) -> SimulationStudyResult:
+    """
+    Run a simulation study, see `SimulationStudy` for the parameters.
+    :return: the summaries of all estimators
+    """
+    study = SimulationStudy(model, estimators, mechanisms, n_samples, seed=seed, checkpoint=checkpoint, **kwargs)
+    return study.run(n_replicates, n_jobs)
@@ -0,0 +1,293 @@
+"""
+Compact representation of a directed graph for reachability queries.
+Node names are interned to integer ids and every set of nodes is a bitset (a python integer, in which bit i is set if
+the node with id i is part of the set). The parents and children of every node as well as the transitive closure are
+stored as bitsets, so a traversal step over all members of a frontier is a single bitwise or per node.
+"""
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+
+def iter_bits(mask: int) -> Iterator[int]:
+    """Iterate over the ids of all nodes in the bitset."""
+    while mask:
+        lowest_bit = mask & -mask
+        yield lowest_bit.bit_length() - 1
+        mask ^= lowest_bit
+
+
+def _to_mask(node_ids: Iterable[int]) -> int:
+    mask = 0
+    for i in node_ids:
+        mask |= 1 << i
+    return mask
+
+
+class BitsetGraph:
+    def __init__(self, nodes: Iterable[str] = (), edges: Iterable[Tuple[str, str]] = ()):
+        self.ids: Dict[str, int] = {}
+        self.names: List[Optional[str]] = []
+        self.parents: List[int] = []
+        self.children: List[int] = []
+        self._free_ids: List[int] = []
+        # lazily computed transitive closures, None if outdated
+        self._ancestors: List[Optional[int]] = []
+        self._descendants: List[Optional[int]] = []
+
+        # intern all names first, so the adjacency lists are allocated at once
+        ids = self.ids
+        for node in nodes:
+            ids.setdefault(node, len(ids))
+        edges = [(ids.setdefault(source, len(ids)), ids.setdefault(target, len(ids))) for source, target in edges]
+        self.names = list(ids)
+        self.parents = [0] * len(ids)
+        self.children = [0] * len(ids)
+        for source_id, target_id in edges:
+            self.children[source_id] |= 1 << target_id
+            self.parents[target_id] |= 1 << source_id
+        # the closures are computed on demand
+        self._ancestors = [None] * len(self.names)
+        self._descendants = [None] * len(self.names)
+
+    @classmethod
+    def from_ids(cls, names: List[str], sources: Iterable[int], targets: Iterable[int]) -> "BitsetGraph":
+        """
+        Create the graph from an interned node table, whose indices are the node ids, and the edges as pairs of ids.
+        :param names: the unique node names
+        :param sources: the node ids of the sources of the edges
+        :param targets: the node ids of the targets of the edges
+        :return: the graph
+        """
+        graph = cls()
+        graph.names = list(names)
+        graph.ids = {name: i for i, name in enumerate(graph.names)}
+        if len(graph.ids) != len(graph.names):
+            raise ValueError("The node names must be unique")
+        graph.parents = [0] * len(graph.names)
+        graph.children = [0] * len(graph.names)
+        for source_id, target_id in zip(sources, targets):
+            graph.children[source_id] |= 1 << target_id
+            graph.parents[target_id] |= 1 << source_id
+        graph._ancestors = [None] * len(graph.names)
+        graph._descendants = [None] * len(graph.names)
+        return graph
+
+    def __contains__(self, node: str) -> bool:
+        return node in self.ids
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def mask(self, nodes: Iterable[str], ignore_missing: bool = False) -> int:
+        """
+        Get the bitset of the given nodes.
+        :param nodes: the node names
+        :param ignore_missing: skip nodes, which aren't part of the graph, instead of raising a KeyError
+        :return: the bitset
+        """
+        mask = 0
+        for node in nodes:
+            node_id = self.ids.get(node) if ignore_missing else self.ids[node]
+            if node_id is not None:
+                mask |= 1 << node_id
+        return mask
+
+    def nodes(self, mask: int) -> Set[str]:
+        """Get the names of all nodes in the bitset."""
+        return {self.names[i] for i in iter_bits(mask)}
+
+    def add_node(self, node: str) -> int:
+        if node in self.ids:
+            return self.ids[node]
+        if self._free_ids:
+            node_id = self._free_ids.pop()
+            self.names[node_id] = node
+        else:
+            node_id = len(self.names)
+            self.names.append(node)
+            self.parents.append(0)
+            self.children.append(0)
+            self._ancestors.append(None)
+            self._descendants.append(None)
+        self._ancestors[node_id] = 0
+        self._descendants[node_id] = 0
+        self.ids[node] = node_id
+        return node_id
+
+    def remove_node(self, node: str) -> None:
+        self.remove_nodes([node])
+
+    def remove_nodes(self, nodes: Iterable[str]) -> None:
+        """Remove the nodes and their edges, invalidating the affected closures once."""
+        node_ids = [self.ids[node] for node in nodes]
+        removed = _to_mask(node_ids)
+        self._invalidate_closures(removed, removed)
+        for node_id in iter_bits(removed):
+            for parent in iter_bits(self.parents[node_id] & ~removed):
+                self.children[parent] &= ~removed
+            for child in iter_bits(self.children[node_id] & ~removed):
+                self.parents[child] &= ~removed
+            self.parents[node_id] = 0
+            self.children[node_id] = 0
+            self._ancestors[node_id] = None
+            self._descendants[node_id] = None
+            del self.ids[self.names[node_id]]
+            self.names[node_id] = None
+            self._free_ids.append(node_id)
+
+    def add_edge(self, source: str, target: str) -> None:
+        self.add_edges([(source, target)])
+
+    def add_edges(self, edges: Iterable[Tuple[str, str]]) -> None:
+        """Add the edges (and missing nodes), invalidating the affected closures once."""
+        edges = [(self.add_node(source), self.add_node(target)) for source, target in edges]
+        self._invalidate_closures(_to_mask(s for s, _ in edges), _to_mask(t for _, t in edges))
+        for source_id, target_id in edges:
+            self.children[source_id] |= 1 << target_id
+            self.parents[target_id] |= 1 << source_id
+
+    def remove_edge(self, source: str, target: str) -> None:
+        self.remove_edges([(source, target)])
+
+    def remove_edges(self, edges: Iterable[Tuple[str, str]]) -> None:
+        """Remove the edges, invalidating the affected closures once."""
+        edges = [(self.ids[source], self.ids[target]) for source, target in edges]
+        self._invalidate_closures(_to_mask(s for s, _ in edges), _to_mask(t for _, t in edges))
+        for source_id, target_id in edges:
+            self.children[source_id] &= ~(1 << target_id)
+            self.parents[target_id] &= ~(1 << source_id)
+
+    def without_edges(self, edges: Iterable[Tuple[str, str]]) -> "BitsetGraph":
+        """
+        Get a copy of the graph without the edges. The node ids are the same and the closures, which don't depend on
+        the edges, are kept, so the copy is cheap compared to building the graph again.
+        :param edges: the edges to remove
+        :return: the copy
+        """
+        graph = BitsetGraph()
+        graph.ids = dict(self.ids)
+        graph.names = list(self.names)
+        graph.parents = list(self.parents)
+        graph.children = list(self.children)
+        graph._free_ids = list(self._free_ids)
+        graph._ancestors = list(self._ancestors)
+        graph._descendants = list(self._descendants)
+        graph.remove_edges(edges)
+        return graph
+
+    def has_edge(self, source: str, target: str) -> bool:
+        return source in self.ids and target in self.ids and bool(self.children[self.ids[source]] >> self.ids[target] & 1)
+
+    def _invalidate_closures(self, sources: int, targets: int) -> None:
+        # edges from the sources to the targets only change the descendants of the sources and their ancestors
+        # as well as the ancestors of the targets and their descendants (the closures from before the change suffice,
+        # as any new path to a source starts with a path in the old graph to one of the sources)
+        for i in iter_bits(sources):
+            self._descendants[i] = None
+        for i in iter_bits(targets):
+            self._ancestors[i] = None
+        for i, descendants in enumerate(self._descendants):
+            if descendants is not None and descendants & sources:
+                self._descendants[i] = None
+        for i, ancestors in enumerate(self._ancestors):
+            if ancestors is not None and ancestors & targets:
+                self._ancestors[i] = None
+
+    def get_cached_closures(self) -> Tuple[Dict[int, int], Dict[int, int]]:
+        """Get the ancestors and descendants of all nodes, whose closures are computed and up to date, by node id."""
+        return ({i: a for i, a in enumerate(self._ancestors) if a is not None and self.names[i] is not None},
+                {i: d for i, d in enumerate(self._descendants) if d is not None and self.names[i] is not None})
+
+    def set_cached_closures(self, ancestors: Dict[int, int], descendants: Dict[int, int]) -> None:
+        """Restore closures, e.g. loaded from a file, which must match the current graph."""
+        for i, mask in ancestors.items():
+            self._ancestors[i] = mask
+        for i, mask in descendants.items():
+            self._descendants[i] = mask
+
+    def get_ancestors(self, node_id: int) -> int:
+        if self._ancestors[node_id] is None:
+            self._ancestors[node_id] = self._reach(1 << node_id, self.parents, self._ancestors)
+        return self._ancestors[node_id]
+
+    def get_descendants(self, node_id: int) -> int:
+        if self._descendants[node_id] is None:
+            self._descendants[node_id] = self._reach(1 << node_id, self.children, self._descendants)
+        return self._descendants[node_id]
+
+    def ancestors(self, mask: int, ignored_parents: int = 0) -> int:
+        """
+        Get the ancestors of all nodes in the bitset.
+        :param mask: the bitset of nodes
+        :param ignored_parents: the outgoing edges of these nodes are ignored
+        :return: the bitset of ancestors (without the given nodes, unless they are an ancestor of another one)
+        """
+        if ignored_parents:
+            parents = [p & ~ignored_parents for p in self.parents]
+            return self._reach(mask, parents)
+        return self._reach(mask, self.parents, self._ancestors)
+
+    def descendants(self, mask: int) -> int:
+        """Get the descendants of all nodes in the bitset."""
+        return self._reach(mask, self.children, self._descendants)
+
+    @staticmethod
+    def _reach(mask: int, adjacency: List[int], closures: Optional[List[Optional[int]]] = None) -> int:
+        # breadth first search over bitsets; known closures of a node are used instead of expanding it
+        reached = 0
+        frontier = mask
+        while frontier:
+            next_frontier = 0
+            for i in iter_bits(frontier):
+                closure = closures[i] if closures is not None else None
+                if closure is not None:
+                    reached |= closure | adjacency[i]
+                else:
+                    next_frontier |= adjacency[i]
+            frontier = next_frontier & ~reached
+            reached |= frontier
+        return reached
+
+    def get_open_colliders(self, conditioning_set: int, ignored_parents: int = 0) -> int:
+        """
+        Get the nodes which don't block a path as collider, i.e. the conditioning set and its ancestors.
+        :param conditioning_set: the bitset of nodes conditioned on
+        :param ignored_parents: the outgoing edges of these nodes are ignored
+        :return: the bitset of open colliders
+        """
+        return conditioning_set | self.ancestors(conditioning_set, ignored_parents)
+
+    def d_connected(self, sources: int, conditioning_set: int = 0, backdoor: bool = False,
+            open_colliders: Optional[int] = None) -> int:
+        """
+        Get all nodes, which are connected to the source nodes by an active trail given the conditioning set
+        (Bayes-ball algorithm). All nodes reached from a child ('up') or from a parent ('down') in the same step are
+        expanded together.
+        :param sources: the bitset of nodes from which the trails start
+        :param conditioning_set: the bitset of nodes conditioned on
+        :param backdoor: ignore the outgoing edges of the source nodes
+        :param open_colliders: the precomputed open colliders (see `get_open_colliders`)
+        :return: the bitset of d-connected nodes (without the nodes of the conditioning set)
+        """
+        ignored_parents = sources if backdoor else 0
+        if open_colliders is None:
+            open_colliders = self.get_open_colliders(conditioning_set, ignored_parents)
+
+        visited_up = visited_down = 0
+        up, down = sources, 0
+        while up or down:
+            visited_up |= up
+            visited_down |= down
+            next_up = next_down = 0
+            for i in iter_bits(up & ~conditioning_set):
+                next_up |= self.parents[i]
+                if not (backdoor and sources >> i & 1):
+                    next_down |= self.children[i]
+            for i in iter_bits(down & ~conditioning_set):
+                if not (backdoor and sources >> i & 1):
+                    next_down |= self.children[i]
+            for i in iter_bits(down & open_colliders):
+                next_up |= self.parents[i]
+            next_up &= ~ignored_parents
+            up = next_up & ~visited_up
+            down = next_down & ~visited_down
+        return (visited_up | visited_down) & ~conditioning_set
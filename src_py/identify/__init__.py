@@ -1,15 +1,192 @@
-from typing import Dict, List, Set
+"""
+Identification of the causal effect of the treatment on the outcome.
+
+DoWhy supports 3 effect types for identification:
+ - ATE
+ - NDE  (natural direct effect)
+ - NIE  (natural indirect effect)
+and 4 identification criteria:
+ - Back-door criterion
+ - Front-door criterion
+ - Instrumental Variables
+ - Mediation (Direct and indirect effect identification)
+Here the ATE is identified by the back-door and front-door criteria, instrumental variables and the ID algorithm
+(do-calculus).
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
 
 from causal_graph import CausalGraph
-# from .backdoor import check_backdoor_criterion, identify_backdoor
-import src_py.identify.backdoor as backdoor
-import src_py.identify.frontdoor as frontdoor
-import src_py.identify.do_calculus as do_calculus
+from identify import backdoor, do_calculus, frontdoor, instrument
+
+BACKDOOR = "backdoor"
+FRONTDOOR = "frontdoor"
+INSTRUMENT = "instrument"
+DO_CALCULUS = "do-calculus"
+CRITERIA = (BACKDOOR, FRONTDOOR, INSTRUMENT, DO_CALCULUS)
+
+
+@dataclass
+class CriterionResult:
+    """
+    The result of a single identification criterion.
+    :param criterion: the name of the criterion
+    :param sets: the minimal adjustment sets (back-door, do-calculus), front-door sets or instruments found
+    :param complete: False, if the search was stopped by the time budget before all sets were found
+    :param seconds: the time taken by the criterion
+    :param estimand: the estimand of the effect (do-calculus only)
+    :param error: the reason, why the criterion didn't finish
+    """
+    criterion: str
+    sets: List[Any]
+    complete: bool = True
+    seconds: float = 0.
+    estimand: Optional[do_calculus.Expression] = None
+    error: Optional[str] = None
+
+    @property
+    def identifiable(self) -> bool:
+        return bool(self.sets)
+
+
+@dataclass
+class IdentificationReport:
+    """
+    The results of all identification criteria for the effect of the treatment on the outcome.
+    :param treatment: the treatment node
+    :param outcome: the outcome node
+    :param criteria: the result of every criterion, by name
+    """
+    treatment: str
+    outcome: str
+    criteria: Dict[str, CriterionResult] = field(default_factory=dict)
+
+    @property
+    def identifiable(self) -> bool:
+        """True, if any criterion identifies the effect."""
+        return any(r.identifiable for r in self.criteria.values())
+
+    @property
+    def estimand(self) -> Optional[do_calculus.Expression]:
+        result = self.criteria.get(DO_CALCULUS)
+        return result.estimand if result is not None else None
+
+
+def _collect(sets: Iterable[Any], deadline: Optional[float]) -> Tuple[List[Any], bool]:
+    # lazily enumerated sets are collected until the deadline has passed
+    collected = []
+    for s in sets:
+        collected.append(s)
+        if deadline is not None and time.perf_counter() > deadline:
+            return collected, False
+    return collected, True
+
+
+def _identify_backdoor(graph: CausalGraph, treatment: str, outcome: str, deadline: Optional[float]) -> CriterionResult:
+    sets, complete = _collect(backdoor.iter_adjustment_sets(graph, treatment, outcome), deadline)
+    return CriterionResult(BACKDOOR, sets, complete)
+
+
+def _identify_frontdoor(graph: CausalGraph, treatment: str, outcome: str, deadline: Optional[float]) -> CriterionResult:
+    sets, complete = _collect(frontdoor.iter_adjustment_sets(graph, treatment, outcome), deadline)
+    return CriterionResult(FRONTDOOR, sets, complete)
+
+
+def _identify_instrument(graph: CausalGraph, treatment: str, outcome: str,
+        deadline: Optional[float]) -> CriterionResult:
+    sets, complete = _collect(instrument.iter_instruments(graph, treatment, outcome), deadline)
+    return CriterionResult(INSTRUMENT, sets, complete)
+
+
+def _identify_do_calculus(graph: CausalGraph, treatment: str, outcome: str,
+        deadline: Optional[float]) -> CriterionResult:
+    try:
+        estimand = do_calculus.identify_effect(graph, treatment, outcome, deadline)
+    except do_calculus.NotIdentifiableError as e:
+        hedge = ", ".join(sorted(e.hedge[0]))
+        return CriterionResult(DO_CALCULUS, [], error=f"not identifiable, hedge: {{{hedge}}}")
+    except TimeoutError:
+        return CriterionResult(DO_CALCULUS, [], complete=False, error="time budget exceeded")
+    variables = set(do_calculus.get_all_variables(estimand)) - {treatment, outcome}
+    return CriterionResult(DO_CALCULUS, [variables], estimand=estimand)
+
+
+_CRITERIA: Dict[str, Callable[[CausalGraph, str, str, Optional[float]], CriterionResult]] = {
+    BACKDOOR: _identify_backdoor,
+    FRONTDOOR: _identify_frontdoor,
+    INSTRUMENT: _identify_instrument,
+    DO_CALCULUS: _identify_do_calculus,
+}
+
+
+def _precompute(graph: CausalGraph, treatment: str, outcome: str, criteria: Iterable[str]) -> None:
+    """
+    Fill the query cache of the graph with the structures shared by the criteria, so they are computed only once and
+    the criteria mostly read them: the ancestors and descendants of treatment and outcome, the topological order, the
+    moral graph of the back-door graph and the c-components of the latent projection.
+    """
+    graph.get_descendants(treatment)
+    graph.get_ancestors(outcome)
+    graph.get_topological_order()
+    criteria = set(criteria)
+    if BACKDOOR in criteria:
+        backdoor.get_backdoor_moral_graph(graph, treatment, outcome)
+    if DO_CALCULUS in criteria:
+        admg = do_calculus.get_admg(graph)
+        admg.get_c_components(admg.all)
+
+
+def identify(model: CausalGraph, treatment: str = None, outcome: str = None, criteria: Iterable[str] = CRITERIA,
+        n_jobs: int = 1, time_budget: Optional[float] = None) -> IdentificationReport:
+    """
+    Run all identification criteria for the effect of the treatment on the outcome and collect them in one report.
+    The structures shared by the criteria are computed once up front (see `_precompute`).
+    The time budget is checked after every set found by the enumerating criteria (back-door, front-door,
+    instruments), which then report the sets found so far as incomplete, and at every step of the ID algorithm, which
+    then reports no estimand. The criteria share the query cache of the model (which is thread safe) and all threads
+    have finished when the report is returned, so the model can be changed afterwards.
+    :param model: the causal graph
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :param criteria: the names of the criteria to run, see CRITERIA
+    :param n_jobs: the number of threads running the criteria concurrently
+    :param time_budget: the time in seconds available to every criterion, unlimited if None
+    :return: the report
+    """
+    treatment = model.treatment if treatment is None else treatment
+    outcome = model.outcome if outcome is None else outcome
+    if treatment is None or outcome is None:
+        raise ValueError("Treatment and outcome must be defined to identify an effect")
+    criteria = list(criteria)
+    unknown = set(criteria) - set(_CRITERIA)
+    if unknown:
+        raise ValueError(f"Unknown criteria {', '.join(sorted(unknown))}")
+
+    _precompute(model, treatment, outcome, criteria)
+    report = IdentificationReport(treatment, outcome)
+
+    def run(criterion: str) -> CriterionResult:
+        start = time.perf_counter()
+        deadline = start + time_budget if time_budget is not None else None
+        result = _CRITERIA[criterion](model, treatment, outcome, deadline)
+        result.seconds = time.perf_counter() - start
+        return result
+
+    if n_jobs == 1 or len(criteria) <= 1:
+        for criterion in criteria:
+            report.criteria[criterion] = run(criterion)
+        return report
+
+    # every criterion stops itself at its deadline, so the threads are always joined
+    with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+        futures = {criterion: executor.submit(run, criterion) for criterion in criteria}
+        for criterion, future in futures.items():
+            report.criteria[criterion] = future.result()
+    return report
 
 
 def get_adjustment_set(graph: CausalGraph, treatment: str, outcome: str) -> Dict[str, List[Set[str]]]:
-    return {
-        "backdoor": backdoor.get_adjustment_sets(graph, treatment, outcome),
-        "frontoor": frontdoor.get_adjustment_set(graph, treatment, outcome),
-        "do-calculus": do_calculus.get_adjustment_set(graph, treatment, outcome)
-    }
+    report = identify(graph, treatment, outcome, criteria=(BACKDOOR, FRONTDOOR, DO_CALCULUS))
+    return {criterion: result.sets for criterion, result in report.criteria.items()}
@@ -1,9 +1,11 @@
-from typing import List, Optional, Set
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
 from itertools import combinations
 import pandas as pd
 
 import numpy as np
 
+import instrumentation
 from causal_graph import CausalGraph
 
 
@@ -12,6 +14,7 @@ def identify_backdoor(graph: CausalGraph, treatment: str, outcome: str,
     pass
 
 
+@instrumentation.instrument()
 def check_backdoor_criterion(graph: CausalGraph, treatment: str, outcome: str,
         conditioning_set: Optional[Set[str]] = None) -> bool:
     """
@@ -23,79 +26,256 @@ def check_backdoor_criterion(graph: CausalGraph, treatment: str, outcome: str,
     :param treatment: the treatment node
     :param outcome: the outcome node
     :param conditioning_set a set of nodes conditioned on.
-    :return:
+    :return: True if the conditioning set satisfies the backdoor criterion
     """
-    # a valid backdoor criterion:
-    # - a single adjustment set must block all backdoor paths
-    # - descendant of treatment variable must not be part of adjustment set
-    # perform various checks, if minimum set is wanted, finish after first match, ordered by size of adjustment set
-    # 1) check if empty set is valid
-
     if conditioning_set is None:
         conditioning_set = set()
 
-    # eligible nodes for adjustment are all nodes of backdoor paths except descendants of the treatment
-    backdoor_paths = graph.get_backdoor_paths(treatment, outcome, as_edge_list=True)
-
-    # treatment_descendants = nx.descendants(graph.graph, treatment)
-    treatment_descendants = graph.get_post_treatment_nodes()
+    # descendants of the treatment variable must not be part of the adjustment set
+    if not conditioning_set.isdisjoint(graph.get_descendants(treatment)):
+        return False
 
-    all_paths_blocked = all(graph.is_path_blocked(p, conditioning_set) for p in backdoor_paths)
-    return all_paths_blocked
+    # all backdoor paths are blocked, if treatment and outcome are d-separated once the outgoing edges of the
+    # treatment are ignored; this avoids the enumeration of all backdoor paths
+    return graph.d_separated(treatment, outcome, conditioning_set, backdoor=True)
 
 
 def get_adjustment_sets(graph: CausalGraph, treatment: str = None, outcome: str = None, only_minimal_set: bool = True) -> List[
     Set[str]]:
     """
+    Get all sets satisfying the backdoor criterion, see `iter_adjustment_sets`.
+    :param graph: the causal graph
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :param only_minimal_set: only return sets, of which no proper subset satisfies the backdoor criterion
+    :return: a list of adjustment sets
+    """
+    return list(iter_adjustment_sets(graph, treatment, outcome, only_minimal_set))
+
 
-    :param graph:
-    :param treatment:
-    :param outcome:
-    :param only_minimal_set:
-    :return:
+def iter_adjustment_sets(graph: CausalGraph, treatment: str = None, outcome: str = None,
+        only_minimal_set: bool = True) -> Iterator[Set[str]]:
+    """
+    Lazily enumerate the sets of observed nodes satisfying the backdoor criterion with polynomial delay, i.e. the time
+    until the next set is found is polynomial in the size of the graph, no matter how many sets there are in total.
+    The minimal sets are the minimal separators of treatment and outcome in the moralized ancestral graph of the
+    backdoor graph (Tian et al., 1998), which are listed by growing the treatment side of the separator (Takata, 2010).
+    All sets are listed by branching on the nodes (van der Zander et al., 2019, ListSep).
+    :param graph: the causal graph
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :param only_minimal_set: only list sets, of which no proper subset satisfies the backdoor criterion
+    :return: a generator of adjustment sets
     """
     if treatment is None:
         treatment = graph.treatment
     if outcome is None:
         outcome = graph.outcome
 
-    # get all backdoor paths
-    # for every path, iterate over all node combinations
-    backdoor_paths = graph.get_backdoor_paths(treatment, outcome)
+    # neither descendants of the treatment nor unobserved nodes can be adjusted for
+    forbidden_nodes = {treatment, outcome} | graph.get_unobserved_nodes() | graph.get_descendants(treatment)
+    allowed_nodes = set(graph.graph.nodes) - forbidden_nodes
+
+    if only_minimal_set:
+        return _iter_minimal_separators(graph, treatment, outcome, allowed_nodes)
+    return _iter_separators(graph, treatment, outcome, allowed_nodes)
+
+
+def get_backdoor_moral_graph(graph: CausalGraph, treatment: str, outcome: str) -> Dict[str, Set[str]]:
+    """
+    Get the moral graph of the ancestors of treatment and outcome in the backdoor graph as adjacency sets.
+    The result is cached for the structural version of the graph and must not be modified.
+    """
+    return graph.get_cached(("backdoor_moral_graph", treatment, outcome),
+                            lambda: _build_backdoor_moral_graph(graph, treatment, outcome))
+
+
+@instrumentation.instrument()
+def _build_backdoor_moral_graph(graph: CausalGraph, treatment: str, outcome: str) -> Dict[str, Set[str]]:
+    ancestors = graph.get_ancestral_set({treatment, outcome}, ignore_outgoing={treatment})
+    neighbours = {n: set() for n in ancestors}
+    for node in ancestors:
+        parents = [p for p in graph.graph.predecessors(node) if p != treatment]
+        for parent in parents:
+            neighbours[node].add(parent)
+            neighbours[parent].add(node)
+        # marry the parents
+        for p1, p2 in combinations(parents, 2):
+            neighbours[p1].add(p2)
+            neighbours[p2].add(p1)
+    return neighbours
+
+
+@instrumentation.instrument()
+def _iter_minimal_separators(graph: CausalGraph, treatment: str, outcome: str,
+        allowed_nodes: Set[str]) -> Iterator[Set[str]]:
+    neighbours = get_backdoor_moral_graph(graph, treatment, outcome)
+
+    def get_neighbourhood(component: Set[str]) -> Set[str]:
+        return {n for node in component for n in neighbours[node]} - component
 
-    except_nodes = {treatment, outcome}.union(graph.get_unobserved_nodes())
-    valid_adjustment_sets = []
-    n_min_set = np.inf
+    def get_component(start: str, excluded: Set[str]) -> Set[str]:
+        component = {start}
+        to_visit = [start]
+        while to_visit:
+            for n in neighbours[to_visit.pop()]:
+                if n not in component and n not in excluded:
+                    component.add(n)
+                    to_visit.append(n)
+        return component
 
-    for p in backdoor_paths:
-        intermediary_nodes = set(p) - except_nodes
-        max_n = len(intermediary_nodes)
-        for n, adjustment_set in [(n, set(comb)) for n in range(max_n + 1) for comb in
-                                  combinations(intermediary_nodes, n)]:
-            if n > n_min_set:  # stop search after having found all minimal sets for the smallest set size
-                break
-            is_satisfied = check_backdoor_criterion(graph, treatment, outcome, adjustment_set)
-            if is_satisfied and adjustment_set not in valid_adjustment_sets:
-                valid_adjustment_sets.append(adjustment_set)
-                if only_minimal_set and n < n_min_set:
-                    n_min_set = n
+    def close(component: Set[str]) -> Set[str]:
+        # nodes which can't be part of a separator must be on the same side as their neighbours
+        component = set(component)
+        to_visit = list(component)
+        while to_visit:
+            for n in neighbours[to_visit.pop()]:
+                if n not in component and n not in allowed_nodes and n != outcome:
+                    component.add(n)
+                    to_visit.append(n)
+        return component
 
-    return valid_adjustment_sets
+    # every minimal separator S is determined by the component of the treatment in the graph without S;
+    # a search state consists of a part of this component and the nodes, which must not be part of it
+    to_visit = [({treatment}, set())]
+    while to_visit:
+        treatment_side, excluded = to_visit.pop()
+        treatment_side = close(treatment_side)
+        neighbourhood = get_neighbourhood(treatment_side)
+        if outcome in neighbourhood or not treatment_side.isdisjoint(excluded):
+            continue
 
+        # the separator closest to the treatment side consists of the neighbours of the outcome's component
+        separator = get_neighbourhood(get_component(outcome, neighbourhood))
+        treatment_side = get_component(treatment, separator)
+        if not treatment_side.isdisjoint(excluded):
+            continue
+        yield separator
 
-def adjust_backdoor(df: pd.DataFrame, graph: CausalGraph) -> CausalGraph:
+        # every other separator has a larger treatment side, which includes at least one node of this separator;
+        # branch on the first of these nodes, so each separator is listed exactly once
+        candidates = sorted(separator - excluded)
+        for i in reversed(range(len(candidates))):
+            to_visit.append((treatment_side | {candidates[i]}, excluded | set(candidates[:i])))
+
+
+@instrumentation.instrument()
+def _iter_separators(graph: CausalGraph, treatment: str, outcome: str,
+        allowed_nodes: Set[str]) -> Iterator[Set[str]]:
+    # a search state consists of the nodes, which must be part of the separator, and the nodes which may be part of it
+    to_visit = [(set(), allowed_nodes)]
+    while to_visit:
+        included, candidates = to_visit.pop()
+        # if there is any separator in between, the candidates among the ancestors of the included nodes are one
+        ancestors = graph.get_ancestral_set({treatment, outcome} | included, ignore_outgoing={treatment})
+        if not graph.d_separated(treatment, outcome, candidates & ancestors, backdoor=True):
+            continue
+        if included == candidates:
+            yield included
+            continue
+        node = min(candidates - included)
+        to_visit.append((included, candidates - {node}))
+        to_visit.append((included | {node}, candidates))
+
+
+@dataclass
+class BackdoorEstimate:
     """
-    Leverage the information of the causal structure to adjust backdoor paths.
-    :param df: the dataframe for which the causal effect will be adusted.
-    :param graph:
-    :return:
+    The result of the backdoor adjustment.
+    :param ate: the average treatment effect E[Y|do(X=treated)] - E[Y|do(X=control)]
+    :param treated_mean: the adjusted mean of the outcome under treatment E[Y|do(X=treated)]
+    :param control_mean: the adjusted mean of the outcome without treatment E[Y|do(X=control)]
+    :param strata: one row per stratum with the values of the adjustment set, the number of (treated/control) samples,
+        the weight P(Z=z) and the conditional means E[Y|X=x,Z=z]
     """
-    # P(Y|do(X)) = \sum_z P(Y|X, Z=z)P(Z=z)
-    z = graph.adjusted
+    ate: float
+    treated_mean: float
+    control_mean: float
+    strata: pd.DataFrame
+
+
+def get_strata(df: pd.DataFrame, columns: List[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    """
+    Assign every row to the stratum given by the values of the columns.
+    The columns are factorized one by one and the codes are combined to a single code (mixed radix), which is
+    factorized once more to get consecutive stratum ids. The combined code is factorized in between whenever the next
+    column could overflow it, which keeps the order of the strata.
+    :param df: the data
+    :param columns: the (discrete) columns defining the strata
+    :return: the stratum id of every row (-1 if a value is missing) and the values of the columns of every stratum
+    """
+    codes = np.zeros(len(df), dtype=np.int64)
+    n_codes = 1
+    missing = np.zeros(len(df), dtype=bool)
+    for column in columns:
+        column_codes, column_uniques = pd.factorize(df[column], sort=True)
+        missing |= column_codes < 0
+        if n_codes * max(len(column_uniques), 1) > np.iinfo(np.int64).max:
+            codes, combined = pd.factorize(codes, sort=True)
+            n_codes = len(combined)
+        codes = codes * len(column_uniques) + column_codes
+        n_codes *= max(len(column_uniques), 1)
+    codes[missing] = -1
+
+    strata, combined_codes = pd.factorize(codes, sort=True)
+    if len(combined_codes) and combined_codes[0] < 0:
+        # missing values got their own (first) code, since the codes were sorted
+        strata = strata - 1
+
+    # the values of every stratum are those of its first row
+    first = pd.Series(strata).drop_duplicates()
+    first = first[first >= 0].sort_values()
+    return strata, df[columns].iloc[first.index.to_numpy()].reset_index(drop=True)
+
+
+@instrumentation.instrument()
+def adjust_backdoor(df: pd.DataFrame, graph: CausalGraph, adjustment_set: Optional[Set[str]] = None,
+        treated: Any = 1, control: Any = 0, weights: Optional[np.ndarray] = None) -> BackdoorEstimate:
+    """
+    Estimate the causal effect of the treatment on the outcome by stratifying on a set satisfying the backdoor
+    criterion: E[Y|do(X=x)] = \\sum_z E[Y|X=x, Z=z]P(Z=z)
+    All conditional means and weights are computed in a single pass with np.bincount over the factorized strata, so
+    any number of discrete adjustment columns is supported.
+    Strata without treated or without control samples violate positivity, the effect can't be estimated for them.
+    They are listed in the strata table, but left out of the estimate and the weights of the others are rescaled.
+    :param df: the dataframe for which the causal effect will be adjusted
+    :param graph: the causal graph defining treatment and outcome
+    :param adjustment_set: the (discrete) columns to stratify on, defaults to the adjusted nodes of the graph
+    :param treated: the value of the treatment column for treated samples
+    :param control: the value of the treatment column for control samples
+    :param weights: frequency weights of the samples (e.g. the multiplicities of a bootstrap resample)
+    :return: the estimate
+    """
+    z = sorted(graph.adjusted if adjustment_set is None else adjustment_set)
     y = graph.outcome
     x = graph.treatment
 
-    # from Paul Hühnermunds course:   ... for binary values
-    # mean(y[x==1 & z==1] * mean(z==1) + mean(y[x==1 & z==0])*mean(z==0)
-    s_adj = df[df[x]].groupby(list(z))[y].agg("mean")
-    return s_adj.sum()
+    treatment = df[x].to_numpy()
+    is_treated = treatment == treated
+    is_control = treatment == control
+    outcome = df[y].to_numpy(dtype=float)
+    if weights is None:
+        weights = np.ones(len(df))
+
+    strata, values = get_strata(df, z)
+    n_strata = len(values)
+    # samples with missing values or other treatment levels only count for the weights P(Z=z)
+    valid = (strata >= 0) & ~np.isnan(outcome)
+    n = np.bincount(strata[valid], weights=weights[valid], minlength=n_strata)
+    # bin 2 * stratum + 1 holds the treated and 2 * stratum the control samples of a stratum
+    in_groups = valid & (is_treated | is_control)
+    bins = 2 * strata[in_groups] + is_treated[in_groups]
+    counts = np.bincount(bins, weights=weights[in_groups], minlength=2 * n_strata).reshape(n_strata, 2)
+    sums = np.bincount(bins, weights=(weights * outcome)[in_groups], minlength=2 * n_strata).reshape(n_strata, 2)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = sums / counts
+
+    table = values.assign(n=n, n_treated=counts[:, 1], n_control=counts[:, 0], weight=n / max(n.sum(), 1),
+                          treated_mean=means[:, 1], control_mean=means[:, 0])
+    table["effect"] = table["treated_mean"] - table["control_mean"]
+
+    positive = (counts > 0).all(axis=1)
+    weights = n[positive] / n[positive].sum() if positive.any() else np.zeros(0)
+    treated_mean = float(weights @ means[positive, 1]) if positive.any() else np.nan
+    control_mean = float(weights @ means[positive, 0]) if positive.any() else np.nan
+    return BackdoorEstimate(treated_mean - control_mean, treated_mean, control_mean, table)
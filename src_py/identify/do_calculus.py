@@ -0,0 +1,376 @@
+"""
+Identification of causal effects in semi-Markovian models by the ID algorithm (Shpitser & Pearl, 2006), which is
+complete: it returns an estimand in terms of the observational distribution iff the effect is identifiable, otherwise
+it finds a hedge.
+
+The unobserved nodes of a causal graph are projected out (Verma & Pearl, 1990): observed nodes are connected by a
+directed edge, if there is a directed path between them over unobserved nodes only, and by a bidirected edge, if they
+have a common unobserved ancestor connected to both by such paths. The observed nodes are numbered in topological
+order, so every set of nodes is a bitset, whose bits are in topological order as well.
+
+The recursion is memoized by (outcome, intervention, sub-graph), since the distribution of every sub-problem is
+determined by its sub-graph: it is always the effect of intervening on all nodes outside the sub-graph.
+"""
+import time
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple, Union
+
+from causal_graph import CausalGraph
+from graph_core import iter_bits
+
+
+@dataclass(frozen=True)
+class Probability:
+    variables: FrozenSet[str]
+    given: FrozenSet[str] = frozenset()
+
+    def __str__(self) -> str:
+        variables = ", ".join(sorted(self.variables))
+        if self.given:
+            return f"P({variables} | {', '.join(sorted(self.given))})"
+        return f"P({variables})"
+
+
+@dataclass(frozen=True)
+class Product:
+    factors: Tuple["Expression", ...] = ()
+
+    def __str__(self) -> str:
+        if not self.factors:
+            return "1"
+        return " ".join(f"[{f}]" if isinstance(f, Sum) else str(f) for f in self.factors)
+
+
+@dataclass(frozen=True)
+class Sum:
+    over: FrozenSet[str]
+    expression: "Expression"
+
+    def __str__(self) -> str:
+        return f"Σ_{{{', '.join(sorted(self.over))}}} {self.expression}"
+
+
+@dataclass(frozen=True)
+class Fraction:
+    numerator: "Expression"
+    denominator: "Expression"
+
+    def __str__(self) -> str:
+        return f"({self.numerator}) / ({self.denominator})"
+
+
+Expression = Union[Probability, Product, Sum, Fraction]
+ONE = Product()
+
+
+class NotIdentifiableError(ValueError):
+    """
+    The causal effect can't be identified from the observational distribution.
+    :param hedge: the two sets of nodes forming the hedge (Shpitser & Pearl, 2006, Definition 6)
+    """
+    def __init__(self, hedge: Tuple[Set[str], Set[str]]):
+        super().__init__(f"The effect is not identifiable, found the hedge {sorted(hedge[0])}, {sorted(hedge[1])}")
+        self.hedge = hedge
+
+
+def get_variables(expression: Expression) -> FrozenSet[str]:
+    """Get all free variables of the expression."""
+    if isinstance(expression, Probability):
+        return expression.variables | expression.given
+    if isinstance(expression, Product):
+        return frozenset().union(*(get_variables(f) for f in expression.factors))
+    if isinstance(expression, Sum):
+        return get_variables(expression.expression) - expression.over
+    return get_variables(expression.numerator) | get_variables(expression.denominator)
+
+
+def _make_product(factors: Iterable[Expression]) -> Expression:
+    flat = []
+    for factor in factors:
+        flat.extend(factor.factors if isinstance(factor, Product) else [factor])
+    return flat[0] if len(flat) == 1 else Product(tuple(flat))
+
+
+def marginalize(expression: Expression, variables: Iterable[str]) -> Expression:
+    """
+    Sum the expression over the variables. Sums over a variable, which only occurs on the left-hand side of a single
+    probability of a product, are evaluated (e.g. Σ_y P(y|x)P(x) = P(x)), all others are kept symbolic.
+    """
+    variables = frozenset(variables) & get_variables(expression)
+    if not variables:
+        return expression
+    if isinstance(expression, Probability):
+        remaining = expression.variables - variables
+        if variables <= expression.variables:
+            return Probability(remaining, expression.given) if remaining else ONE
+        return Sum(variables, expression)
+    if isinstance(expression, Sum):
+        inner = marginalize(expression.expression, variables)
+        if isinstance(inner, Sum):
+            return Sum(expression.over | inner.over, inner.expression)
+        return Sum(expression.over, inner)
+    if isinstance(expression, Fraction):
+        return Sum(variables, expression)
+
+    factors = list(expression.factors)
+    remaining = set(variables)
+    changed = True
+    while changed:
+        changed = False
+        for variable in sorted(remaining):
+            occurrences = [i for i, f in enumerate(factors) if variable in get_variables(f)]
+            if len(occurrences) == 1 and isinstance(factors[occurrences[0]], Probability) \
+                    and variable in factors[occurrences[0]].variables:
+                factors[occurrences[0]] = marginalize(factors[occurrences[0]], {variable})
+                factors = [f for f in factors if f != ONE]
+                remaining.remove(variable)
+                changed = True
+    product = _make_product(factors)
+    return Sum(frozenset(remaining), product) if remaining else product
+
+
+def divide(numerator: Expression, denominator: Expression) -> Expression:
+    """Divide two expressions, cancelling the common factors of products."""
+    numerator_factors = list(numerator.factors if isinstance(numerator, Product) else [numerator])
+    denominator_factors = []
+    for factor in (denominator.factors if isinstance(denominator, Product) else [denominator]):
+        if factor in numerator_factors:
+            numerator_factors.remove(factor)
+        else:
+            denominator_factors.append(factor)
+    if not denominator_factors:
+        return _make_product(numerator_factors)
+    return Fraction(_make_product(numerator_factors), _make_product(denominator_factors))
+
+
+class ADMG:
+    """
+    The acyclic directed mixed graph of the observed nodes of a causal graph (its latent projection).
+    :param graph: the causal graph
+    """
+    def __init__(self, graph: CausalGraph):
+        unobserved = graph.get_unobserved_nodes() or set()
+        order = [n for n in graph.get_topological_order() if n not in unobserved]
+        self.names: List[str] = order
+        self.ids: Dict[str, int] = {n: i for i, n in enumerate(order)}
+        self.parents: List[int] = [0] * len(order)
+        self.siblings: List[int] = [0] * len(order)
+        self._c_components: Dict[int, List[int]] = {}
+
+        # the observed nodes reachable from every unobserved node by directed paths over unobserved nodes
+        latent_children: Dict[str, int] = {}
+        for node in reversed(graph.get_topological_order()):
+            if node not in unobserved:
+                continue
+            reach = 0
+            for child in graph.graph.successors(node):
+                reach |= latent_children[child] if child in unobserved else 1 << self.ids[child]
+            latent_children[node] = reach
+            for i in iter_bits(reach):
+                self.siblings[i] |= reach & ~(1 << i)
+
+        for node in order:
+            for child in graph.graph.successors(node):
+                children = latent_children[child] if child in unobserved else 1 << self.ids[child]
+                for i in iter_bits(children):
+                    self.parents[i] |= 1 << self.ids[node]
+        self.all = (1 << len(order)) - 1
+
+    def mask(self, nodes: Iterable[str]) -> int:
+        return sum(1 << self.ids[n] for n in set(nodes))
+
+    def nodes(self, mask: int) -> Set[str]:
+        return {self.names[i] for i in iter_bits(mask)}
+
+    def ancestors(self, mask: int, within: int, cut: int = 0) -> int:
+        """
+        Get the ancestors of the nodes (including the nodes) in the sub-graph.
+        :param mask: the nodes
+        :param within: the nodes of the sub-graph
+        :param cut: the incoming edges of these nodes are removed
+        :return: the bitset of ancestors
+        """
+        reached = frontier = mask
+        while frontier:
+            parents = 0
+            for i in iter_bits(frontier & ~cut):
+                parents |= self.parents[i]
+            frontier = parents & within & ~reached
+            reached |= frontier
+        return reached
+
+    def get_markov_blanket(self, node: int, within: int) -> int:
+        """
+        Get the Markov blanket of the node in an ancestral sub-graph: its district (c-component) and the parents of
+        the district. The node is independent of all other nodes of the sub-graph given its Markov blanket.
+        """
+        district = frontier = 1 << node
+        while frontier:
+            siblings = 0
+            for i in iter_bits(frontier):
+                siblings |= self.siblings[i]
+            frontier = siblings & within & ~district
+            district |= frontier
+        parents = 0
+        for i in iter_bits(district):
+            parents |= self.parents[i]
+        return (district | parents) & within & ~(1 << node)
+
+    def get_c_components(self, within: int) -> List[int]:
+        """Get the c-components of the sub-graph, i.e. the sets of nodes connected by bidirected edges."""
+        if within not in self._c_components:
+            components = []
+            remaining = within
+            while remaining:
+                component = frontier = remaining & -remaining
+                while frontier:
+                    siblings = 0
+                    for i in iter_bits(frontier):
+                        siblings |= self.siblings[i]
+                    frontier = siblings & within & ~component
+                    component |= frontier
+                components.append(component)
+                remaining &= ~component
+            self._c_components[within] = components
+        return self._c_components[within]
+
+
+class IDAlgorithm:
+    """
+    The ID algorithm (Shpitser & Pearl, 2006, Figure 3) on an ADMG.
+    :param admg: the latent projection of the causal graph
+    :param deadline: the time (`time.perf_counter`) after which the recursion is stopped
+    """
+    def __init__(self, admg: ADMG, deadline: Optional[float] = None):
+        self.admg = admg
+        self.deadline = deadline
+        self._results: Dict[Tuple[int, int, int], Expression] = {}
+
+    def identify(self, outcome: Set[str], treatment: Set[str]) -> Expression:
+        """
+        Get the estimand of P(outcome | do(treatment)).
+        :param outcome: the outcome nodes
+        :param treatment: the treatment nodes
+        :return: the estimand
+        :raises NotIdentifiableError: if the effect is not identifiable
+        :raises TimeoutError: if the deadline has passed
+        """
+        admg = self.admg
+        return self._id(admg.mask(outcome), admg.mask(treatment), admg.all,
+                        Probability(frozenset(admg.names)))
+
+    def _conditional(self, p: Expression, v: int, node: int) -> Expression:
+        # P(v_i | v_π^(i-1)) of the distribution p over v given all predecessors in the topological order
+        admg = self.admg
+        name = admg.names[node]
+        predecessors = v & ((1 << node) - 1)
+        if isinstance(p, Probability) and p.variables == frozenset(admg.nodes(v)):
+            # the node and its predecessors form an ancestral set, so only its Markov blanket in there is relevant
+            blanket = admg.get_markov_blanket(node, predecessors | 1 << node)
+            return Probability(frozenset([name]), frozenset(admg.nodes(blanket)) | p.given)
+        numerator = marginalize(p, admg.nodes(v & ~predecessors & ~(1 << node)))
+        denominator = marginalize(p, admg.nodes(v & ~predecessors))
+        return divide(numerator, denominator)
+
+    def _id(self, y: int, x: int, v: int, p: Expression) -> Expression:
+        key = (y, x, v)
+        if key not in self._results:
+            self._results[key] = self._compute(y, x, v, p)
+        return self._results[key]
+
+    def _compute(self, y: int, x: int, v: int, p: Expression) -> Expression:
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise TimeoutError("The time budget of the ID algorithm is exceeded")
+        admg = self.admg
+        # line 1: no intervention
+        if not x:
+            return marginalize(p, admg.nodes(v & ~y))
+
+        # line 2: nodes, which aren't ancestors of the outcome, are irrelevant
+        ancestors = admg.ancestors(y, v)
+        if ancestors != v:
+            return self._id(y, x & ancestors, ancestors, marginalize(p, admg.nodes(v & ~ancestors)))
+
+        # line 3: intervening on nodes, which don't affect the outcome once x is fixed, doesn't change the effect
+        w = v & ~x & ~admg.ancestors(y, v, cut=x)
+        if w:
+            return self._id(y, x | w, v, p)
+
+        # line 4: factorize into the c-components of the graph without x
+        components = admg.get_c_components(v & ~x)
+        if len(components) > 1:
+            factors = [self._id(s, v & ~s, v, p) for s in components]
+            return marginalize(_make_product(factors), admg.nodes(v & ~(y | x)))
+
+        s = components[0]
+        graph_components = admg.get_c_components(v)
+        # line 5: the graph is a single c-component, which forms a hedge with s
+        if graph_components == [v]:
+            raise NotIdentifiableError((admg.nodes(v), admg.nodes(s)))
+
+        # line 6: s is a c-component of the graph
+        if s in graph_components:
+            factors = [self._conditional(p, v, i) for i in iter_bits(s)]
+            return marginalize(_make_product(factors), admg.nodes(s & ~y))
+
+        # line 7: s is part of a larger c-component s', whose distribution is given by the factors of its nodes
+        s_prime = next(c for c in graph_components if c & s == s)
+        p_prime = _make_product(self._conditional(p, v, i) for i in iter_bits(s_prime))
+        return self._id(y, x & s_prime, s_prime, p_prime)
+
+
+def get_admg(graph: CausalGraph) -> ADMG:
+    """Get the latent projection of the graph, which is cached for the structural version of the graph."""
+    # the projection depends on the unobserved nodes, which can change without changing the structure of the graph
+    unobserved = frozenset(graph.get_unobserved_nodes() or ())
+    return graph.get_cached(("admg", unobserved), lambda: ADMG(graph))
+
+
+def identify_effect(graph: CausalGraph, treatment: Union[str, Set[str]] = None,
+        outcome: Union[str, Set[str]] = None, deadline: Optional[float] = None) -> Expression:
+    """
+    Get an estimand of the causal effect P(outcome | do(treatment)) in terms of the observational distribution.
+    :param graph: the causal graph, unobserved nodes and bidirected edges ('a -- b') model latent confounding
+    :param treatment: the treatment node(s), defaults to the treatment of the graph
+    :param outcome: the outcome node(s), defaults to the outcome of the graph
+    :param deadline: the time (`time.perf_counter`) after which the ID algorithm is stopped, unlimited if None
+    :return: the estimand
+    :raises NotIdentifiableError: if the effect is not identifiable
+    :raises TimeoutError: if the deadline has passed
+    """
+    treatment = graph.treatment if treatment is None else treatment
+    outcome = graph.outcome if outcome is None else outcome
+    treatment = {treatment} if isinstance(treatment, str) else set(treatment)
+    outcome = {outcome} if isinstance(outcome, str) else set(outcome)
+    admg = get_admg(graph)
+    if not (treatment | outcome) <= set(admg.ids):
+        raise ValueError("Treatment and outcome must be observed nodes of the graph")
+
+    key = ("id", frozenset(admg.ids), frozenset(treatment), frozenset(outcome))
+    return graph.get_cached(key, lambda: IDAlgorithm(admg, deadline).identify(outcome, treatment))
+
+
+def get_adjustment_set(graph: CausalGraph, treatment: str, outcome: str) -> List[Set[str]]:
+    """
+    Get the observed variables needed to compute the effect of the treatment on the outcome by the ID algorithm.
+    :param graph: the causal graph
+    :param treatment: the treatment node
+    :param outcome: the outcome node
+    :return: a list with the variables of the estimand besides treatment and outcome, empty if not identifiable
+    """
+    try:
+        estimand = identify_effect(graph, treatment, outcome)
+    except NotIdentifiableError:
+        return []
+    return [set(get_all_variables(estimand)) - {treatment, outcome}]
+
+
+def get_all_variables(expression: Expression) -> FrozenSet[str]:
+    """Get the free and the bound variables of an expression."""
+    if isinstance(expression, Probability):
+        return expression.variables | expression.given
+    if isinstance(expression, Product):
+        return frozenset().union(*(get_all_variables(f) for f in expression.factors))
+    if isinstance(expression, Sum):
+        return get_all_variables(expression.expression)
+    return get_all_variables(expression.numerator) | get_all_variables(expression.denominator)
@@ -0,0 +1,223 @@
+from dataclasses import dataclass
+from typing import Any, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+
+from causal_graph import CausalGraph
+from graph_core import BitsetGraph, iter_bits
+from identify.backdoor import get_strata
+from utils import is_discrete
+
+DISCRETE = "discrete"
+LINEAR = "linear"
+
+
+def check_frontdoor_criterion(graph: CausalGraph, treatment: str, outcome: str, mediators: Set[str]) -> bool:
+    """
+    Check if the mediators satisfy the front-door criterion (Pearl, 2009, Definition 3.3.3):
+        1) they intercept all directed paths from the treatment to the outcome
+        2) there is no unblocked backdoor path from the treatment to any mediator
+        3) all backdoor paths from a mediator to the outcome are blocked by the treatment
+    :param graph: the causal graph
+    :param treatment: the treatment node
+    :param outcome: the outcome node
+    :param mediators: the set of mediators
+    :return: True if the mediators satisfy the front-door criterion
+    """
+    if treatment in mediators or outcome in mediators or not mediators.isdisjoint(graph.get_unobserved_nodes()):
+        return False
+    core = graph.core
+    # 1) the outcome can't be reached from the treatment once the mediators are removed
+    if _get_reachable(core, core.mask({treatment}), core.mask(mediators)) & core.mask({outcome}):
+        return False
+    # 2) and 3) only depend on single mediators, since the conditioning sets don't contain any mediator
+    return all(_is_frontdoor_candidate(graph, treatment, outcome, m) for m in mediators)
+
+
+def _is_frontdoor_candidate(graph: CausalGraph, treatment: str, outcome: str, node: str) -> bool:
+    return (graph.d_separated(treatment, node, backdoor=True)
+            and graph.d_separated(node, outcome, {treatment}, backdoor=True))
+
+
+def _get_reachable(core: BitsetGraph, sources: int, removed: int) -> int:
+    # all nodes reachable from the sources by a directed path, which doesn't pass through the removed nodes
+    reached = sources
+    frontier = sources
+    while frontier:
+        next_frontier = 0
+        for i in iter_bits(frontier):
+            next_frontier |= core.children[i]
+        frontier = next_frontier & ~removed & ~reached
+        reached |= frontier
+    return reached
+
+
+def get_adjustment_set(graph: CausalGraph, treatment: str = None, outcome: str = None) -> List[Set[str]]:
+    """
+    Get all minimal sets of mediators satisfying the front-door criterion, see `iter_adjustment_sets`.
+    :param graph: the causal graph
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :return: a list of front-door sets
+    """
+    return list(iter_adjustment_sets(graph, treatment, outcome))
+
+
+def iter_adjustment_sets(graph: CausalGraph, treatment: str = None, outcome: str = None) -> Iterator[Set[str]]:
+    """
+    Lazily enumerate the minimal sets of observed nodes satisfying the front-door criterion.
+    The conditions 2) and 3) of the criterion hold for a set, iff they hold for each of its nodes, so the candidates
+    are found by two reachability queries per node. The minimal front-door sets are then the minimal sets of
+    candidates cutting all directed paths from the treatment to the outcome, which are listed like the minimal
+    separators of the backdoor criterion by growing the treatment side of the cut (Takata, 2010).
+    :param graph: the causal graph
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :return: a generator of front-door sets
+    """
+    if treatment is None:
+        treatment = graph.treatment
+    if outcome is None:
+        outcome = graph.outcome
+    core = graph.core
+    if core.has_edge(treatment, outcome):
+        return
+
+    # only nodes on a directed path from the treatment to the outcome can be part of a minimal cut
+    causal_nodes = (graph.get_descendants(treatment) & graph.get_ancestors(outcome)) - graph.get_unobserved_nodes()
+    candidates = core.mask(n for n in causal_nodes if _is_frontdoor_candidate(graph, treatment, outcome, n))
+    treatment_bit, outcome_bit = core.mask({treatment}), core.mask({outcome})
+    causal_mask = core.mask(graph.get_descendants(treatment) & graph.get_ancestors(outcome)) | treatment_bit
+
+    def get_cut(side: int) -> int:
+        return _get_successors(core, side) & ~side
+
+    def close(side: int) -> int:
+        # nodes which can't be cut must be on the same side as their parents
+        while True:
+            closed = side | (get_cut(side) & causal_mask & ~candidates)
+            if closed == side:
+                return side
+            side = closed
+
+    def reaches_outcome(cut: int) -> int:
+        # the nodes, from which the outcome can be reached without passing through the cut
+        reached = outcome_bit
+        frontier = outcome_bit
+        while frontier:
+            next_frontier = 0
+            for i in iter_bits(frontier):
+                next_frontier |= core.parents[i]
+            frontier = next_frontier & ~cut & ~reached
+            reached |= frontier
+        return reached
+
+    to_visit = [(treatment_bit, 0)]
+    while to_visit:
+        treatment_side, excluded = to_visit.pop()
+        treatment_side = close(treatment_side)
+        cut = get_cut(treatment_side) & (causal_mask | outcome_bit)
+        if cut & outcome_bit or treatment_side & excluded:
+            continue
+
+        # the minimal cut closest to the treatment side consists of the nodes of the cut, from which the outcome can
+        # be reached without passing through another node of the cut
+        to_outcome = reaches_outcome(cut)
+        cut = sum(1 << i for i in iter_bits(cut) if core.children[i] & to_outcome)
+        treatment_side = _get_reachable(core, treatment_bit, cut)
+        if treatment_side & excluded:
+            continue
+        yield core.nodes(cut)
+
+        # every other minimal cut has a larger treatment side, which includes at least one node of this cut;
+        # branch on the first of these nodes, so each cut is listed exactly once
+        branch_nodes = list(iter_bits(cut & ~excluded))
+        for i in reversed(range(len(branch_nodes))):
+            before = sum(1 << j for j in branch_nodes[:i])
+            to_visit.append((treatment_side | 1 << branch_nodes[i], excluded | before))
+
+
+def _get_successors(core: BitsetGraph, mask: int) -> int:
+    successors = 0
+    for i in iter_bits(mask):
+        successors |= core.children[i]
+    return successors
+
+
+@dataclass
+class FrontdoorEstimate:
+    """
+    The result of the front-door adjustment.
+    :param ate: the average treatment effect E[Y|do(X=treated)] - E[Y|do(X=control)]
+    :param outcome_means: E[Y|do(X=x)] for every value x of the treatment (discrete data only)
+    :param mediators: the mediators used for the adjustment
+    :param method: DISCRETE or LINEAR
+    """
+    ate: float
+    outcome_means: Optional[pd.Series]
+    mediators: Set[str]
+    method: str
+
+
+def adjust_frontdoor(df: pd.DataFrame, graph: CausalGraph, mediators: Optional[Set[str]] = None,
+        method: Optional[str] = None, treated: Any = 1, control: Any = 0) -> FrontdoorEstimate:
+    """
+    Estimate the causal effect of the treatment on the outcome by front-door adjustment.
+    For discrete data the front-door formula E[Y|do(X=x)] = \\sum_m P(m|x) \\sum_x' E[Y|x', m]P(x') is evaluated on
+    the counts and outcome sums of all (treatment, mediator) cells, which take a single np.bincount.
+    For linear data the effect is the product of the effect of the treatment on the mediators and the effect of the
+    mediators on the outcome given the treatment (two-stage regression), both solved from one cross-product matrix.
+    :param df: the data
+    :param graph: the causal graph defining treatment and outcome
+    :param mediators: the front-door set, defaults to the first minimal one
+    :param method: DISCRETE or LINEAR, defaults to DISCRETE if treatment and mediators are discrete
+    :param treated: the value of the treatment column for treated samples
+    :param control: the value of the treatment column for control samples
+    :return: the estimate
+    """
+    x, y = graph.treatment, graph.outcome
+    if mediators is None:
+        mediators = next(iter_adjustment_sets(graph, x, y), None)
+        if mediators is None:
+            raise ValueError(f"There is no set satisfying the front-door criterion for {x} -> {y}")
+    m = sorted(mediators)
+    if method is None:
+        method = DISCRETE if all(is_discrete(df[c]) for c in [x] + m) else LINEAR
+
+    if method == LINEAR:
+        return FrontdoorEstimate(_get_linear_effect(df, x, m, y), None, set(m), LINEAR)
+    if method != DISCRETE:
+        raise ValueError(f"Unknown method {method}")
+
+    x_codes, x_values = pd.factorize(df[x], sort=True)
+    m_codes, m_values = get_strata(df, m)
+    outcome = df[y].to_numpy(dtype=float)
+    valid = (x_codes >= 0) & (m_codes >= 0) & ~np.isnan(outcome)
+    n_x, n_m = len(x_values), len(m_values)
+
+    cells = x_codes[valid] * n_m + m_codes[valid]
+    counts = np.bincount(cells, minlength=n_x * n_m).reshape(n_x, n_m)
+    sums = np.bincount(cells, weights=outcome[valid], minlength=n_x * n_m).reshape(n_x, n_m)
+    x_counts = counts.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_m_given_x = counts / x_counts[:, None]
+        # \sum_x' E[Y|x', m]P(x') is undefined (nan) for mediator values, which weren't observed with every treatment
+        adjusted_outcome = (x_counts / x_counts.sum()) @ (sums / counts)
+    means = np.where(p_m_given_x > 0, p_m_given_x * adjusted_outcome, 0).sum(axis=1)
+    outcome_means = pd.Series(means, index=x_values)
+
+    ate = outcome_means.get(treated, np.nan) - outcome_means.get(control, np.nan)
+    return FrontdoorEstimate(float(ate), outcome_means, set(m), DISCRETE)
+
+
+def _get_linear_effect(df: pd.DataFrame, x: str, m: List[str], y: str) -> float:
+    values = df[[x] + m + [y]].to_numpy(dtype=float)
+    values = values[~np.isnan(values).any(axis=1)]
+    values -= values.mean(axis=0)
+    cross_products = values.T @ values
+    # first stage: the effect of the treatment on every mediator
+    treatment_effects = cross_products[0, 1:-1] / cross_products[0, 0]
+    # second stage: the effect of the mediators on the outcome, adjusted for the treatment
+    outcome_effects = np.linalg.lstsq(cross_products[:-1, :-1], cross_products[:-1, -1], rcond=None)[0][1:]
+    return float(treatment_effects @ outcome_effects)
@@ -0,0 +1,146 @@
+"""
+Search for (conditional) instrumental variables. A node Z is an instrument relative to the effect of the treatment X on
+the outcome Y given the conditioning set W (van der Zander et al., 2015, Definition 3), if
+    1) W contains no descendants of the nodes on causal paths from X to Y
+    2) Z and X are d-connected given W in G_c
+    3) Z and Y are d-separated given W in G_c
+where G_c is the graph without the first edges of all causal paths from X to Y.
+All conditions are checked by reachability queries on the bitset representation of G_c, which is derived from the
+bitset graph of the model, so the closures cached there are reused.
+"""
+from dataclasses import dataclass, field
+from typing import FrozenSet, Iterator, List, Optional, Set
+
+from causal_graph import CausalGraph
+from graph_core import iter_bits
+
+
+@dataclass(frozen=True)
+class Instrument:
+    instrument: str
+    conditioning_set: FrozenSet[str] = field(default_factory=frozenset)
+
+    def __str__(self) -> str:
+        if self.conditioning_set:
+            return f"{self.instrument} | {', '.join(sorted(self.conditioning_set))}"
+        return self.instrument
+
+
+class _InstrumentSearch:
+    def __init__(self, graph: CausalGraph, treatment: str, outcome: str):
+        self.treatment = treatment
+        self.outcome = outcome
+        causal_nodes = (graph.get_descendants(treatment) & graph.get_ancestors(outcome)) | {outcome}
+        removed_edges = {(treatment, n) for n in graph.graph.successors(treatment) if n in causal_nodes}
+        self.core = graph.core.without_edges(removed_edges)
+
+        forbidden = set(causal_nodes)
+        for node in causal_nodes:
+            forbidden |= graph.get_descendants(node)
+        self.forbidden = forbidden | {treatment} | (graph.get_unobserved_nodes() or set())
+        self.allowed = self.core.mask(set(graph.graph.nodes) - self.forbidden)
+        self._topological_order = graph.get_topological_order()
+
+    def is_instrument(self, instrument: str, conditioning_set: Set[str]) -> bool:
+        core = self.core
+        z = core.mask(conditioning_set)
+        if z & ~self.allowed or instrument in conditioning_set:
+            return False
+        connected = core.d_connected(core.mask({instrument}), z)
+        return bool(connected & core.mask({self.treatment})) and not connected & core.mask({self.outcome})
+
+    def find_conditioning_set(self, instrument: str) -> Optional[Set[str]]:
+        """
+        Find a conditioning set, for which the node is an instrument. If there is such a set among the ancestors of
+        instrument and outcome, the separator of instrument and outcome closest to the outcome is one (van der Zander
+        et al., 2015, Lemma 3.6). Sets including other nodes (colliders connecting instrument and treatment) are only
+        found greedily, so the search is complete for ancestral conditioning sets only.
+        """
+        core = self.core
+        instrument_bit, outcome_bit = core.mask({instrument}), core.mask({self.outcome})
+        ancestral_set = core.ancestors(instrument_bit | outcome_bit) | instrument_bit | outcome_bit
+        candidates = ancestral_set & self.allowed & ~instrument_bit
+        if core.d_connected(instrument_bit, candidates) & outcome_bit:
+            return None
+
+        # the separator closest to the outcome: the candidates adjacent to the outcome's component in the moral graph
+        # of the ancestral set, once all candidates are removed
+        component = frontier = outcome_bit
+        while frontier:
+            neighbours = 0
+            for i in iter_bits(frontier):
+                neighbours |= self._get_moral_neighbours(i, ancestral_set)
+            frontier = neighbours & ~candidates & ~component
+            component |= frontier
+        separator = 0
+        for i in iter_bits(component):
+            separator |= self._get_moral_neighbours(i, ancestral_set) & candidates
+
+        if core.d_connected(instrument_bit, separator) & core.mask({self.treatment}):
+            return core.nodes(separator)
+
+        # the treatment might still be reached through colliders outside the ancestral set: add the remaining allowed
+        # nodes one by one, as long as the instrument stays separated from the outcome. Colliders on paths from the
+        # instrument are its descendants, so these are tried first (each group in topological order).
+        descendants = core.descendants(instrument_bit)
+        order = sorted(self._topological_order, key=lambda n: not core.mask({n}) & descendants)
+        for node in order:
+            bit = core.mask({node})
+            if not bit & self.allowed & ~ancestral_set & ~instrument_bit:
+                continue
+            if not core.d_connected(instrument_bit, separator | bit) & outcome_bit:
+                separator |= bit
+                if core.d_connected(instrument_bit, separator) & core.mask({self.treatment}):
+                    return core.nodes(separator)
+        return None
+
+    def _get_moral_neighbours(self, node: int, ancestral_set: int) -> int:
+        core = self.core
+        neighbours = core.parents[node] | core.children[node]
+        for child in iter_bits(core.children[node] & ancestral_set):
+            neighbours |= core.parents[child]
+        return neighbours & ancestral_set & ~(1 << node)
+
+
+def check_instrument(graph: CausalGraph, instrument: str, conditioning_set: Optional[Set[str]] = None,
+        treatment: str = None, outcome: str = None) -> bool:
+    """
+    Check if the node is an instrument for the effect of the treatment on the outcome given the conditioning set.
+    :param graph: the causal graph
+    :param instrument: the instrument node
+    :param conditioning_set: the nodes conditioned on
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :return: True if the node is a (conditional) instrument
+    """
+    treatment = graph.treatment if treatment is None else treatment
+    outcome = graph.outcome if outcome is None else outcome
+    return _InstrumentSearch(graph, treatment, outcome).is_instrument(instrument, conditioning_set or set())
+
+
+def iter_instruments(graph: CausalGraph, treatment: str = None, outcome: str = None) -> Iterator[Instrument]:
+    """
+    Find all nodes, which are (conditional) instruments, together with a conditioning set for each of them.
+    Unconditional instruments are reported with an empty conditioning set.
+    :param graph: the causal graph
+    :param treatment: the treatment node, defaults to the treatment of the graph
+    :param outcome: the outcome node, defaults to the outcome of the graph
+    :return: a generator of instruments
+    """
+    treatment = graph.treatment if treatment is None else treatment
+    outcome = graph.outcome if outcome is None else outcome
+    search = _InstrumentSearch(graph, treatment, outcome)
+    for node in sorted(graph.graph.nodes):
+        if node in search.forbidden or node == outcome:
+            continue
+        if search.is_instrument(node, set()):
+            yield Instrument(node)
+            continue
+        conditioning_set = search.find_conditioning_set(node)
+        if conditioning_set is not None:
+            yield Instrument(node, frozenset(conditioning_set))
+
+
+def get_instruments(graph: CausalGraph, treatment: str = None, outcome: str = None) -> List[Instrument]:
+    """Get all (conditional) instruments, see `iter_instruments`."""
+    return list(iter_instruments(graph, treatment, outcome))
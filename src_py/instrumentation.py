@@ -0,0 +1,181 @@
+"""
+Opt-in instrumentation of the hot paths of graph queries, identification and serialization. For every instrumented
+function (or block) it records
+ - calls: the number of calls
+ - seconds, max_seconds: the total and the longest wall time of a call
+ - items: the number of results, e.g. the paths enumerated, the sets yielded by a generator or the elements rebuilt
+and named counters can be increased anywhere. The query cache statistics of a graph are added by `snapshot`.
+
+While disabled, an instrumented function costs a single flag check per call, so the instrumentation can stay in
+production code. It's enabled by `enable()` or by setting the environment variable CAUSAL_INSTRUMENTATION=1 and the
+records are exported as dict or json by `snapshot` and `to_json`. Records are updated under a lock, as identification
+runs its criteria in threads.
+"""
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Optional
+
+
+@dataclass
+class CallStats:
+    """
+    The statistics of an instrumented function.
+    :param calls: the number of calls
+    :param seconds: the total wall time
+    :param max_seconds: the wall time of the longest call
+    :param items: the number of results
+    """
+    calls: int = 0
+    seconds: float = 0.
+    max_seconds: float = 0.
+    items: int = 0
+
+
+_enabled = os.environ.get("CAUSAL_INSTRUMENTATION", "").lower() in ("1", "true", "yes")
+_stats: Dict[str, CallStats] = {}
+_counters: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    """Drop all records."""
+    with _lock:
+        _stats.clear()
+        _counters.clear()
+
+
+def record(name: str, seconds: float, items: int = 0) -> None:
+    """Record a call, which took the given time."""
+    with _lock:
+        stats = _stats.get(name)
+        if stats is None:
+            stats = _stats[name] = CallStats()
+        stats.calls += 1
+        stats.seconds += seconds
+        stats.max_seconds = max(stats.max_seconds, seconds)
+        stats.items += items
+
+
+def count(name: str, n: int = 1) -> None:
+    """Increase a counter, if the instrumentation is enabled."""
+    if _enabled:
+        with _lock:
+            _counters[name] = _counters.get(name, 0) + n
+
+
+def instrument(name: Optional[str] = None, items: Optional[Callable[[Any], int]] = None) -> Callable:
+    """
+    Record the calls of the decorated function. The time of a generator function is the time spent in the generator
+    until it's exhausted or closed and its items are the number of values yielded.
+    :param name: the name of the record, defaults to module.qualified_name of the function
+    :param items: a function counting the items of the result
+    :return: the decorator
+    """
+    def decorator(function: Callable) -> Callable:
+        record_name = name or f"{function.__module__.rsplit('.', 1)[-1]}.{function.__qualname__}"
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def generator_wrapper(*args, **kwargs):
+                if not _enabled:
+                    return (yield from function(*args, **kwargs))
+                generator = function(*args, **kwargs)
+                seconds, n = 0., 0
+                try:
+                    while True:
+                        start = time.perf_counter()
+                        try:
+                            value = next(generator)
+                        except StopIteration as stop:
+                            return stop.value
+                        finally:
+                            seconds += time.perf_counter() - start
+                        n += 1
+                        yield value
+                finally:
+                    generator.close()
+                    record(record_name, seconds, n)
+            return generator_wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            record(record_name, time.perf_counter() - start, items(result) if items is not None else 0)
+            return result
+        return wrapper
+    return decorator
+
+
+class timer:
+    """
+    Record a block like a call, e.g.
+        with instrumentation.timer("session.hash"):
+            ...
+    :param name: the name of the record
+    """
+    __slots__ = ("name", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.start = None
+
+    def __enter__(self) -> "timer":
+        if _enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self.start is not None:
+            record(self.name, time.perf_counter() - self.start)
+
+
+def snapshot(model: Optional[Any] = None) -> Dict[str, Any]:
+    """
+    Get all records, the slowest functions first.
+    :param model: a causal graph, whose cache statistics are added: the hits of its query cache (the cached path and
+        separation queries) and the number of ancestor and descendant closures cached by its bitset graph, whose
+        lookups aren't counted
+    :return: {"enabled": ..., "calls": {name: stats}, "counters": {name: count}, "query_cache": {...},
+        "closure_cache": {...}}
+    """
+    with _lock:
+        calls = {name: {**asdict(s), "mean_seconds": s.seconds / s.calls if s.calls else 0.}
+                 for name, s in sorted(_stats.items(), key=lambda item: -item[1].seconds)}
+        counters = dict(sorted(_counters.items()))
+    result = {"enabled": _enabled, "calls": calls, "counters": counters}
+    if model is not None:
+        cache = model._cache
+        lookups = cache.hits + cache.misses
+        result["query_cache"] = {"hits": cache.hits, "misses": cache.misses,
+                                 "hit_rate": cache.hits / lookups if lookups else None, "version": cache.version}
+        ancestors, descendants = model._core.get_cached_closures()
+        result["closure_cache"] = {"nodes": len(model._core), "ancestors": len(ancestors),
+                                   "descendants": len(descendants)}
+    return result
+
+
+def to_json(model: Optional[Any] = None, indent: Optional[int] = 2) -> str:
+    """Export the records as json, see `snapshot`."""
+    return json.dumps(snapshot(model), indent=indent)
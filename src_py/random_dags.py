@@ -0,0 +1,137 @@
+"""
+Seeded random DAGs for tests and benchmarks:
+ - Erdős–Rényi: every pair of nodes is connected with the same probability
+ - scale-free: preferential attachment (Barabási–Albert), every new node gets edges from nodes with a high degree
+ - layered: the nodes are split into layers and every node gets its parents from the previous layer
+The nodes are named v0, ..., v{n-1} in a topological order, i.e. every edge points from a lower to a higher index.
+"""
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from causal_graph import CausalGraph, NodeAttribute
+
+ERDOS_RENYI = "erdos-renyi"
+SCALE_FREE = "scale-free"
+LAYERED = "layered"
+
+Edges = List[Tuple[str, str]]
+
+
+def _names(n: int) -> List[str]:
+    return [f"v{i}" for i in range(n)]
+
+
+def erdos_renyi_dag(n: int, expected_degree: float = 3., seed: Optional[int] = None) -> Edges:
+    """
+    :param n: the number of nodes
+    :param expected_degree: the expected number of neighbours (parents and children) of a node
+    :param seed: the seed
+    :return: the edges
+    """
+    rng = np.random.default_rng(seed)
+    names = _names(n)
+    p = min(expected_degree / (n - 1), 1.) if n > 1 else 0.
+    edges = []
+    for target in range(1, n):
+        parents = rng.choice(target, rng.binomial(target, p), replace=False)
+        edges.extend((names[s], names[target]) for s in sorted(parents.tolist()))
+    return edges
+
+
+def scale_free_dag(n: int, m: int = 2, seed: Optional[int] = None) -> Edges:
+    """
+    :param n: the number of nodes
+    :param m: the number of parents of every new node
+    :param seed: the seed
+    :return: the edges
+    """
+    rng = np.random.default_rng(seed)
+    names = _names(n)
+    # every node appears once plus once per edge, so drawing from the list prefers nodes with a high degree
+    repeated = np.empty(n + 2 * m * n, dtype=np.int64)
+    size = 0
+    edges = []
+    for target in range(n):
+        parents = set()
+        while len(parents) < min(m, target):
+            parents.add(int(repeated[rng.integers(size)]))
+        edges.extend((names[s], names[target]) for s in sorted(parents))
+        repeated[size] = target
+        repeated[size + 1:size + 1 + 2 * len(parents)] = [target] * len(parents) + sorted(parents)
+        size += 1 + 2 * len(parents)
+    return edges
+
+
+def layered_dag(n: int, n_layers: Optional[int] = None, expected_degree: float = 3.,
+        seed: Optional[int] = None) -> Edges:
+    """
+    :param n: the number of nodes
+    :param n_layers: the number of layers, defaults to sqrt(n)
+    :param expected_degree: the expected number of neighbours of a node, every node outside the first layer has at
+        least one parent
+    :param seed: the seed
+    :return: the edges
+    """
+    rng = np.random.default_rng(seed)
+    names = _names(n)
+    n_layers = n_layers or max(int(np.sqrt(n)), 1)
+    bounds = np.linspace(0, n, n_layers + 1).astype(int)
+    edges = []
+    for start, end, next_end in zip(bounds, bounds[1:], bounds[2:]):
+        for target in range(end, next_end):
+            k = min(end - start, 1 + rng.poisson(max(expected_degree / 2 - 1, 0.)))
+            parents = start + rng.choice(end - start, k, replace=False)
+            edges.extend((names[s], names[target]) for s in sorted(parents.tolist()))
+    return edges
+
+
+GENERATORS: Dict[str, Callable[..., Edges]] = {
+    ERDOS_RENYI: erdos_renyi_dag,
+    SCALE_FREE: scale_free_dag,
+    LAYERED: layered_dag,
+}
+
+
+def get_model_lines(edges: Edges, treatment: Optional[str] = None, outcome: Optional[str] = None) -> List[str]:
+    """Get the lines of a model string (see `causal_graph.parse_model_string`) with one edge per line."""
+    roles = {treatment: "[T]", outcome: "[O]"}
+    lines = []
+    for source, target in edges:
+        lines.append(f"{source}{roles.pop(source, '')} -> {target}{roles.pop(target, '')}")
+    return lines
+
+
+def random_model(kind: str, n: int, seed: Optional[int] = None, **kwargs) -> CausalGraph:
+    """
+    Generate a random causal graph. The outcome is the node with the most ancestors among the last tenth of the nodes
+    and the treatment is the ancestor of the outcome with the most ancestors itself, so there are many backdoor paths.
+    :param kind: ERDOS_RENYI, SCALE_FREE or LAYERED
+    :param n: the number of nodes
+    :param seed: the seed
+    :param kwargs: the parameters of the generator
+    :return: the causal graph
+    """
+    try:
+        generator = GENERATORS[kind]
+    except KeyError:
+        raise ValueError(f"Unknown kind of graph {kind}") from None
+    nodes = _names(n)
+    model = CausalGraph(set(nodes), set(generator(n, seed=seed, **kwargs)), adjusted=set(), unobserved=set())
+    # the number of ancestors is counted on the bitsets, as converting them to sets of names is much slower
+    core = model.core
+    n_ancestors = {}
+
+    def count_ancestors(node: str) -> int:
+        if node not in n_ancestors:
+            n_ancestors[node] = core.get_ancestors(core.ids[node]).bit_count()
+        return n_ancestors[node]
+
+    outcome = max(nodes[-max(n // 10, 1):], key=lambda node: (count_ancestors(node), node))
+    ancestors = core.nodes(core.get_ancestors(core.ids[outcome]))
+    if ancestors:
+        treatment = max(sorted(ancestors), key=count_ancestors)
+        model.update_node(treatment, NodeAttribute.TREATMENT)
+        model.update_node(outcome, NodeAttribute.OUTCOME)
+        model.update_paths()
+    return model
@@ -1,17 +1,16 @@
-import numpy as np
-import pandas as pd 
-from sklearn.linear_model import LinearRegression
+from causal_graph import NodeAttribute, parse_model_string
+from estimate.regression import estimate_ate
 
-df = pd.read_csv("./data/sodium.csv")
+model = parse_model_string([
+    "age -> sodium[treatment]",
+    "age -> sbp[outcome]",
+    "sodium -> sbp",
+    "sodium -> proteinuria",
+    "sbp -> proteinuria",
+])
+model.update_node("age", NodeAttribute.ADJUSTED)
+model.update_node("proteinuria", NodeAttribute.ADJUSTED)
 
-Xt = df[['sodium', 'age', 'proteinuria']]
-y = df['sbp']
-model = LinearRegression()
-model.fit(Xt, y)
-
-Xt1 = pd.DataFrame.copy(Xt)
-Xt1['sodium'] = 1
-Xt0 = pd.DataFrame.copy(Xt)
-Xt0['sodium'] = 0
-ate_est = np.mean(model.predict(Xt1) - model.predict(Xt0))
-print('ATE estimate:', ate_est)
\ No newline at end of file
+# the csv is read in chunks, so the data doesn't have to fit in memory
+estimate = estimate_ate("./data/sodium.csv", model)
+print('ATE estimate:', estimate.ate)
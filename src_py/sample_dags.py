@@ -98,6 +98,18 @@ SAMPLE_DAGS = {
         "Z -> Y",
         "U[U, name=Unobserved health status] -> W",
         "U -> Y"
+    ],
+    "Simpson's paradox": [  # from http://www.dagitty.net/learn/simpson/index.html
+        "X[T] -> Y[O]",
+        "Z1 -> Z3 -> Z5 -> Z7 -> Y",
+        "Z1 -> U[U]",
+        "U -> X",
+        "U -> Z2",
+        "U -> Z4",
+        "U -> Z6",
+        "Z3 -> Z2",
+        "Z5 -> Z4",
+        "Z7 -> Z6",
     ]
 }
 # add more complex Shrier & Platt 2008: https://bmcmedresmethodol.biomedcentral.com/articles/10.1186/1471-2288-8-70
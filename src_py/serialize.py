@@ -0,0 +1,177 @@
+"""
+Binary storage of causal graphs, so big models don't have to be parsed and annotated again on every start.
+
+A model is stored as an uncompressed NumPy .npz archive (readable by `np.load`) with the members
+ - version: the format version
+ - names: the interned node table, the utf-8 encoded node names joined by '\\0'
+ - sources, targets: the edges as indices into the node table
+ - edge_flags: the path annotations of every edge (1: causal, 2: biasing)
+ - roles: the indices of treatment and outcome (-1 if undefined)
+ - adjusted, unobserved: the indices of the adjusted and unobserved nodes
+ - positions: the (x, y) position of every node (nan if undefined)
+ - meta: the meta data of the nodes as utf-8 encoded json
+ - ancestor_ids, ancestor_bits, descendant_ids, descendant_bits: the cached transitive closures of the bitset graph,
+   one row of packed bits (little endian, bit i is node i) per node
+As all members are stored uncompressed, `load_model` memory-maps them instead of reading the whole archive.
+"""
+import json
+import os
+import struct
+import zipfile
+from typing import BinaryIO, Dict, List, Union
+
+import networkx as nx
+import numpy as np
+
+from causal_graph import CausalGraph, QueryCache
+from graph_core import BitsetGraph
+
+FORMAT_VERSION = 1
+CAUSAL = 1
+BIASING = 2
+
+
+def save_model(model: CausalGraph, file: Union[str, os.PathLike, BinaryIO], closures: bool = True) -> None:
+    """
+    Save the model in the binary format. Outdated path annotations are updated first.
+    :param model: the causal graph
+    :param file: the path or a binary file object
+    :param closures: also store the cached ancestors and descendants of the nodes
+    """
+    model.update_paths()
+    core = model.core
+    live_ids = [i for i, name in enumerate(core.names) if name is not None]
+    names: List[str] = [core.names[i] for i in live_ids]
+    if any("\0" in name for name in names):
+        raise ValueError("Node names must not contain '\\0'")
+    index = {name: i for i, name in enumerate(names)}
+    compact_ids = {node_id: i for i, node_id in enumerate(live_ids)}
+
+    edges = list(model.graph.edges(data=True))
+    flags = [CAUSAL * bool(data.get("causal")) | BIASING * bool(data.get("biasing")) for _, _, data in edges]
+    positions = np.full((len(names), 2), np.nan)
+    meta = {}
+    for name, data in model.graph.nodes(data=True):
+        if "position" in data:
+            positions[index[name]] = data["position"]["x"], data["position"]["y"]
+        if data.get("meta"):
+            meta[name] = data["meta"]
+
+    arrays = {
+        "version": np.array([FORMAT_VERSION], dtype=np.int32),
+        "names": np.frombuffer("\0".join(names).encode(), dtype=np.uint8),
+        "sources": np.array([index[s] for s, _, _ in edges], dtype=np.int32),
+        "targets": np.array([index[t] for _, t, _ in edges], dtype=np.int32),
+        "edge_flags": np.array(flags, dtype=np.uint8),
+        "roles": np.array([index.get(model.treatment, -1), index.get(model.outcome, -1)], dtype=np.int32),
+        "adjusted": np.array(sorted(index[n] for n in model.adjusted or ()), dtype=np.int32),
+        "unobserved": np.array(sorted(index[n] for n in model.unobserved or ()), dtype=np.int32),
+        "positions": positions,
+        "meta": np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8),
+    }
+    cached = core.get_cached_closures() if closures else ({}, {})
+    for kind, masks in zip(["ancestor", "descendant"], cached):
+        ids = sorted(masks)
+        arrays[f"{kind}_ids"] = np.array([compact_ids[i] for i in ids], dtype=np.int32)
+        arrays[f"{kind}_bits"] = _pack_masks([masks[i] for i in ids], live_ids, len(core.names))
+    np.savez(file, **arrays)
+
+
+def _pack_masks(masks: List[int], live_ids: List[int], n_ids: int) -> np.ndarray:
+    # rows of packed bits over the compacted node table
+    n_bytes = (n_ids + 7) // 8
+    rows = np.frombuffer(b"".join(m.to_bytes(n_bytes, "little") for m in masks), dtype=np.uint8)
+    bits = np.unpackbits(rows.reshape(len(masks), n_bytes), axis=1, bitorder="little")[:, :n_ids]
+    if len(live_ids) != n_ids:
+        bits = bits[:, live_ids]
+    return np.packbits(bits, axis=1, bitorder="little")
+
+
+def load_model(file: Union[str, os.PathLike, BinaryIO], mmap: bool = True) -> CausalGraph:
+    """
+    Load a model saved by `save_model`. The path annotations and cached closures are restored instead of recomputed
+    and the networkx graph is built lazily on first access of `CausalGraph.graph`.
+    :param file: the path or a binary file object
+    :param mmap: memory-map the arrays (only if a path is given) instead of reading them
+    :return: the causal graph
+    """
+    arrays = _load_arrays(file, mmap)
+    version = int(arrays["version"][0])
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported format version {version}, expected {FORMAT_VERSION}")
+
+    names_data = bytes(arrays["names"])
+    names = names_data.decode().split("\0") if names_data else []
+    sources, targets = arrays["sources"].tolist(), arrays["targets"].tolist()
+    edges = [(names[s], names[t]) for s, t in zip(sources, targets)]
+    flags = arrays["edge_flags"].tolist()
+    treatment, outcome = (names[i] if i >= 0 else None for i in arrays["roles"].tolist())
+    adjusted = {names[i] for i in arrays["adjusted"].tolist()}
+    unobserved = {names[i] for i in arrays["unobserved"].tolist()}
+
+    # the node ids of the bitset graph are the indices of the node table
+    core = BitsetGraph.from_ids(names, sources, targets)
+    core.set_cached_closures(*(_unpack_masks(arrays[f"{kind}_ids"], arrays[f"{kind}_bits"])
+                               for kind in ["ancestor", "descendant"]))
+
+    positions = np.array(arrays["positions"])
+    meta = json.loads(bytes(arrays["meta"]).decode())
+
+    def load_graph() -> nx.DiGraph:
+        graph = nx.DiGraph()
+        graph.add_nodes_from(names, observed=True, parent="all")
+        graph.add_edges_from((s, t, {"causal": bool(f & CAUSAL), "biasing": bool(f & BIASING)})
+                             for (s, t), f in zip(edges, flags))
+        node_attrs = {n: {"adjusted": True} for n in adjusted}
+        node_attrs.update({n: {"observed": False} for n in unobserved})
+        if treatment is not None:
+            node_attrs[treatment] = {"treatment": True}
+        if outcome is not None:
+            node_attrs[outcome] = {"outcome": True}
+        for i in np.flatnonzero(~np.isnan(positions[:, 0])).tolist():
+            position = {"x": float(positions[i, 0]), "y": float(positions[i, 1])}
+            node_attrs.setdefault(names[i], {})["position"] = position
+        for name, node_meta in meta.items():
+            node_attrs.setdefault(name, {})["meta"] = node_meta
+        nx.set_node_attributes(graph, node_attrs)
+        return graph
+
+    causal_edges = {e for e, f in zip(edges, flags) if f & CAUSAL}
+    biasing_edges = {e for e, f in zip(edges, flags) if f & BIASING}
+    # the networkx graph is only built, once it's needed (e.g. for drawing), as the queries run on the bitset graph
+    return CausalGraph(set(names), set(edges), treatment, outcome, adjusted, unobserved,
+                       _causal_edges=causal_edges, _biasing_edges=biasing_edges, _outdated_paths=set(),
+                       _cache=QueryCache(), _core=core, _graph_loader=load_graph)
+
+
+def _unpack_masks(ids: np.ndarray, bits: np.ndarray) -> Dict[int, int]:
+    return {i: int.from_bytes(row.tobytes(), "little") for i, row in zip(ids.tolist(), bits)}
+
+
+def _load_arrays(file: Union[str, os.PathLike, BinaryIO], mmap: bool) -> Dict[str, np.ndarray]:
+    if not mmap or not isinstance(file, (str, os.PathLike)):
+        with np.load(file) as data:
+            return {name: data[name] for name in data.files}
+
+    # the members of an uncompressed archive are .npy files at known offsets, which can be mapped directly
+    arrays = {}
+    with zipfile.ZipFile(file) as archive, open(file, "rb") as f:
+        for info in archive.infolist():
+            name = info.filename[:-len(".npy")]
+            if info.compress_type != zipfile.ZIP_STORED:
+                arrays[name] = np.load(archive.open(info))
+                continue
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(file, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                         order="F" if fortran_order else "C")
+    return arrays
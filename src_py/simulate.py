@@ -0,0 +1,158 @@
+"""
+Simulation of data from a causal graph interpreted as a structural causal model: every node is a function (its
+mechanism) of its parents and independent noise. Supported mechanisms:
+ - Linear: intercept + Σ weight * parent + gaussian noise
+ - Logistic: a Bernoulli variable, whose probability is the logistic function of the linear predictor
+ - Threshold: True, if the linear predictor plus gaussian noise exceeds a threshold
+ - any vectorized callable f(parents, n, rng), which returns n values given the columns of the parents
+The nodes are sampled column by column in topological order. Every node draws its noise from its own random stream
+(a `numpy.random.Generator` spawned from the seed), so an intervention doesn't change the noise of any other node and
+samples with the same seed share their noise, with and without interventions. Big datasets are generated in chunks,
+which don't depend on the chunk size, as long as the mechanisms draw their noise element by element.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from causal_graph import CausalGraph, parse_model_string
+from sample_dags import SAMPLE_DAGS
+
+Mechanism = Callable[[Dict[str, np.ndarray], int, np.random.Generator], np.ndarray]
+Seed = Union[None, int, np.random.SeedSequence]
+
+
+@dataclass
+class LinearPredictor:
+    """
+    The linear combination of the parents.
+    :param weights: the weight of every parent
+    :param intercept: the constant term
+    :param default_weight: the weight of the parents missing in weights
+    """
+    weights: Dict[str, float] = field(default_factory=dict)
+    intercept: float = 0.
+    default_weight: float = 1.
+
+    def predict(self, parents: Dict[str, np.ndarray], n: int) -> np.ndarray:
+        value = np.full(n, float(self.intercept))
+        for parent, column in parents.items():
+            value += self.weights.get(parent, self.default_weight) * column
+        return value
+
+
+@dataclass
+class Linear(LinearPredictor):
+    """The linear predictor plus gaussian noise with standard deviation noise."""
+    noise: float = 1.
+
+    def __call__(self, parents: Dict[str, np.ndarray], n: int, rng: np.random.Generator) -> np.ndarray:
+        value = self.predict(parents, n)
+        if self.noise:
+            value += rng.normal(0., self.noise, n)
+        return value
+
+
+@dataclass
+class Logistic(LinearPredictor):
+    """True with the probability 1 / (1 + exp(-linear predictor))."""
+    def __call__(self, parents: Dict[str, np.ndarray], n: int, rng: np.random.Generator) -> np.ndarray:
+        probability = 1. / (1. + np.exp(-self.predict(parents, n)))
+        return rng.random(n) < probability
+
+
+@dataclass
+class Threshold(LinearPredictor):
+    """True, if the linear predictor plus gaussian noise with standard deviation noise exceeds the threshold."""
+    noise: float = 1.
+    threshold: float = 0.
+
+    def __call__(self, parents: Dict[str, np.ndarray], n: int, rng: np.random.Generator) -> np.ndarray:
+        value = self.predict(parents, n)
+        if self.noise:
+            value += rng.normal(0., self.noise, n)
+        return value > self.threshold
+
+
+class StructuralCausalModel:
+    def __init__(self, model: CausalGraph, mechanisms: Optional[Dict[str, Mechanism]] = None,
+            default: Mechanism = Linear()):
+        """
+        :param model: the causal graph
+        :param mechanisms: the mechanism of every node
+        :param default: the mechanism of the nodes missing in mechanisms
+        """
+        mechanisms = mechanisms or {}
+        unknown = set(mechanisms) - set(model.graph.nodes)
+        if unknown:
+            raise ValueError(f"Mechanisms of unknown nodes {', '.join(sorted(unknown))}")
+        self.order: List[str] = model.get_topological_order()
+        self.parents: Dict[str, List[str]] = {n: list(model.graph.predecessors(n)) for n in self.order}
+        self.mechanisms: Dict[str, Mechanism] = {n: mechanisms.get(n, default) for n in self.order}
+        unobserved = model.get_unobserved_nodes() or set()
+        self.observed: List[str] = [n for n in self.order if n not in unobserved]
+
+    def iter_samples(self, n: int, chunk_size: int = 1_000_000, seed: Seed = None,
+            interventions: Optional[Dict[str, Any]] = None, include_unobserved: bool = False) -> Iterator[pd.DataFrame]:
+        """
+        Generate n samples in chunks, so datasets, which don't fit in memory, can be streamed.
+        :param n: the number of samples
+        :param chunk_size: the number of samples per chunk
+        :param seed: the seed of the random streams, fresh entropy if None
+        :param interventions: the nodes set to constant values, do(node=value)
+        :param include_unobserved: also return the columns of the unobserved nodes
+        :return: a generator of dataframes with one column per node (in topological order)
+        """
+        interventions = interventions or {}
+        unknown = set(interventions) - set(self.order)
+        if unknown:
+            raise ValueError(f"Interventions on unknown nodes {', '.join(sorted(unknown))}")
+        if chunk_size < 1:
+            raise ValueError("The chunk size must be positive")
+
+        streams = [np.random.default_rng(s) for s in _get_seed_sequence(seed).spawn(len(self.order))]
+        columns = self.order if include_unobserved else self.observed
+        for start in range(0, n, chunk_size):
+            size = min(chunk_size, n - start)
+            values = {}
+            for node, rng in zip(self.order, streams):
+                if node in interventions:
+                    values[node] = np.full(size, interventions[node])
+                    continue
+                value = np.asarray(self.mechanisms[node]({p: values[p] for p in self.parents[node]}, size, rng))
+                if value.shape != (size,):
+                    raise ValueError(f"The mechanism of {node} returned shape {value.shape}, expected ({size},)")
+                values[node] = value
+            yield pd.DataFrame({c: values[c] for c in columns}, index=pd.RangeIndex(start, start + size))
+
+    def sample(self, n: int, seed: Seed = None, interventions: Optional[Dict[str, Any]] = None,
+            include_unobserved: bool = False) -> pd.DataFrame:
+        """Generate n samples at once, see `iter_samples`."""
+        chunk, = self.iter_samples(max(n, 1), seed=seed, interventions=interventions,
+                                   include_unobserved=include_unobserved, chunk_size=max(n, 1))
+        return chunk.iloc[:n]
+
+
+def _get_seed_sequence(seed: Seed) -> np.random.SeedSequence:
+    if isinstance(seed, np.random.SeedSequence):
+        # spawning changes the state of a seed sequence, so the same one yields the same samples only if it's copied
+        return np.random.SeedSequence(seed.entropy, spawn_key=seed.spawn_key, pool_size=seed.pool_size)
+    return np.random.SeedSequence(seed)
+
+
+def simpson_simulator(n: int, noise: float = 0.01, effect: float = 1., seed: Seed = None) -> pd.DataFrame:
+    """
+    Simulate the Simpson's paradox example of dagitty (http://www.dagitty.net/learn/simpson/index.html): the
+    estimated effect of X on Y changes its sign, as the covariates Z1, ..., Z7 are added to the adjustment set one by
+    one. All mechanisms are linear with weight 1, apart from Y = effect * X + 10 * Z7.
+    :param n: the number of samples
+    :param noise: the standard deviation of the noise of every node
+    :param effect: the true causal effect of X on Y
+    :param seed: the seed
+    :return: the samples of the observed nodes
+    """
+    model = parse_model_string(SAMPLE_DAGS["Simpson's paradox"])
+    mechanisms = {node: Linear(noise=noise) for node in model.nodes}
+    mechanisms["Y"] = Linear({"X": effect, "Z7": 10.}, noise=noise)
+    return StructuralCausalModel(model, mechanisms).sample(n, seed)
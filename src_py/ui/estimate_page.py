@@ -24,5 +24,8 @@ def show():
     if "data" in st.session_state:
         df = st.session_state.data
 
-        adjusted_df = adjust_backdoor(df, st.session_state.model)
+        if "model" in st.session_state:
+            estimate = adjust_backdoor(df, st.session_state.model)
+            st.metric("Average treatment effect", f"{estimate.ate:.4f}")
+            st.dataframe(estimate.strata)
 
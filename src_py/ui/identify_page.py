@@ -1,8 +1,24 @@
 import streamlit as st
-from infer import ModelStage
+
+from identify import identify
 
 
 def show():
     st.header("identify")
-    if st.session_state.model.stage < ModelStage.DEFINED:
+    if "model" not in st.session_state:
         st.error("Please create the model first!")
+        return
+
+    model = st.session_state.model
+    report = identify(model, n_jobs=4, time_budget=5.)
+    st.write(f"Effect of {report.treatment} on {report.outcome} identifiable: {report.identifiable}")
+    for criterion, result in report.criteria.items():
+        st.subheader(criterion)
+        if result.error is not None:
+            st.write(result.error)
+        for s in result.sets:
+            st.write(", ".join(sorted(s)) if isinstance(s, (set, frozenset)) else str(s))
+        if not result.complete:
+            st.write("(incomplete, time budget exceeded)")
+    if report.estimand is not None:
+        st.write(f"Estimand: {report.estimand}")
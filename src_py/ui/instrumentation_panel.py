@@ -0,0 +1,40 @@
+import pandas as pd
+import streamlit as st
+
+import instrumentation
+
+
+def get_frame(snapshot: dict) -> pd.DataFrame:
+    """Get one row per instrumented function with its calls, items and times in milliseconds."""
+    df = pd.DataFrame.from_dict(snapshot["calls"], orient="index",
+                                columns=["calls", "items", "seconds", "mean_seconds", "max_seconds"])
+    df[["seconds", "mean_seconds", "max_seconds"]] *= 1000
+    return df.rename(columns={"seconds": "total ms", "mean_seconds": "mean ms", "max_seconds": "max ms"})
+
+
+def show() -> None:
+    """Show the profiling records of this process and the caches of the current model in the sidebar."""
+    enabled = st.sidebar.checkbox("Profiling", value=instrumentation.is_enabled())
+    if not enabled:
+        instrumentation.disable()
+        return
+    # the records of this run start with the next run, as the page is shown before the panel
+    instrumentation.enable()
+
+    snapshot = instrumentation.snapshot(st.session_state.get("model"))
+    with st.sidebar.expander("Profile", expanded=True):
+        cache = snapshot.get("query_cache")
+        if cache is not None and cache["hit_rate"] is not None:
+            st.write(f"query cache (paths and separation queries only): {cache['hit_rate']:.0%} hits of "
+                     f"{cache['hits'] + cache['misses']} lookups")
+        closures = snapshot.get("closure_cache")
+        if closures is not None:
+            st.write(f"closure cache: ancestors of {closures['ancestors']} and descendants of "
+                     f"{closures['descendants']} of {closures['nodes']} nodes cached")
+        st.dataframe(get_frame(snapshot))
+        if snapshot["counters"]:
+            st.write(snapshot["counters"])
+        st.download_button("Export json", instrumentation.to_json(st.session_state.get("model")),
+                           file_name="profile.json", mime="application/json")
+        if st.button("Reset"):
+            instrumentation.reset()
@@ -26,6 +26,8 @@ from streamlit.hashing import _CodeHasher
 from streamlit.report_thread import get_report_ctx
 from streamlit.server.server import Server
 
+import instrumentation
+
 
 def is_running_in_streamlit():
     thread = threading.current_thread()
@@ -99,6 +101,10 @@ class _SessionState:
         self._state["data"].clear()
         self._state["session"].request_rerun()
     
+    def _hash(self) -> bytes:
+        with instrumentation.timer("session_state.hash"):
+            return self._state["hasher"].to_bytes(self._state["data"], None)
+
     def sync(self):
         """Rerun the app with all state values up to date from the beginning to fix rollbacks."""
 
@@ -111,11 +117,11 @@ class _SessionState:
             self._state["is_rerun"] = False
         
         elif self._state["hash"] is not None:
-            if self._state["hash"] != self._state["hasher"].to_bytes(self._state["data"], None):
+            if self._state["hash"] != self._hash():
                 self._state["is_rerun"] = True
                 self._state["session"].request_rerun()
 
-        self._state["hash"] = self._state["hasher"].to_bytes(self._state["data"], None)
+        self._state["hash"] = self._hash()
 
 
 def _get_session():
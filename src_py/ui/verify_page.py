@@ -1,10 +1,33 @@
 import streamlit as st
-from ui.session_state import SessionState, get_state
-from infer import ModelStage
 
+import verify
 
-def show(state: SessionState):
+
+def show():
     st.header("Verify")
-    state = get_state()
-    if state.model.stage < ModelStage.ESTIMATED:
-        st.error("The model must be estimated before it can be verified")
+    if "model" not in st.session_state:
+        st.error("Please create the model first!")
+        return
+    if "data" not in st.session_state:
+        st.error("Please generate the data on the estimate page first!")
+        return
+
+    model = st.session_state.model
+    method = st.selectbox("Independence test", ["auto", verify.FISHER_Z, verify.CHI_SQUARE, verify.G_TEST,
+                                                verify.REGRESSION])
+    alpha = st.number_input("Significance level", min_value=0., max_value=1., value=0.05)
+
+    st.subheader("Testable implications - Conditional Independencies")
+    table = st.empty()
+    batches = []
+    # the implied independencies are streamed and tested batch by batch, so the table grows while testing
+    for batch in verify.iter_independence_tests(st.session_state.data, model,
+                                                method=None if method == "auto" else method):
+        batch = batch.assign(rejected=batch["p_value"] < alpha)
+        if batches:
+            table.add_rows(batch)
+        else:
+            table = table.dataframe(batch)
+        batches.append(batch)
+    if not batches:
+        table.write("The model doesn't imply any testable independencies.")
@@ -1,21 +1,103 @@
-import random
-from typing import Any, Dict, Iterable, List, Set, Tuple, Optional
+import weakref
+from typing import Any, Dict, Hashable, Iterable, List, Set, Tuple, Optional
 import networkx as nx
 import numpy as np
 import pandas as pd
 
+import instrumentation
 
-def get_cytoscape_params_from_model(causal_model: "CausalGraph") -> Tuple[List, List, Dict, Dict]:
-    # edge_list = list(causal_model.edges)
-    cy_json = nx.readwrite.json_graph.cytoscape_data(causal_model._graph)
-    style, layout, context_menu = get_cytoscape_params()
 
-    nodes = cy_json["elements"]["nodes"]
-    for n in nodes:
-        if "position" in n["data"]:
-            n["position"] = n["data"]["position"]
+class CytoscapeElements:
+    """
+    The cytoscape elements of a causal graph (in the format of `nx.readwrite.json_graph.cytoscape_data`), which are
+    updated incrementally: only the elements of nodes and edges changed since the last update (see
+    `CausalGraph.get_changes`) are rebuilt.
+    """
+    def __init__(self):
+        self._revision: Optional[int] = None
+        self._nodes: Dict[Hashable, Dict] = {}
+        self._edges: Dict[Tuple[Hashable, Hashable], Dict] = {}
+        self._elements: Optional[Dict[str, List[Dict]]] = None
+
+    @instrumentation.instrument(items=lambda n_changed: n_changed)
+    def update(self, causal_model: "CausalGraph") -> int:
+        """
+        Bring the elements up to date with the model.
+        :param causal_model: the causal graph
+        :return: the number of elements added, rebuilt or removed since the last update
+        """
+        graph = causal_model.graph
+        n_changed = 0
+        if self._revision is None:
+            self._nodes = {n: _get_node_element(n, attrs) for n, attrs in graph.nodes.items()}
+            self._edges = {e: _get_edge_element(e, attrs) for e, attrs in graph.edges.items()}
+            n_changed = len(self._nodes) + len(self._edges)
+        else:
+            for key in causal_model.get_changes(self._revision):
+                is_edge = isinstance(key, tuple)
+                elements = self._edges if is_edge else self._nodes
+                if is_edge and graph.has_edge(*key):
+                    elements[key] = _get_edge_element(key, graph.edges[key])
+                elif not is_edge and key in graph:
+                    elements[key] = _get_node_element(key, graph.nodes[key])
+                elif elements.pop(key, None) is None:
+                    continue
+                n_changed += 1
+        self._revision = causal_model.revision
+        if n_changed:
+            self._elements = None
+        return n_changed
+
+    @property
+    def elements(self) -> Dict[str, List[Dict]]:
+        """All elements as {"nodes": [...], "edges": [...]}, which must not be modified."""
+        if self._elements is None:
+            self._elements = {"nodes": list(self._nodes.values()), "edges": list(self._edges.values())}
+        return self._elements
+
+
+def _get_node_element(node: Hashable, attrs: Dict) -> Dict:
+    data = dict(attrs)
+    data["id"] = attrs.get("id") or str(node)
+    data["value"] = node
+    data["name"] = attrs.get("name") or str(node)
+    element = {"data": data}
+    if "position" in attrs:
+        element["position"] = attrs["position"]
+    return element
+
+
+def _get_edge_element(edge: Tuple[Hashable, Hashable], attrs: Dict) -> Dict:
+    data = dict(attrs)
+    data["source"], data["target"] = edge
+    return {"data": data}
 
-    return cy_json["elements"], style, layout, context_menu
+
+_element_caches: Dict[int, CytoscapeElements] = {}
+
+
+def _get_element_cache(causal_model: "CausalGraph") -> CytoscapeElements:
+    key = id(causal_model)
+    cache = _element_caches.get(key)
+    if cache is None:
+        cache = _element_caches[key] = CytoscapeElements()
+        # drop the cache together with the model, before its id can be reused
+        weakref.finalize(causal_model, _element_caches.pop, key, None)
+    return cache
+
+
+@instrumentation.instrument()
+def get_cytoscape_params_from_model(causal_model: "CausalGraph") -> Tuple[Dict[str, List], List, Dict, Dict]:
+    """
+    Get the parameters of the cytoscape component for the model. The elements are cached per model and only the
+    elements of nodes and edges changed since the previous call are rebuilt, so a rerun without changes doesn't depend
+    on the size of the graph. The style, layout and context menu are built once.
+    :param causal_model: the causal graph
+    :return: the elements, the style, the layout and the context menu, which must not be modified
+    """
+    cache = _get_element_cache(causal_model)
+    cache.update(causal_model)
+    return cache.elements, _STYLE, _LAYOUT, _CONTEXT_MENU
 
 
 def get_cytoscape_params() -> Tuple[List, Dict, Dict]:
@@ -143,6 +225,9 @@ def get_cytoscape_params() -> Tuple[List, Dict, Dict]:
     return style, layout, context_menu
 
 
+_STYLE, _LAYOUT, _CONTEXT_MENU = get_cytoscape_params()
+
+
 def edge_path_to_node_path(path: List[Tuple]) -> List[str]:
     """
     Convert a path of edges to a simple list of nodes (without direction information)
@@ -170,57 +255,73 @@ def node_path_to_edge_path(path: List[str], graph: nx.DiGraph) -> List[Tuple]:
     return edge_path
 
 
-def generate_colliderapp_data(n, seed, beta1, alpha1, alpha2) -> pd.DataFrame:
+def is_discrete(column: pd.Series) -> bool:
     """
-
-    Parameters
-    ----------
-    n
-    seed
-    beta1
-    alpha1
-    alpha2
-
-    Returns
-    -------
-
+    Check if the column holds discrete values, i.e. booleans, integers, categories, strings or objects.
+    :param column: the column of a dataframe
+    :return: True if the column is discrete
     """
-    # example from collider app: https://watzilei.com/shiny/collider/
-    random.seed(seed)
-    age_years = np.random.normal(65, 5, n)
-    sodium_gr = age_years / 18 + np.random.normal(size=n)
-    sbp = beta1 * sodium_gr + 2. * age_years + np.random.normal(size=n)
-    proteinuria = alpha1 * sodium_gr + alpha2 * sbp + np.random.normal(size=n)
-    return pd.DataFrame({
-        "sbp": sbp,
-        "sodium": sodium_gr,
-        "age": age_years,
-        "proteinuria": proteinuria
-    })
+    return (pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(column)
+            or isinstance(column.dtype, pd.CategoricalDtype) or pd.api.types.is_object_dtype(column)
+            or pd.api.types.is_string_dtype(column))
 
 
-def generate_confounder_data(n: int, seed: int = 0, ) -> Tuple[pd.DataFrame, float]:
-    e_x = np.random.normal(size=n)
-    e_y = np.random.normal(size=n)
-    e_z = np.random.normal(size=n)
+def generate_colliderapp_data(n: int, seed: int, beta1: float, alpha1: float, alpha2: float) -> pd.DataFrame:
+    """
+    Simulate the example of the collider app (https://watzilei.com/shiny/collider/).
+    :param n: the number of samples
+    :param seed: the seed
+    :param beta1: the effect of sodium on the systolic blood pressure
+    :param alpha1: the effect of sodium on proteinuria
+    :param alpha2: the effect of the systolic blood pressure on proteinuria
+    :return: the samples
+    """
+    # imported here, as simulate depends on causal_graph, which depends on this module
+    from causal_graph import parse_model_string
+    from sample_dags import SAMPLE_DAGS
+    from simulate import Linear, StructuralCausalModel
 
-    z = e_z > 0
-    x = z + e_x > 0.5
-    y = (x + z + e_y) > 2
+    mechanisms = {
+        "age": Linear(intercept=65., noise=5.),
+        "sodium": Linear({"age": 1 / 18}),
+        "sbp": Linear({"sodium": beta1, "age": 2.}),
+        "proteinuria": Linear({"sodium": alpha1, "sbp": alpha2}),
+    }
+    scm = StructuralCausalModel(parse_model_string(SAMPLE_DAGS["ColliderApp"]), mechanisms)
+    return scm.sample(n, seed)[["sbp", "sodium", "age", "proteinuria"]]
 
-    y_dox = (1 + z + e_x) > 2
 
-    df = pd.DataFrame({
-        "X": x,
-        "Y": y,
-        "Z": z
-    })
+def generate_confounder_data(n: int, seed: int = 0) -> Tuple[pd.DataFrame, float]:
+    """
+    Simulate binary data of the confounder example Z -> X -> Y, Z -> Y.
+    :param n: the number of samples
+    :param seed: the seed
+    :return: the samples and P(Y | do(X = True)), estimated from the same noise
+    """
+    from causal_graph import parse_model_string
+    from sample_dags import SAMPLE_DAGS
+    from simulate import StructuralCausalModel, Threshold
 
+    mechanisms = {
+        "Z": Threshold(threshold=0.),
+        "X": Threshold(threshold=0.5),
+        "Y": Threshold(threshold=2.),
+    }
+    scm = StructuralCausalModel(parse_model_string(SAMPLE_DAGS["Confounder"]), mechanisms)
+    df = scm.sample(n, seed)[["X", "Y", "Z"]]
+    y_dox = scm.sample(n, seed, interventions={"X": True})["Y"]
     return df, float(np.mean(y_dox))
 
 
-def generate_data(n, nodes: Dict[str, Tuple[int, float]], seed: int=0) -> pd.DataFrame:
-    if seed != 0:
-        random.seed(seed)
-
-    raise NotImplementedError
+def generate_data(n: int, model: "CausalGraph", mechanisms: Optional[Dict[str, Any]] = None,
+        seed: Optional[int] = None) -> pd.DataFrame:
+    """
+    Simulate the model as structural causal model, see `simulate.StructuralCausalModel`.
+    :param n: the number of samples
+    :param model: the causal graph
+    :param mechanisms: the mechanism of every node, linear with weights 1 and standard normal noise by default
+    :param seed: the seed
+    :return: the samples of the observed nodes
+    """
+    from simulate import StructuralCausalModel
+    return StructuralCausalModel(model, mechanisms).sample(n, seed)
@@ -0,0 +1,277 @@
+"""
+Test the conditional independencies implied by a causal graph against data.
+Supported tests:
+ - Fisher-z test of the partial correlation for continuous variables
+ - Chi-square or G-test for discrete variables, continuous conditioning variables are binned into quantiles
+ - F-test of nested linear regressions for mixed variables
+
+All tests run on NumPy arrays: the covariance matrix of the continuous columns is accumulated once in a single
+(chunked) pass over the data and the factorized codes of discrete columns are computed once per column. Everything which
+depends on the conditioning set (partial covariances, strata, residualization) is computed once per conditioning set
+and shared by all tests conditioning on it.
+"""
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from causal_graph import CausalGraph, ConditionalIndependence
+from utils import is_discrete
+
+FISHER_Z = "fisher-z"
+CHI_SQUARE = "chi-square"
+G_TEST = "g-test"
+REGRESSION = "regression"
+
+RESULT_COLUMNS = ["independence", "x", "y", "conditioning_set", "method", "statistic", "dof", "p_value"]
+
+
+class IndependenceTester:
+    def __init__(self, df: pd.DataFrame, chunk_size: int = 1_000_000, n_bins: int = 5):
+        """
+        :param df: the (complete) data, one column per node
+        :param chunk_size: the number of rows processed at once, when accumulating the covariance matrix
+        :param n_bins: the number of quantile bins of continuous columns in the strata of the chi-square test
+        """
+        self.df = df
+        self.n = len(df)
+        self.chunk_size = chunk_size
+        self.n_bins = n_bins
+        self.discrete = {c: is_discrete(df[c]) for c in df.columns}
+        self._codes: Dict[str, Tuple[np.ndarray, int]] = {}
+        self._strata: Dict[frozenset, Tuple[np.ndarray, int]] = {}
+        self._bases: Dict[frozenset, np.ndarray] = {}
+        self._cov_index: Dict[str, int] = {}
+        self._cov: Optional[np.ndarray] = None
+
+    def get_method(self, ci: ConditionalIndependence) -> str:
+        variables = [ci.x, ci.y, *ci.conditioning_set]
+        n_discrete = sum(self.discrete[v] for v in variables)
+        if n_discrete == 0:
+            return FISHER_Z
+        if n_discrete == len(variables):
+            return CHI_SQUARE
+        if self.discrete[ci.x] and self.discrete[ci.y]:
+            return CHI_SQUARE  # the continuous conditioning variables are binned, see `get_codes`
+        return REGRESSION
+
+    def test(self, independencies: Iterable[ConditionalIndependence], method: Optional[str] = None) -> pd.DataFrame:
+        """
+        Test all conditional independencies.
+        :param independencies: the conditional independencies, all variables must be columns of the data
+        :param method: one of FISHER_Z, CHI_SQUARE, G_TEST or REGRESSION, otherwise it's chosen by the column types
+        :return: a table with the test statistic, the degrees of freedom and the p-value of every test
+        """
+        independencies = list(independencies)
+        methods = [method or self.get_method(ci) for ci in independencies]
+        results = [None] * len(independencies)
+
+        fisher_z = [i for i, m in enumerate(methods) if m == FISHER_Z]
+        if fisher_z:
+            statistics, dofs, p_values = self.fisher_z([independencies[i] for i in fisher_z])
+            for i, stat, dof, p in zip(fisher_z, statistics, dofs, p_values):
+                results[i] = (stat, dof, p)
+        for i, m in enumerate(methods):
+            if m in [CHI_SQUARE, G_TEST]:
+                results[i] = self.chi_square(independencies[i], g_test=m == G_TEST)
+            elif m == REGRESSION:
+                results[i] = self.regression(independencies[i])
+            elif m != FISHER_Z:
+                raise ValueError(f"Unknown independence test '{m}'")
+
+        rows = [(str(ci), ci.x, ci.y, ", ".join(sorted(ci.conditioning_set)), m, *res)
+                for ci, m, res in zip(independencies, methods, results)]
+        return pd.DataFrame(rows, columns=RESULT_COLUMNS)
+
+    def get_covariance(self, columns: List[str]) -> np.ndarray:
+        """Get the covariance matrix of the columns, which is computed once for all continuous columns."""
+        missing = [c for c in columns if c not in self._cov_index]
+        if missing:
+            continuous_columns = [c for c, discrete in self.discrete.items() if not discrete]
+            all_columns = list(dict.fromkeys(list(self._cov_index) + continuous_columns + missing))
+            self._cov = self._accumulate_covariance(all_columns)
+            self._cov_index = {c: i for i, c in enumerate(all_columns)}
+        idx = [self._cov_index[c] for c in columns]
+        return self._cov[np.ix_(idx, idx)]
+
+    def _accumulate_covariance(self, columns: List[str]) -> np.ndarray:
+        # sums of (shifted) cross products are accumulated chunk by chunk, so the centered data is never materialized
+        values = self.df[columns].to_numpy(dtype=float)
+        shift = values[0]
+        sums = np.zeros(len(columns))
+        cross_products = np.zeros((len(columns), len(columns)))
+        for start in range(0, self.n, self.chunk_size):
+            block = values[start:start + self.chunk_size] - shift
+            sums += block.sum(axis=0)
+            cross_products += block.T @ block
+        return (cross_products - np.outer(sums, sums) / self.n) / (self.n - 1)
+
+    def fisher_z(self, independencies: List[ConditionalIndependence]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Fisher-z tests of the partial correlations. All tests with the same conditioning set share a single
+        Schur complement of the covariance matrix.
+        :return: the z statistics, the degrees of freedom and the p-values
+        """
+        statistics = np.zeros(len(independencies))
+        dofs = np.zeros(len(independencies), dtype=int)
+        by_conditioning_set = defaultdict(list)
+        for i, ci in enumerate(independencies):
+            by_conditioning_set[frozenset(ci.conditioning_set)].append(i)
+
+        for conditioning_set, tests in by_conditioning_set.items():
+            z = sorted(conditioning_set)
+            variables = {v for i in tests for v in (independencies[i].x, independencies[i].y)}
+            variables = sorted(variables - conditioning_set)
+            cov = self.get_covariance(variables + z)
+            k = len(variables)
+            # covariance of the variables given the conditioning set
+            partial_cov = cov[:k, :k]
+            if z:
+                partial_cov = partial_cov - cov[:k, k:] @ np.linalg.solve(cov[k:, k:], cov[k:, :k])
+            std = np.sqrt(np.diag(partial_cov))
+            partial_corr = partial_cov / np.outer(std, std)
+
+            index = {v: j for j, v in enumerate(variables)}
+            rows = [index[independencies[i].x] for i in tests]
+            cols = [index[independencies[i].y] for i in tests]
+            r = np.clip(partial_corr[rows, cols], -1 + 1e-12, 1 - 1e-12)
+            statistics[tests] = np.arctanh(r) * np.sqrt(self.n - len(z) - 3)
+            dofs[tests] = self.n - len(z) - 3
+        p_values = 2 * stats.norm.sf(np.abs(statistics))
+        return statistics, dofs, p_values
+
+    def get_codes(self, column: str) -> Tuple[np.ndarray, int]:
+        """Get the code of the level of every row and the number of levels, continuous columns are binned first."""
+        if column not in self._codes:
+            values = self.df[column]
+            if not self.discrete[column]:
+                # otherwise every row of a continuous column would be a level (and a stratum) of its own
+                values = pd.qcut(values, self.n_bins, labels=False, duplicates="drop")
+            codes, levels = pd.factorize(values, sort=True)
+            self._codes[column] = (codes.astype(np.int64), len(levels))
+        return self._codes[column]
+
+    def get_strata(self, conditioning_set: frozenset) -> Tuple[np.ndarray, int]:
+        """Get the stratum of every row, i.e. a code for each observed combination of values of the conditioning set."""
+        if conditioning_set not in self._strata:
+            strata = np.zeros(self.n, dtype=np.int64)
+            n_strata = 1
+            for column in sorted(conditioning_set):
+                codes, n_levels = self.get_codes(column)
+                strata, uniques = pd.factorize(strata * n_levels + codes)
+                n_strata = len(uniques)
+            self._strata[conditioning_set] = (strata.astype(np.int64), n_strata)
+        return self._strata[conditioning_set]
+
+    def chi_square(self, ci: ConditionalIndependence, g_test: bool = False) -> Tuple[float, int, float]:
+        """
+        Chi-square (or G-) test of the contingency tables of x and y within every stratum of the conditioning set.
+        :return: the test statistic, the degrees of freedom and the p-value
+        """
+        x, n_x = self.get_codes(ci.x)
+        y, n_y = self.get_codes(ci.y)
+        strata, n_strata = self.get_strata(frozenset(ci.conditioning_set))
+        observed = np.bincount((strata * n_x + x) * n_y + y, minlength=n_strata * n_x * n_y)
+        observed = observed.reshape(n_strata, n_x, n_y).astype(float)
+
+        n_sx = observed.sum(axis=2)
+        n_sy = observed.sum(axis=1)
+        n_s = n_sx.sum(axis=1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            expected = n_sx[:, :, None] * n_sy[:, None, :] / n_s[:, None, None]
+            if g_test:
+                terms = np.where(observed > 0, observed * np.log(observed / expected), 0.)
+                statistic = 2 * terms.sum()
+            else:
+                terms = np.where(expected > 0, (observed - expected) ** 2 / expected, 0.)
+                statistic = terms.sum()
+        # only levels observed within a stratum contribute degrees of freedom
+        dof = int(np.sum(np.clip((n_sx > 0).sum(axis=1) - 1, 0, None) * np.clip((n_sy > 0).sum(axis=1) - 1, 0, None)))
+        p_value = stats.chi2.sf(statistic, dof) if dof > 0 else 1.
+        return float(statistic), dof, float(p_value)
+
+    def get_design(self, columns: Iterable[str], drop_first: bool = True) -> np.ndarray:
+        """Get the design matrix of the columns, where discrete columns are one-hot encoded."""
+        blocks = []
+        for column in sorted(columns):
+            if self.discrete[column]:
+                codes, n_levels = self.get_codes(column)
+                one_hot = np.zeros((self.n, n_levels))
+                one_hot[np.arange(self.n), codes] = 1.
+                blocks.append(one_hot[:, 1:] if drop_first else one_hot)
+            else:
+                blocks.append(self.df[column].to_numpy(dtype=float)[:, None])
+        return np.hstack(blocks) if blocks else np.zeros((self.n, 0))
+
+    def get_basis(self, conditioning_set: frozenset) -> np.ndarray:
+        """Get an orthonormal basis of the column space of the intercept and the conditioning set."""
+        if conditioning_set not in self._bases:
+            design = np.hstack([np.ones((self.n, 1)), self.get_design(conditioning_set)])
+            u, s, _ = np.linalg.svd(design, full_matrices=False)
+            self._bases[conditioning_set] = u[:, s > s.max() * max(design.shape) * np.finfo(float).eps]
+        return self._bases[conditioning_set]
+
+    def regression(self, ci: ConditionalIndependence) -> Tuple[float, int, float]:
+        """
+        F-test if a continuous variable depends on the other variable after regressing both on the conditioning set.
+        By the Frisch-Waugh-Lovell theorem, only the residuals of both with respect to the conditioning set are needed.
+        :return: the F statistic, the degrees of freedom of the other variable and the p-value
+        """
+        target, other = (ci.y, ci.x) if self.discrete[ci.x] else (ci.x, ci.y)
+        basis = self.get_basis(frozenset(ci.conditioning_set))
+        t = self.df[target].to_numpy(dtype=float)
+        o = self.get_design([other])
+        t_res = t - basis @ (basis.T @ t)
+        o_res = o - basis @ (basis.T @ o)
+
+        coefficients, _, rank, _ = np.linalg.lstsq(o_res, t_res, rcond=None)
+        rss_full = np.sum((t_res - o_res @ coefficients) ** 2)
+        rss_reduced = np.sum(t_res ** 2)
+        dof_residual = self.n - basis.shape[1] - rank
+        if rank == 0 or dof_residual <= 0 or rss_full <= 0:
+            return 0., int(rank), 1.
+        statistic = ((rss_reduced - rss_full) / rank) / (rss_full / dof_residual)
+        return float(statistic), int(rank), float(stats.f.sf(statistic, rank, dof_residual))
+
+
+def iter_independence_tests(df: pd.DataFrame,
+        independencies: Union[CausalGraph, Iterable[ConditionalIndependence]],
+        method: Optional[str] = None, batch_size: int = 100) -> Iterator[pd.DataFrame]:
+    """
+    Test the implied independencies batch by batch, so results can be shown while the remaining ones are tested.
+    Independencies involving variables, which are not part of the data, are skipped.
+    :param df: the data, one column per node
+    :param independencies: a causal graph, whose implied independencies are tested, or the independencies themselves
+    :param method: the independence test, see `IndependenceTester.test`
+    :param batch_size: the number of independencies tested at once
+    :return: a generator of result tables
+    """
+    if hasattr(independencies, "implied_independencies"):
+        independencies = independencies.implied_independencies()
+    tester = IndependenceTester(df)
+    batch = []
+    for ci in independencies:
+        if all(v in df.columns for v in (ci.x, ci.y, *ci.conditioning_set)):
+            batch.append(ci)
+        if len(batch) >= batch_size:
+            yield tester.test(batch, method)
+            batch = []
+    if batch:
+        yield tester.test(batch, method)
+
+
+def run_independence_tests(df: pd.DataFrame, independencies: Union[CausalGraph, Iterable[ConditionalIndependence]],
+        method: Optional[str] = None) -> pd.DataFrame:
+    """
+    Test the implied independencies of a causal graph against the data.
+    :param df: the data, one column per node
+    :param independencies: a causal graph, whose implied independencies are tested, or the independencies themselves
+    :param method: the independence test, see `IndependenceTester.test`
+    :return: a table with the test statistic, the degrees of freedom and the p-value of every test
+    """
+    results = list(iter_independence_tests(df, independencies, method, batch_size=10_000))
+    if not results:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    return pd.concat(results, ignore_index=True)
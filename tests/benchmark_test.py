@@ -0,0 +1,17 @@
+import json
+
+from src_py import benchmark
+
+
+class TestBenchmark:
+    def test_writes_json_lines(self, tmp_path):
+        output = tmp_path / "benchmark.jsonl"
+        benchmark.main(["--sizes", "10", "50", "--repeats", "1", "--output", str(output)])
+        benchmark.main(["--kinds", "layered", "--sizes", "10", "--repeats", "1", "--output", str(output)])
+        records = [json.loads(line) for line in output.read_text().splitlines()]
+        operations = {r["operation"] for r in records}
+        assert {"parse", "construct", "update_paths", "check_backdoor_criterion", "get_adjustment_sets",
+                "get_backdoor_paths", "cytoscape", "cytoscape_rerun"} <= operations
+        assert {r["kind"] for r in records} == {"erdos-renyi", "scale-free", "layered"}
+        assert all(r["seconds"] >= 0 and "commit" in r for r in records)
+        assert not any(r["operation"] == "get_backdoor_paths" and r["n_nodes"] == 50 for r in records)
@@ -1,6 +1,12 @@
+import io
+
+import pytest
+
 import sample_dags
 import utils
-from src_py.causal_graph import NodeAttribute, parse_model_string, parse_edges, get_query_from_graph
+from src_py import random_dags
+from src_py.causal_graph import ModelParseError, NodeAttribute, parse_model_string, parse_edges, parse_node, \
+    get_query_from_graph, get_confounder_name, GraphPatch
 
 
 class TestParsingOfEdges:
@@ -20,22 +26,54 @@ class TestParsingOfEdges:
         assert dst == 'b[O]'
 
     def test_parse_edge_with_meta_attribute(self):
-        assert False
+        node = parse_node("C[T, name=College Degree]")
+        assert node.name == "C"
+        assert node.attribute == NodeAttribute.TREATMENT
+        assert node.meta == {"name": "College Degree"}
+
+        model = parse_model_string(["C[T, name=College Degree] -> Y[O]"])
+        assert model.treatment == "C"
+        assert model.graph.nodes["C"]["meta"] == {"name": "College Degree"}
 
     def test_parse_single_edges_per_line(self):
-        assert False
+        model = parse_model_string("x[T] -> m\nm -> y[O]\n")
+        assert set(model.graph.edges) == {("x", "m"), ("m", "y")}
+        assert (model.treatment, model.outcome) == ("x", "y")
 
     def test_parse_multiple_edges_per_line(self):
-        assert False
+        model = parse_model_string(["x[T] -> m; m -> y[O]", "z -> x; z -> y"])
+        assert set(model.graph.edges) == {("x", "m"), ("m", "y"), ("z", "x"), ("z", "y")}
 
     def test_parse_edge_with_unobserved_confounding(self):
-        assert False
+        model = parse_model_string(["x[T]->y[O]", "x--y"])
+        confounder = get_confounder_name("x", "y")
+        assert confounder in model.get_unobserved_nodes()
+        assert set(model.graph.edges) == {("x", "y"), (confounder, "x"), (confounder, "y")}
 
     def test_parse_edge_inverse_direction(self):
-        assert False
+        model = parse_model_string(["y[O] <- x[T]"])
+        assert set(model.graph.edges) == {("x", "y")}
+        assert (model.treatment, model.outcome) == ("x", "y")
 
     def test_parse_edge_chain(self):
-        assert False
+        model = parse_model_string(["x[T] -> m -> y[O] <- z -- x"])
+        confounder = get_confounder_name("x", "z")
+        assert set(model.graph.edges) == {("x", "m"), ("m", "y"), ("z", "y"), (confounder, "x"), (confounder, "z")}
+
+    def test_parse_names_with_spaces_and_hyphens(self):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        assert model.treatment == "Warm-up Exercises"
+        assert ("Team motivation, aggression", "Previous Injury") in model.graph.edges
+
+    def test_parse_file_object(self):
+        model = parse_model_string(io.StringIO("x[T] -> y[O]\nz -> x\n"))
+        assert set(model.graph.edges) == {("x", "y"), ("z", "x")}
+
+    def test_all_errors_are_reported(self):
+        with pytest.raises(ModelParseError) as exc_info:
+            parse_model_string(["a[T] -> b", "c", "d[X] -> e", "f -> g[T]", "h -> i[O"])
+        assert [line for line, _ in exc_info.value.errors] == [2, 3, 4, 5]
+        assert "line 3: Unknown node attribute 'X'" in str(exc_info.value)
 
 
 class Test_BlockedPath:
@@ -103,6 +141,283 @@ class Test_DSeparation:
         assert len(biasing_paths) == 0
 
 
+class Test_DSeparationQuery:
+    def test_chain(self):
+        model = parse_model_string(["x->b", "b->y"])
+        assert not model.d_separated("x", "y")
+        assert model.d_separated("x", "y", {"b"})
+
+    def test_collider(self):
+        model = parse_model_string(["x->b", "y->b", "b->c"])
+        assert model.d_separated("x", "y")
+        assert not model.d_separated("x", "y", {"b"})
+        assert not model.d_separated("x", "y", {"c"})
+
+    def test_m_bias(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["M-bias"])
+        assert model.d_separated("X", "Y", backdoor=True)
+        assert not model.d_separated("X", "Y", {"Z"}, backdoor=True)
+
+    def test_backdoor_ignores_causal_paths(self):
+        model = parse_model_string(["x->m", "m->y", "z->x", "z->y"])
+        assert not model.d_separated("x", "y", {"z"})
+        assert model.d_separated("x", "y", {"z"}, backdoor=True)
+
+    def test_node_sets(self):
+        model = parse_model_string(["a->c", "b->c", "c->d"])
+        assert model.d_separated({"a"}, {"b"})
+        assert not model.d_separated({"a"}, {"b", "d"}, {"c"})
+
+
+class Test_DSeparationBatch:
+    def test_matches_single_queries(self):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        nodes = sorted(model.nodes)
+        queries = [(x, y, {"Coach"}) for x in nodes for y in nodes if x != y] + [(nodes[0], nodes[1])]
+        separated = model.d_separated_many(queries)
+        assert separated.dtype == bool
+        assert list(separated) == [model.d_separated(*q) for q in queries]
+
+    def test_profiling(self):
+        model = parse_model_string(["x->b", "y->b"])
+        separated, timings = model.d_separated_many([("x", "y"), ("x", "y", {"b"})], profile=True)
+        assert list(separated) == [True, False]
+        assert len(timings) == 2
+
+
+class Test_ImpliedIndependencies:
+    def test_chain(self):
+        model = parse_model_string(["a->b", "b->c", "c->d"])
+        independencies = {str(ci) for ci in model.implied_independencies()}
+        assert independencies == {"c ⟂ a | b", "d ⟂ a | c", "d ⟂ b | c"}
+
+    def test_collider(self):
+        model = parse_model_string(["a->c", "b->c"])
+        independencies = [str(ci) for ci in model.implied_independencies()]
+        assert independencies == ["b ⟂ a"]
+
+    def test_unobserved_parents(self):
+        model = parse_model_string(["u[U]->a", "u->b", "b->c", "z->a"])
+        independencies = {str(ci) for ci in model.implied_independencies()}
+        assert independencies == {"z ⟂ b", "z ⟂ c", "a ⟂ c | b, z"}
+
+    def test_is_lazy(self):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        first_independency = next(model.implied_independencies())
+        assert model.d_separated(first_independency.x, first_independency.y, first_independency.conditioning_set)
+
+
+class Test_PathAnnotations:
+    @staticmethod
+    def flagged_edges(model, flag):
+        return {e for e, attrs in model.graph.edges.items() if attrs.get(flag)}
+
+    def test_confounder(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        assert self.flagged_edges(model, "causal") == {("X", "Y")}
+        assert self.flagged_edges(model, "biasing") == {("Z", "X"), ("Z", "Y")}
+
+    def test_adjusting_blocks_biasing_edges(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        model.update_node("Z", NodeAttribute.ADJUSTED)
+        model.update_paths()
+        assert self.flagged_edges(model, "biasing") == set()
+
+    def test_incremental_update_matches_full_update(self):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        model.add_edge("Coach", "Injury")
+        model.delete_edge("Genetics", "Fitness Level")
+        model.update_node("Neuromuscular Fatigue", NodeAttribute.ADJUSTED)
+        model.update_paths()
+        causal, biasing = self.flagged_edges(model, "causal"), self.flagged_edges(model, "biasing")
+
+        model.update_paths(full=True)
+        assert self.flagged_edges(model, "causal") == causal
+        assert self.flagged_edges(model, "biasing") == biasing
+        assert ("Coach", "Injury") in biasing
+
+    def test_edits_update_the_trails_in_place(self):
+        model = random_dags.random_model(random_dags.LAYERED, 300, seed=1)
+        model.update_paths()
+        trails = model._trails
+        order = model.get_topological_order()
+        model.add_edge(order[10], order[290])
+        model.remove_edges([sorted(model.edges)[0]])
+        model.update_node(order[150], NodeAttribute.ADJUSTED)
+        model.update_paths()
+        assert model._trails is trails
+        biasing = self.flagged_edges(model, "biasing")
+
+        model.update_paths(full=True)
+        assert self.flagged_edges(model, "biasing") == biasing
+
+    @pytest.mark.parametrize("model_string, expected", [
+        # the only trails through v4 or v5 return to v0
+        ("v5 -> v4; v5 -> v0[A]; v4 -> v0; v7 -> v0; v7 -> v1[T]; v3[O] -> v0",
+         {("v3", "v0"), ("v7", "v0"), ("v7", "v1")}),
+        ("v0 -> v2; v0 -> v1[A]; v3[O] -> v2; v2 -> v1; v2 -> v6[T]", {("v2", "v6"), ("v3", "v2")}),
+        # v0 lies on every trail to and from v1
+        ("v7 -> v6; v7 -> v1[A]; v5 -> v1; v0 -> v4[T]; v0 -> v2[O]; v0 -> v1; v6 -> v1", {("v0", "v2"), ("v0", "v4")}),
+        # the trails through v3 or v6 are only excluded by searching all of them
+        ("v5[U] -> v2; v5 -> v6[U]; v5 -> v3[U]; v7 -> v2; v7 -> v4[A]; v7 -> v3; v2 -> v1[T]; v2 -> v4; v2 -> v0[O]; "
+         "v2 -> v6; v1 -> v4; v1 -> v6; v4 -> v0; v4 -> v6; v0 -> v6; v0 -> v3; v6 -> v3", {("v2", "v0"), ("v2", "v1")}),
+        # the collider v1 is opened by v4, a descendant of the treatment
+        ("v6 -> v1; v6 -> v2[T]; v0[O] -> v1; v1 -> v2; v2 -> v4[A]",
+         {("v0", "v1"), ("v1", "v2"), ("v6", "v1"), ("v6", "v2")}),
+    ])
+    def test_biasing_edges_lie_on_open_paths(self, model_string, expected):
+        model = parse_model_string(model_string)
+        assert self.flagged_edges(model, "biasing") == expected
+
+
+class Test_QueryCache:
+    def test_mutations_increase_version(self):
+        model = parse_model_string(["a->b", "b->c"])
+        version = model.version
+        model.add_node("d")
+        model.add_edge("c", "d")
+        model.delete_edge("a", "b")
+        model.delete_node("d")
+        assert model.version == version + 4
+
+    def test_role_changes_keep_version(self):
+        model = parse_model_string(["a->b", "b->c"])
+        version = model.version
+        model.update_node("b", NodeAttribute.ADJUSTED)
+        assert model.version == version
+
+    def test_closures_are_invalidated(self):
+        model = parse_model_string(["a->b", "c->d"])
+        assert model.get_descendants("a") == {"b"}
+        assert model.get_ancestors("d") == {"c"}
+        model.add_edge("b", "c")
+        assert model.get_descendants("a") == {"b", "c", "d"}
+        assert model.get_ancestors("d") == {"a", "b", "c"}
+        model.delete_edge("b", "c")
+        assert model.get_descendants("a") == {"b"}
+
+    def test_query_results_are_reused(self):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        paths = model.get_backdoor_paths("Warm-up Exercises", "Injury")
+        assert model.get_backdoor_paths("Warm-up Exercises", "Injury") is paths
+        model.add_edge("Coach", "Injury")
+        assert model.get_backdoor_paths("Warm-up Exercises", "Injury") is not paths
+
+    def test_changes_since_revision(self):
+        model = parse_model_string(["a[T]->b", "b->c[O]"])
+        revision = model.revision
+        assert model.get_changes(revision) == []
+        model.set_node_position("a", 1, 2)
+        model.add_edge("c", "d")
+        model.update_paths()
+        assert set(model.get_changes(revision)) == {"a", "d", ("c", "d")}
+        revision = model.revision
+        model.delete_node("a")
+        assert set(model.get_changes(revision)) == {"a", ("a", "b")}
+
+
+class Test_BulkMutations:
+    @staticmethod
+    def flagged_edges(model, flag):
+        return {e for e, attrs in model.graph.edges.items() if attrs.get(flag)}
+
+    def test_bulk_mutations_match_single_mutations(self):
+        bulk = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        single = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        assert bulk.get_descendants("Coach") == single.get_descendants("Coach")
+
+        bulk.add_edges([("Coach", "Injury"), ("Genetics", "New Node")])
+        bulk.remove_nodes(["Fitness Level", "Contact Sport"])
+        for source, target in [("Coach", "Injury"), ("Genetics", "New Node")]:
+            single.add_edge(source, target)
+        for node in ["Fitness Level", "Contact Sport"]:
+            single.delete_node(node)
+        bulk.update_paths()
+        single.update_paths()
+
+        assert bulk.edges == single.edges == set(bulk.graph.edges)
+        assert bulk.nodes == single.nodes == set(bulk.graph.nodes)
+        for node in bulk.nodes:
+            assert bulk.get_descendants(node) == single.get_descendants(node)
+            assert bulk.get_ancestors(node) == single.get_ancestors(node)
+        for flag in ["causal", "biasing"]:
+            assert self.flagged_edges(bulk, flag) == self.flagged_edges(single, flag)
+
+    def test_remove_nodes_clears_roles(self):
+        model = parse_model_string(["x[T]->y[O]", "z[A]->x", "z->y"])
+        model.remove_nodes(["x", "z"])
+        assert model.treatment is None and model.adjusted == set()
+        assert model.edges == set()
+        with pytest.raises(KeyError):
+            model.remove_nodes(["x"])
+
+    def test_transaction(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        calls = []
+        update_paths = model.update_paths
+        model.update_paths = lambda *args, **kwargs: calls.append(args) or update_paths(*args, **kwargs)
+
+        with model.transaction() as patch:
+            patch.remove_edge("Z", "X")
+            patch.add_node("W")
+            patch.add_edge("W", "X")
+            patch.add_edge("W", "Y")
+            patch.update_node("W", NodeAttribute.ADJUSTED)
+            assert ("W", "X") not in model.graph.edges
+        assert len(calls) == 1
+        assert model.edges == {("X", "Y"), ("Z", "Y"), ("W", "X"), ("W", "Y")}
+        assert model.adjusted == {"W"}
+        assert self.flagged_edges(model, "biasing") == set()
+
+    def test_failed_transaction_is_discarded(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        version = model.version
+        with pytest.raises(RuntimeError):
+            with model.transaction() as patch:
+                patch.add_edge("Y", "W")
+                raise RuntimeError()
+        assert model.version == version
+        assert "W" not in model.graph
+
+    def test_invalid_patch_is_not_applied(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        edges, version = set(model.edges), model.version
+        patch = GraphPatch(removed_edges=[("Z", "X")], removed_nodes=["W"], added_edges=[("Y", "V")])
+        with pytest.raises(KeyError):
+            model.apply_patch(patch)
+        with pytest.raises(KeyError):
+            model.apply_patch(GraphPatch(removed_edges=[("Z", "X"), ("X", "Z")]))
+        assert model.edges == edges and set(model.graph.edges) == edges
+        assert model.version == version
+
+    def test_patch_with_unknown_updated_node_is_not_applied(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        edges, version = set(model.edges), model.version
+        patch = GraphPatch(removed_edges=[("Z", "X")], updated_nodes=[("W", NodeAttribute.ADJUSTED)])
+        with pytest.raises(KeyError):
+            model.apply_patch(patch)
+        with pytest.raises(KeyError):
+            model.apply_patch(GraphPatch(removed_nodes=["Z"], updated_nodes=[("Z", NodeAttribute.ADJUSTED)]))
+        assert model.edges == edges and "W" not in model.adjusted
+        assert model.version == version
+
+        model.apply_patch(GraphPatch(added_edges=[("W", "X")], updated_nodes=[("W", NodeAttribute.ADJUSTED)]))
+        assert "W" in model.adjusted
+
+    def test_patch_creating_a_cycle_is_not_applied(self):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        edges, version = set(model.edges), model.version
+        with pytest.raises(ValueError):
+            model.apply_patch(GraphPatch(added_edges=[("Y", "W"), ("W", "Z")]))
+        with pytest.raises(ValueError):
+            model.apply_patch(GraphPatch(removed_edges=[("Z", "X")], added_edges=[("Y", "Z")]))
+        assert model.edges == edges and model.version == version
+
+        # the reversed edge is removed in the same patch
+        model.apply_patch(GraphPatch(removed_edges=[("X", "Y")], added_edges=[("Y", "X")]))
+        assert ("Y", "X") in model.edges
+
+
 class TestQueryFromCausalGraph:
     def test_simple_collider(self):
         graph = parse_model_string([
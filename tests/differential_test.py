@@ -0,0 +1,49 @@
+import numpy as np
+
+from src_py import differential
+from src_py.causal_graph import parse_model_string
+from src_py.differential import Case, check_case, iter_counterexamples, random_case, shrink
+
+
+class TestDifferential:
+    def test_fast_queries_match_path_enumeration(self):
+        assert list(iter_counterexamples(600, max_nodes=8, seed=0)) == []
+
+    def test_deterministic_for_any_number_of_processes(self):
+        sequential = list(iter_counterexamples(40, ["d_separation", "adjustment_sets"], seed=1))
+        parallel = list(iter_counterexamples(40, ["d_separation", "adjustment_sets"], seed=1, n_jobs=2))
+        assert sequential == parallel
+
+    def test_model_string_round_trip(self):
+        rng = np.random.default_rng(0)
+        for _ in range(20):
+            case = random_case(rng)
+            model = parse_model_string(case.to_model_string())
+            assert model.edges == set(case.edges)
+            assert (model.treatment, model.outcome) == (case.treatment, case.outcome)
+            assert model.adjusted == case.adjusted and model.unobserved == case.unobserved
+
+    def test_shrink_to_minimal_counterexample(self):
+        def collider_is_adjusted(model, rng):
+            # a deliberately wrong property, which fails for every adjusted node with two parents
+            colliders = {n for n in model.adjusted if model.graph.in_degree(n) > 1}
+            return f"adjusted colliders {sorted(colliders)}" if colliders else None
+
+        case = Case((("a", "t"), ("a", "o"), ("a", "b"), ("b", "c"), ("a", "c"), ("c", "d"), ("e", "t"), ("e", "d"),
+                     ("f", "o")), "t", "o", frozenset({"c", "f"}), frozenset({"e"}))
+        assert check_case(case, collider_is_adjusted) is not None
+        shrunk, message = shrink(case, collider_is_adjusted)
+        assert set(shrunk.edges) == {("a", "t"), ("a", "o"), ("b", "c"), ("a", "c")}
+        assert shrunk.adjusted == {"c"} and not shrunk.unobserved
+        assert message == "adjusted colliders ['c']"
+        assert "a -> t[T]" in shrunk.to_model_string()
+
+    def test_exceptions_are_failures(self):
+        def failing(model, rng):
+            raise KeyError("x")
+        case = Case((("a", "b"),), "a", "b")
+        assert check_case(case, failing) == "KeyError: 'x'"
+
+    def test_main(self, capsys):
+        assert differential.main(["--cases", "20", "--properties", "d_separation"]) == 0
+        assert "0 of 1 properties failed" in capsys.readouterr().err
@@ -0,0 +1,66 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from src_py.causal_graph import NodeAttribute, parse_model_string
+from src_py.estimate.bootstrap import INDEX, WEIGHTS, RunningSummary, StreamingQuantile, bootstrap, iter_replicates
+from src_py.estimate.regression import estimate_ate
+from src_py.identify.backdoor import adjust_backdoor
+
+
+def generate_data(n: int = 2000) -> pd.DataFrame:
+    rng = np.random.default_rng(3)
+    z = rng.integers(0, 4, n)
+    x = (rng.random(n) < 0.2 + 0.15 * z).astype(int)
+    y = 2 * x + z + rng.normal(size=n)
+    return pd.DataFrame({"x": x, "y": y, "z": z})
+
+
+def get_model():
+    model = parse_model_string(["z->x[T]", "z->y[O]", "x->y"])
+    model.update_node("z", NodeAttribute.ADJUSTED)
+    return model
+
+
+class TestRunningSummary:
+    def test_streaming_quantiles(self):
+        values = np.random.default_rng(0).normal(size=20000)
+        for p in (0.025, 0.5, 0.975):
+            quantile = StreamingQuantile(p)
+            for value in values:
+                quantile.add(value)
+            assert abs(quantile.value - np.quantile(values, p)) < 0.05
+
+    def test_mean_and_std(self):
+        values = np.random.default_rng(0).normal(size=1000)
+        summary = RunningSummary([0.5])
+        summary.add(values[:300])
+        summary.add(values[300:])
+        assert np.isclose(summary.mean, values.mean())
+        assert np.isclose(summary.std, values.std(ddof=1))
+
+
+class TestBootstrap:
+    def test_confidence_interval(self):
+        df = generate_data()
+        res = bootstrap(df, partial(estimate_ate, graph=get_model()), n_replicates=200)
+        assert res.n_replicates == 200
+        assert res.ci_low < res.estimate < res.ci_high
+        assert res.ci_low < 2 < res.ci_high
+
+    def test_index_and_weight_resampling_agree(self):
+        df = generate_data()
+        estimator = partial(adjust_backdoor, graph=get_model())
+        by_index = bootstrap(df, estimator, n_replicates=50, resampling=INDEX)
+        by_weights = bootstrap(df, estimator, n_replicates=50, resampling=WEIGHTS)
+        assert np.isclose(by_index.std_error, by_weights.std_error)
+        assert np.isclose(by_index.ci_high, by_weights.ci_high)
+
+    def test_deterministic_for_any_number_of_processes(self):
+        df = generate_data(500)
+        estimator = partial(estimate_ate, graph=get_model())
+        sequential = np.concatenate(list(iter_replicates(df, estimator, n_replicates=30, batch_size=7, seed=1)))
+        parallel = np.concatenate(list(iter_replicates(df, estimator, n_replicates=30, batch_size=7, seed=1, n_jobs=2)))
+        assert len(sequential) == 30
+        assert np.allclose(sequential, parallel)
@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src_py.causal_graph import parse_model_string
+from src_py.estimate.propensity import fit_propensity_scores, ipw, match, stratify, _nearest_sorted
+
+
+def generate_confounded_data(n: int = 100000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    z = rng.normal(size=n)
+    w = rng.normal(size=n)
+    x = (rng.random(n) < 1 / (1 + np.exp(-(0.8 * z - 0.5 * w)))).astype(int)
+    y = 2 * x + 1.5 * z + w + rng.normal(size=n)
+    return pd.DataFrame({"x": x, "y": y, "z": z, "w": w})
+
+
+MODEL = ["z->x[T]", "w->x", "z->y[O]", "w->y", "x->y"]
+
+
+class TestPropensityScores:
+    def test_logistic_regression(self):
+        rng = np.random.default_rng(1)
+        z = rng.normal(size=(200000, 1))
+        p = 1 / (1 + np.exp(-(0.5 + 2 * z[:, 0])))
+        t = (rng.random(200000) < p).astype(float)
+        e = fit_propensity_scores(z, t)
+        assert np.abs(e - p).max() < 0.02
+
+    def test_nearest_sorted(self):
+        values = np.array([5., 1., 3.])
+        assert list(_nearest_sorted(values, np.array([0., 2.1, 3.9, 10.]))) == [1, 2, 2, 0]
+
+
+class TestPropensityEstimators:
+    def test_adjustment_set_from_backdoor_criterion(self):
+        res = ipw(generate_confounded_data(1000), parse_model_string(MODEL))
+        assert res.adjustment_set == {"w", "z"}
+
+    def test_ipw(self):
+        res = ipw(generate_confounded_data(), parse_model_string(MODEL))
+        assert abs(res.ate - 2) < 0.05
+
+    def test_stratification(self):
+        res = stratify(generate_confounded_data(), parse_model_string(MODEL), n_strata=20)
+        assert abs(res.ate - 2) < 0.05
+
+    def test_matching(self):
+        model = parse_model_string(MODEL)
+        df = generate_confounded_data()
+        assert abs(match(df, model).ate - 2) < 0.05
+        assert abs(match(df, model, on_covariates=True).ate - 2) < 0.05
+
+    def test_unadjusted_is_biased(self):
+        res = ipw(generate_confounded_data(), parse_model_string(MODEL), adjustment_set=set())
+        assert abs(res.ate - 2) > 0.3
+
+    def test_incomplete_rows_are_skipped(self):
+        model = parse_model_string(MODEL)
+        df = generate_confounded_data(20000)
+        incomplete = df.copy()
+        incomplete.loc[::7, "z"] = np.nan
+        incomplete.loc[3::11, "y"] = np.nan
+        incomplete.loc[5::13, "x"] = np.nan
+        complete = incomplete.dropna()
+        for estimator in [ipw, stratify, match]:
+            res = estimator(incomplete, model)
+            assert np.isclose(res.ate, estimator(complete, model).ate)
+            assert len(res.propensity_scores) == len(complete)
+
+        incomplete["w"] = np.nan
+        with pytest.raises(ValueError):
+            ipw(incomplete, model)
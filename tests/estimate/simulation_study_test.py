@@ -0,0 +1,106 @@
+from functools import partial
+
+import numpy as np
+import pytest
+
+from src_py.causal_graph import NodeAttribute, parse_model_string
+from src_py.estimate.regression import estimate_ate
+from src_py.estimate.simulation_study import EstimationError, EstimatorSummary, SimulationStudy, run_study
+from src_py.simulate import Linear
+
+
+def get_model(adjusted: bool = True):
+    model = parse_model_string(["z->x[T]", "z->y[O]", "x->y"])
+    if adjusted:
+        model.update_node("z", NodeAttribute.ADJUSTED)
+    return model
+
+
+MECHANISMS = {"y": Linear({"x": 2., "z": 3.})}
+
+
+def naive(df):
+    return df["y"][df["x"] > 0].mean() - df["y"][df["x"] <= 0].mean()
+
+
+class TestEstimatorSummary:
+    def test_matches_batch_statistics(self):
+        estimates = np.random.default_rng(0).normal(1.2, 0.5, 500)
+        summary = EstimatorSummary()
+        for estimate in estimates:
+            summary.add(estimate, estimate - 1, estimate + 1, 1.)
+        summary.add(np.nan, np.nan, np.nan, 1.)
+        errors = estimates - 1.
+        assert summary.n == 500 and summary.n_failed == 1
+        assert np.isclose(summary.bias, errors.mean())
+        assert np.isclose(summary.std, estimates.std(ddof=1))
+        assert np.isclose(summary.rmse, np.sqrt(np.mean(errors ** 2)))
+        assert summary.coverage == np.mean(np.abs(errors) <= 1)
+
+
+class TestSimulationStudy:
+    def test_bias_and_coverage(self):
+        model = get_model()
+        estimators = {"regression": partial(estimate_ate, graph=model), "naive": naive}
+        result = run_study(model, estimators, MECHANISMS, n_replicates=200, n_samples=500, seed=1)
+        assert np.isclose(result.true_effect, 2.)
+        frame = result.to_frame()
+        assert abs(frame.loc["regression", "bias"]) < 0.02
+        assert 0.88 < frame.loc["regression", "coverage"] < 0.99
+        assert frame.loc["naive", "bias"] > 1
+        assert np.isnan(frame.loc["naive", "coverage"])
+        assert frame.loc["naive", "rmse"] > frame.loc["regression", "rmse"]
+
+    def test_failed_estimators(self):
+        def failing(df):
+            raise np.linalg.LinAlgError()
+        result = run_study(get_model(), [failing], MECHANISMS, n_replicates=5, n_samples=10, true_effect=2.)
+        assert result.summaries["failing"].n_failed == 5 and result.summaries["failing"].n == 0
+
+    def test_estimation_errors_count_as_failed(self):
+        def failing(df):
+            raise EstimationError("no convergence")
+        result = run_study(get_model(), [failing], MECHANISMS, n_replicates=3, n_samples=10, true_effect=2.)
+        assert result.summaries["failing"].n_failed == 3
+
+    def test_unexpected_errors_are_raised(self):
+        def broken(df):
+            return df["missing"].mean()
+        with pytest.raises(KeyError):
+            run_study(get_model(), [broken], MECHANISMS, n_replicates=2, n_samples=10, true_effect=2.)
+
+    def test_value_errors_are_raised(self):
+        def misconfigured(df):
+            return estimate_ate([df], graph=get_model(), weights=np.ones(len(df)))
+        with pytest.raises(ValueError):
+            run_study(get_model(), [misconfigured], MECHANISMS, n_replicates=2, n_samples=10, true_effect=2.)
+
+    def test_deterministic_for_any_number_of_processes(self):
+        model = get_model()
+        estimators = [partial(estimate_ate, graph=model)]
+        sequential = SimulationStudy(model, estimators, MECHANISMS, n_samples=100, true_effect=2.).run(30, batch_size=7)
+        parallel = SimulationStudy(model, estimators, MECHANISMS, n_samples=100, true_effect=2.).run(30, n_jobs=2)
+        assert sequential.n_replicates == parallel.n_replicates == 30
+        assert np.isclose(sequential.summaries["estimate_ate"].rmse, parallel.summaries["estimate_ate"].rmse)
+
+    def test_resume_from_checkpoint(self, tmp_path):
+        model = get_model()
+        estimators = [partial(estimate_ate, graph=model)]
+        checkpoint = str(tmp_path / "study.json")
+        complete = SimulationStudy(model, estimators, MECHANISMS, n_samples=100, true_effect=2.).run(20)
+
+        study = SimulationStudy(model, estimators, MECHANISMS, n_samples=100, true_effect=2., checkpoint=checkpoint)
+        for result in study.iter_results(20, batch_size=5):
+            if result.n_replicates == 10:
+                break  # interrupted
+        resumed = SimulationStudy(model, estimators, MECHANISMS, n_samples=100, true_effect=2., checkpoint=checkpoint)
+        assert resumed.result.n_replicates == 10
+        result = resumed.run(20, batch_size=5)
+        assert result.n_replicates == 20
+        assert np.isclose(result.summaries["estimate_ate"].rmse, complete.summaries["estimate_ate"].rmse)
+
+        with pytest.raises(ValueError):
+            SimulationStudy(model, estimators, MECHANISMS, n_samples=50, true_effect=2., checkpoint=checkpoint)
+        with pytest.raises(ValueError):
+            SimulationStudy(model, estimators, {"y": Linear({"x": 1., "z": 3.})}, n_samples=100, true_effect=2.,
+                            checkpoint=checkpoint)
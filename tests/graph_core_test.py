@@ -0,0 +1,68 @@
+from src_py.graph_core import BitsetGraph, iter_bits
+
+
+class TestBitsetGraph:
+    def test_interning(self):
+        graph = BitsetGraph(["a", "b"], [("a", "c")])
+        assert len(graph) == 3
+        assert list(iter_bits(graph.mask(["a", "c"]))) == [graph.ids["a"], graph.ids["c"]]
+        assert graph.nodes(graph.mask(["b", "c"])) == {"b", "c"}
+
+    def test_from_ids(self):
+        graph = BitsetGraph.from_ids(["a", "b", "c"], [0, 1], [1, 2])
+        assert graph.ids == {"a": 0, "b": 1, "c": 2}
+        assert graph.nodes(graph.get_descendants(0)) == {"b", "c"}
+        assert graph.has_edge("a", "b") and not graph.has_edge("a", "c")
+
+    def test_closures(self):
+        graph = BitsetGraph(edges=[("a", "b"), ("b", "c"), ("d", "c")])
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b", "c"}
+        assert graph.nodes(graph.get_ancestors(graph.ids["c"])) == {"a", "b", "d"}
+        assert graph.nodes(graph.ancestors(graph.mask(["c"]), ignored_parents=graph.mask(["b"]))) == {"d"}
+
+    def test_closures_follow_mutations(self):
+        graph = BitsetGraph(edges=[("a", "b"), ("c", "d")])
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b"}
+        graph.add_edge("b", "c")
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b", "c", "d"}
+        graph.remove_node("c")
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b"}
+        assert graph.nodes(graph.get_ancestors(graph.ids["d"])) == set()
+
+    def test_bulk_mutations(self):
+        graph = BitsetGraph(edges=[("a", "b"), ("c", "d")])
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b"}
+        graph.add_edges([("b", "c"), ("d", "e")])
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b", "c", "d", "e"}
+        graph.remove_edges([("a", "b"), ("d", "e")])
+        assert graph.nodes(graph.get_ancestors(graph.ids["d"])) == {"b", "c"}
+        graph.remove_nodes(["b", "c"])
+        assert graph.nodes(graph.get_ancestors(graph.ids["d"])) == set()
+        assert not graph.children[graph.ids["a"]] and len(graph) == 3
+
+    def test_without_edges(self):
+        graph = BitsetGraph(edges=[("a", "b"), ("b", "c"), ("d", "e")])
+        graph.get_descendants(graph.ids["a"])
+        graph.get_ancestors(graph.ids["e"])
+        copy = graph.without_edges([("b", "c")])
+        assert copy.ids == graph.ids
+        assert copy.nodes(copy.get_descendants(copy.ids["a"])) == {"b"}
+        # unaffected closures are kept, the original is unchanged
+        assert copy._ancestors[copy.ids["e"]] == graph.mask(["d"])
+        assert graph.nodes(graph.get_descendants(graph.ids["a"])) == {"b", "c"}
+
+    def test_removed_ids_are_reused(self):
+        graph = BitsetGraph(["a", "b"])
+        node_id = graph.ids["a"]
+        graph.remove_node("a")
+        assert graph.add_node("c") == node_id
+        assert "a" not in graph
+
+    def test_d_connection(self):
+        graph = BitsetGraph(edges=[("x", "c"), ("y", "c"), ("c", "d"), ("z", "x"), ("z", "y")])
+        x = graph.mask(["x"])
+        assert graph.nodes(graph.d_connected(x)) == {"x", "c", "d", "z", "y"}
+        assert graph.nodes(graph.d_connected(x, graph.mask(["z"]))) == {"x", "c", "d"}
+        assert graph.nodes(graph.d_connected(x, graph.mask(["z", "d"]))) == {"x", "c", "y"}
+        assert graph.nodes(graph.d_connected(x, backdoor=True)) == {"x", "z", "y", "c", "d"}
+        assert graph.nodes(graph.d_connected(x, graph.mask(["z"]), backdoor=True)) == {"x"}
@@ -1,4 +1,8 @@
-from src_py.identify.backdoor import get_adjustment_sets, check_backdoor_criterion, adjust_backdoor
+import numpy as np
+import pandas as pd
+
+from src_py.identify.backdoor import get_adjustment_sets, iter_adjustment_sets, check_backdoor_criterion, adjust_backdoor, \
+    get_strata
 from src_py.causal_graph import NodeAttribute, parse_model_string
 from src_py.sample_dags import SAMPLE_DAGS
 from src_py.utils import generate_colliderapp_data, generate_confounder_data
@@ -18,6 +22,23 @@ class TestFrontdoorCriterionCheck:
         assert not is_valid
 
 
+class TestBackdoorCriterionCheck:
+    def test_confounder(self):
+        model = parse_model_string(SAMPLE_DAGS["Confounder"])
+        assert not check_backdoor_criterion(model, treatment="X", outcome="Y")
+        assert check_backdoor_criterion(model, treatment="X", outcome="Y", conditioning_set={"Z"})
+
+    def test_m_bias(self):
+        model = parse_model_string(SAMPLE_DAGS["M-bias"])
+        assert check_backdoor_criterion(model, treatment="X", outcome="Y")
+        assert not check_backdoor_criterion(model, treatment="X", outcome="Y", conditioning_set={"Z"})
+
+    def test_post_treatment_node(self):
+        model = parse_model_string(["x[T]->m", "m->y[O]", "x->c", "y->c"])
+        assert check_backdoor_criterion(model, treatment="x", outcome="y")
+        assert not check_backdoor_criterion(model, treatment="x", outcome="y", conditioning_set={"m"})
+
+
 class TestBackdoorAdjustmentSetIdentification:
     def test_simple_collider_backdoor(self):
         model = parse_model_string(["x[T]->y[O]", "w->x", "w->y"])
@@ -59,6 +80,25 @@ class TestBackdoorAdjustmentSetIdentification:
         assert adj_sets[0] == {'E'}
 
 
+class TestBackdoorAdjustmentSetEnumeration:
+    def test_lazy_enumeration(self):
+        model = parse_model_string(SAMPLE_DAGS["big-M"])
+        adj_sets = iter_adjustment_sets(model)
+        first_set = next(adj_sets)
+        assert "Z₁" in first_set
+        assert len(list(adj_sets)) == 3
+
+    def test_all_sets(self):
+        model = parse_model_string(["x[T]->y[O]", "w->x", "w->y", "v->w"])
+        adj_sets = get_adjustment_sets(model, only_minimal_set=False)
+        assert sorted(sorted(s) for s in adj_sets) == [["v", "w"], ["w"]]
+
+    def test_unobserved_nodes_are_not_adjusted(self):
+        model = parse_model_string(["x[T]->y[O]", "u[U]->x", "u->y", "u->w", "w->y"])
+        adj_sets = get_adjustment_sets(model)
+        assert adj_sets == []
+
+
 class TestBackdoorAdjustment:
     def test_collider_app_example(self):
         model_str = SAMPLE_DAGS["ColliderApp"]
@@ -66,9 +106,12 @@ class TestBackdoorAdjustment:
         model.update_node("age", NodeAttribute.ADJUSTED)
 
         df = generate_colliderapp_data(n=1000, seed=777, beta1=1.05, alpha1=0.5, alpha2=0.5)
-        res = adjust_backdoor(df, model)
-        a = 55
-        assert False
+        df["sodium"] = df["sodium"] > df["sodium"].median()
+        df["age"] = pd.cut(df["age"], 5, labels=False)
+        res = adjust_backdoor(df, model, treated=True, control=False)
+        assert list(res.strata["age"]) == list(range(5))
+        assert res.strata["n"].sum() == 1000
+        assert np.isclose(res.strata["weight"].sum(), 1.)
 
     def test_canonical_collider(self):
         model_str = SAMPLE_DAGS["Confounder"]
@@ -76,8 +119,51 @@ class TestBackdoorAdjustment:
         model.update_node("Z", NodeAttribute.ADJUSTED)
 
         df, true_effect = generate_confounder_data(n=10000)
-        res = adjust_backdoor(df, model)
-
-        a = 5
-
-        assert False
+        res = adjust_backdoor(df, model, treated=True, control=False)
+
+        strata = res.strata.set_index("Z")
+        expected = (strata["weight"] * strata["effect"]).sum()
+        assert np.isclose(res.ate, expected)
+        assert np.isclose(res.treated_mean, (strata["weight"] * strata["treated_mean"]).sum())
+
+    def test_multiple_adjustment_columns(self):
+        model = parse_model_string(["z->x[T]", "w->x", "z->y[O]", "w->y", "x->y"])
+        rng = np.random.default_rng(0)
+        n = 100000
+        z, w = rng.integers(0, 3, n), rng.integers(0, 2, n)
+        x = (rng.random(n) < 0.2 + 0.2 * z + 0.1 * w).astype(int)
+        y = 2 * x + z - w + rng.normal(size=n)
+        df = pd.DataFrame({"x": x, "y": y, "z": z, "w": w})
+
+        res = adjust_backdoor(df, model, adjustment_set={"z", "w"})
+        assert len(res.strata) == 6
+        assert abs(res.ate - 2) < 0.05
+        # the naive difference of means is confounded
+        assert abs(y[x == 1].mean() - y[x == 0].mean() - 2) > 0.2
+
+    def test_strata_without_positivity_are_skipped(self):
+        model = parse_model_string(["z->x[T]", "z->y[O]", "x->y"])
+        df = pd.DataFrame({"x": [0, 1, 0, 1, 1], "y": [0., 1., 1., 3., 5.], "z": [0, 0, 1, 1, 2]})
+        res = adjust_backdoor(df, model, adjustment_set={"z"})
+        assert list(res.strata["n_control"]) == [1, 1, 0]
+        assert np.isnan(res.strata["effect"][2])
+        assert np.isclose(res.ate, 1.5)
+
+
+class TestStrata:
+    def test_missing_values(self):
+        df = pd.DataFrame({"a": [1, 0, None, 1], "b": ["u", "v", "u", "u"]})
+        strata, values = get_strata(df, ["a", "b"])
+        assert list(strata) == [1, 0, -1, 1]
+        assert values.to_dict("list") == {"a": [0., 1.], "b": ["v", "u"]}
+
+    def test_many_columns_with_many_values(self):
+        # the combined code of five columns with 2^16 values each exceeds 64 bits
+        n = 2 ** 16
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({f"c{i}": rng.permutation(n) for i in range(5)})
+        df.loc[1, "c1":] = df.loc[0, "c1":].to_numpy()
+        strata, values = get_strata(df, list(df.columns))
+        assert strata[0] != strata[1]
+        assert len(values) == n
+        assert (values.iloc[strata].to_numpy() == df.to_numpy()).all()
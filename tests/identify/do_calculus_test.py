@@ -0,0 +1,60 @@
+import pytest
+
+from src_py.causal_graph import parse_model_string
+from src_py.identify.do_calculus import NotIdentifiableError, Probability, Product, get_adjustment_set, \
+    identify_effect, marginalize
+from src_py.sample_dags import SAMPLE_DAGS
+
+
+class TestExpressions:
+    def test_marginalize_product(self):
+        expression = Product((Probability(frozenset("z")), Probability(frozenset("y"), frozenset("xz"))))
+        assert marginalize(expression, {"y"}) == Probability(frozenset("z"))
+        assert str(marginalize(expression, {"z"})) == "Σ_{z} P(z) P(y | x, z)"
+
+
+class TestIDAlgorithm:
+    def test_backdoor(self):
+        model = parse_model_string(SAMPLE_DAGS["Confounder"])
+        assert str(identify_effect(model)) == "Σ_{Z} P(Z) P(Y | X, Z)"
+
+    def test_no_confounding(self):
+        model = parse_model_string(["x[T]->y[O]", "x->z"])
+        assert identify_effect(model) == Probability(frozenset("y"), frozenset("x"))
+
+    def test_frontdoor(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_frontdoor"])
+        assert str(identify_effect(model)) == "Σ_{M} P(M | X) [Σ_{X} P(X) P(Y | M, X)]"
+        assert get_adjustment_set(model, "X", "Y") == [{"M"}]
+
+    def test_bidirected_edges(self):
+        model = parse_model_string(["x[T]->m", "m->y[O]", "x--y"])
+        assert str(identify_effect(model)) == "Σ_{m} P(m | x) [Σ_{x} P(x) P(y | m, x)]"
+
+    def test_bow_arc_is_not_identifiable(self):
+        model = parse_model_string(["x[T]->y[O]", "x--y"])
+        with pytest.raises(NotIdentifiableError) as error:
+            identify_effect(model)
+        assert error.value.hedge == ({"x", "y"}, {"y"})
+        assert get_adjustment_set(model, "x", "y") == []
+
+    def test_instrument_is_not_identifiable(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_instrument"])
+        with pytest.raises(NotIdentifiableError):
+            identify_effect(model)
+
+    def test_napkin(self):
+        # identifiable, but neither by the backdoor nor by the front-door criterion
+        model = parse_model_string(["w->z", "z->x[T]", "x->y[O]", "w--x", "w--y"])
+        assert identify_effect(model) is not None
+
+    def test_unobserved_treatment(self):
+        model = parse_model_string(["u[U]->y[O]", "x->y"])
+        with pytest.raises(ValueError):
+            identify_effect(model, "u", "y")
+
+    def test_cache_follows_structure(self):
+        model = parse_model_string(["x[T]->y[O]", "z->x", "z->y"])
+        assert str(identify_effect(model)) == "Σ_{z} P(z) P(y | x, z)"
+        model.delete_edge("z", "y")
+        assert identify_effect(model) == Probability(frozenset("y"), frozenset("x"))
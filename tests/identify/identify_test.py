@@ -0,0 +1,69 @@
+import threading
+import time
+
+import pytest
+
+from src_py.causal_graph import parse_model_string
+from src_py.identify import BACKDOOR, CRITERIA, DO_CALCULUS, FRONTDOOR, INSTRUMENT, get_adjustment_set, identify
+from src_py.identify.instrument import Instrument
+from src_py.sample_dags import SAMPLE_DAGS
+
+
+class TestIdentify:
+    def test_frontdoor_model(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_frontdoor"])
+        report = identify(model)
+        assert list(report.criteria) == list(CRITERIA)
+        assert report.identifiable
+        assert not report.criteria[BACKDOOR].identifiable
+        assert report.criteria[FRONTDOOR].sets == [{"M"}]
+        assert report.criteria[DO_CALCULUS].sets == [{"M"}]
+        assert report.estimand is not None
+        assert all(r.complete for r in report.criteria.values())
+
+    def test_instrument_model(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_instrument"])
+        report = identify(model, n_jobs=4)
+        assert report.criteria[INSTRUMENT].sets == [Instrument("Z")]
+        assert not report.criteria[DO_CALCULUS].identifiable
+        assert "hedge" in report.criteria[DO_CALCULUS].error
+
+    def test_concurrent_matches_sequential(self):
+        model = parse_model_string(["a->x[T]", "a->b", "b->y[O]", "c->b", "c->y", "x->m", "m->y", "z->x"])
+        sequential = identify(model)
+        concurrent = identify(model, n_jobs=4)
+        for criterion in CRITERIA:
+            assert sequential.criteria[criterion].sets == concurrent.criteria[criterion].sets
+
+    def test_time_budget(self):
+        # every backdoor path x <- b_i -> c_i -> y is blocked by b_i or c_i, so there are 2^n minimal sets
+        n = 14
+        edges = ["x[T]->y[O]"] + [f"b{i}->x" for i in range(n)] + [f"b{i}->c{i}" for i in range(n)] + \
+            [f"c{i}->y" for i in range(n)]
+        model = parse_model_string(edges)
+        start = time.perf_counter()
+        report = identify(model, criteria=[BACKDOOR], time_budget=0.05)
+        assert time.perf_counter() - start < 1
+        result = report.criteria[BACKDOOR]
+        assert not result.complete
+        assert 0 < len(result.sets) < 2 ** n
+
+    def test_time_budget_stops_id_algorithm(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_frontdoor"])
+        threads = threading.active_count()
+        report = identify(model, n_jobs=4, time_budget=0.)
+        # the workers are joined, so no thread keeps reading the model
+        assert threading.active_count() == threads
+        result = report.criteria[DO_CALCULUS]
+        assert not result.complete and result.error == "time budget exceeded"
+        # the stopped computation isn't cached
+        assert identify(model, criteria=[DO_CALCULUS]).criteria[DO_CALCULUS].identifiable
+
+    def test_unknown_criterion(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_frontdoor"])
+        with pytest.raises(ValueError):
+            identify(model, criteria=["mediation"])
+
+    def test_get_adjustment_set(self):
+        model = parse_model_string(["z->x[T]", "z->y[O]", "x->y"])
+        assert get_adjustment_set(model, "x", "y") == {"backdoor": [{"z"}], "frontdoor": [], "do-calculus": [{"z"}]}
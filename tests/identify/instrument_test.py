@@ -0,0 +1,39 @@
+from src_py.causal_graph import parse_model_string
+from src_py.identify.instrument import Instrument, check_instrument, get_instruments
+from src_py.sample_dags import SAMPLE_DAGS
+
+
+class TestCheckInstrument:
+    def test_canonical_instrument(self):
+        model = parse_model_string(SAMPLE_DAGS["canonical_instrument"])
+        assert check_instrument(model, "Z")
+        assert not check_instrument(model, "U")
+
+    def test_confounded_instrument(self):
+        model = parse_model_string(["w->z", "w->y[O]", "z->x[T]", "x->y"])
+        assert not check_instrument(model, "z")
+        assert check_instrument(model, "z", {"w"})
+
+    def test_descendant_of_mediator_is_no_conditioning_node(self):
+        model = parse_model_string(["z->x[T]", "x->m", "m->y[O]", "m->d", "u[U]->x", "u->y"])
+        assert check_instrument(model, "z")
+        assert not check_instrument(model, "z", {"d"})
+
+
+class TestGetInstruments:
+    def test_unconditional_and_conditional(self):
+        model = parse_model_string(["z1->x[T]", "w->z2", "w->y[O]", "z2->x", "x->y", "u[U]->x", "u->y"])
+        assert set(get_instruments(model)) == {Instrument("z1"), Instrument("z2", frozenset({"w"}))}
+        assert str(Instrument("z2", frozenset({"w"}))) == "z2 | w"
+
+    def test_no_instrument(self):
+        model = parse_model_string(["u[U]->x[T]", "u->y[O]", "x->y", "c->x", "c->y"])
+        assert get_instruments(model) == []
+
+    def test_conditioning_on_collider(self):
+        # z only becomes relevant for x by conditioning on the collider c, which is no ancestor of z or y
+        model = parse_model_string(["z->c", "a->c", "a->x[T]", "x->y[O]", "u[U]->x", "u->y"])
+        instruments = {i.instrument: i for i in get_instruments(model)}
+        assert instruments["a"].conditioning_set == frozenset()
+        assert instruments["z"].conditioning_set == frozenset({"c"})
+        assert check_instrument(model, "z", {"c"})
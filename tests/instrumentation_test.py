@@ -0,0 +1,79 @@
+import json
+
+import pytest
+
+import instrumentation
+import utils
+from src_py.causal_graph import parse_model_string
+from src_py.identify.backdoor import check_backdoor_criterion, get_adjustment_sets
+
+
+@pytest.fixture
+def enabled():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def get_model():
+    return parse_model_string(["z -> x[T]", "z -> y[O]", "x -> m -> y", "w -> x", "w -> y"])
+
+
+class TestInstrumentation:
+    def test_disabled_records_nothing(self):
+        instrumentation.reset()
+        model = get_model()
+        model.get_backdoor_paths("x", "y")
+        assert instrumentation.snapshot() == {"enabled": False, "calls": {}, "counters": {}}
+
+    def test_records_calls_and_paths(self, enabled):
+        model = get_model()
+        assert len(model.get_backdoor_paths("x", "y")) == 2
+        model.get_backdoor_paths("x", "y")  # cached
+        check_backdoor_criterion(model, "x", "y", {"z", "w"})
+        utils.get_cytoscape_params_from_model(model)
+
+        calls = instrumentation.snapshot()["calls"]
+        assert calls["causal_graph.parse_model_string"]["calls"] == 1
+        assert calls["causal_graph.CausalGraph._get_backdoor_paths"]["calls"] == 1
+        assert calls["causal_graph.CausalGraph._get_backdoor_paths"]["items"] == 2
+        assert calls["causal_graph.CausalGraph._to_undirected"]["calls"] == 1
+        assert calls["backdoor.check_backdoor_criterion"]["calls"] == 1
+        assert calls["utils.CytoscapeElements.update"]["items"] == 11  # 5 nodes and 6 edges
+        stats = calls["causal_graph.CausalGraph.update_paths"]
+        assert 0 <= stats["max_seconds"] <= stats["seconds"]
+        assert stats["mean_seconds"] == pytest.approx(stats["seconds"] / stats["calls"])
+
+    def test_generators(self, enabled):
+        model = get_model()
+        assert len(get_adjustment_sets(model, "x", "y")) == 1
+        stats = instrumentation.snapshot()["calls"]["backdoor._iter_minimal_separators"]
+        assert stats["calls"] == 1 and stats["items"] == 1
+
+    def test_query_cache_and_json(self, enabled):
+        model = get_model()
+        model.get_undirected_graph()
+        model.get_undirected_graph()
+        instrumentation.count("paths", 3)
+        exported = json.loads(instrumentation.to_json(model))
+        assert exported["counters"] == {"paths": 3}
+        assert exported["query_cache"]["hits"] >= 1
+        assert 0 < exported["query_cache"]["hit_rate"] <= 1
+        assert exported["closure_cache"]["nodes"] == len(model.nodes)
+
+    def test_closure_cache(self, enabled):
+        model = get_model()
+        for node in model.nodes:
+            model.get_ancestors(node)
+        closures = instrumentation.snapshot(model)["closure_cache"]
+        assert closures["ancestors"] == closures["nodes"] == len(model.nodes)
+
+    def test_timer(self, enabled):
+        with instrumentation.timer("block"):
+            pass
+        instrumentation.disable()
+        with instrumentation.timer("block"):
+            pass
+        assert instrumentation.snapshot()["calls"]["block"]["calls"] == 1
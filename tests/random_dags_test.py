@@ -0,0 +1,40 @@
+import networkx as nx
+import pytest
+
+from src_py import random_dags
+from src_py.causal_graph import parse_model_string
+
+
+class TestRandomDags:
+    @pytest.mark.parametrize("kind", list(random_dags.GENERATORS))
+    def test_acyclic_and_seeded(self, kind):
+        edges = random_dags.GENERATORS[kind](200, seed=1)
+        assert edges == random_dags.GENERATORS[kind](200, seed=1)
+        assert edges != random_dags.GENERATORS[kind](200, seed=2)
+        assert all(int(s[1:]) < int(t[1:]) for s, t in edges)
+        assert len(set(edges)) == len(edges)
+
+    def test_expected_degree(self):
+        edges = random_dags.erdos_renyi_dag(2000, expected_degree=4., seed=0)
+        assert abs(2 * len(edges) / 2000 - 4.) < 0.2
+
+    def test_scale_free_hubs(self):
+        edges = random_dags.scale_free_dag(2000, m=2, seed=0)
+        assert len(edges) == 2 * 2000 - 3
+        degrees = nx.DiGraph(edges).degree()
+        assert max(d for _, d in degrees) > 50
+
+    def test_layered_parents_in_previous_layer(self):
+        edges = random_dags.layered_dag(100, n_layers=10, seed=0)
+        assert all(int(t[1:]) // 10 - int(s[1:]) // 10 == 1 for s, t in edges)
+        assert {int(t[1:]) for _, t in edges} == set(range(10, 100))
+
+    @pytest.mark.parametrize("kind", list(random_dags.GENERATORS))
+    def test_random_model(self, kind):
+        model = random_dags.random_model(kind, 300, seed=0)
+        assert len(model.nodes) == 300 and nx.is_directed_acyclic_graph(model.graph)
+        assert model.treatment in model.get_ancestors(model.outcome)
+
+        parsed = parse_model_string(random_dags.get_model_lines(sorted(model.edges), model.treatment, model.outcome))
+        assert parsed.edges == model.edges
+        assert (parsed.treatment, parsed.outcome) == (model.treatment, model.outcome)
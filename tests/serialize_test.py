@@ -0,0 +1,74 @@
+import io
+
+import numpy as np
+import pytest
+
+import sample_dags
+from src_py.causal_graph import NodeAttribute, parse_model_string
+from src_py.serialize import load_model, save_model
+
+
+def flagged_edges(model, flag):
+    return {e for e, attrs in model.graph.edges.items() if attrs.get(flag)}
+
+
+class TestSerialization:
+    def test_round_trip(self, tmp_path):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["College Wage Premium"])
+        model.update_node("E", NodeAttribute.ADJUSTED)
+        model.set_node_position("C", 10, 20.5)
+        path = tmp_path / "model.npz"
+        save_model(model, str(path))
+
+        loaded = load_model(str(path))
+        assert loaded.nodes == model.nodes and loaded.edges == model.edges
+        assert (loaded.treatment, loaded.outcome) == (model.treatment, model.outcome)
+        assert loaded.adjusted == model.adjusted and loaded.unobserved == model.unobserved
+        for flag in ["causal", "biasing"]:
+            assert flagged_edges(loaded, flag) == flagged_edges(model, flag)
+        assert loaded.graph.nodes["C"]["position"] == {"x": 10, "y": 20.5}
+        assert loaded.graph.nodes["C"]["meta"] == {"name": "College Degree"}
+        assert loaded.graph.nodes["U1"]["observed"] is False
+
+    def test_restored_state_is_usable(self, tmp_path):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        model.delete_node("Contact Sport")
+        model.get_ancestors("Injury")
+        path = tmp_path / "model.npz"
+        save_model(model, str(path))
+
+        loaded = load_model(str(path))
+        for node in model.nodes:
+            assert loaded.get_ancestors(node) == model.get_ancestors(node)
+            assert loaded.get_descendants(node) == model.get_descendants(node)
+        assert loaded.d_separated("Coach", "Genetics") == model.d_separated("Coach", "Genetics")
+
+        loaded.add_edge("Coach", "Injury")
+        loaded.update_paths()
+        causal, biasing = flagged_edges(loaded, "causal"), flagged_edges(loaded, "biasing")
+        loaded.update_paths(full=True)
+        assert flagged_edges(loaded, "causal") == causal and flagged_edges(loaded, "biasing") == biasing
+
+    def test_file_objects_and_plain_loading(self, tmp_path):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["canonical_frontdoor"])
+        buffer = io.BytesIO()
+        save_model(model, buffer)
+        buffer.seek(0)
+        assert load_model(buffer).edges == model.edges
+
+        path = tmp_path / "model.npz"
+        save_model(model, str(path))
+        assert load_model(str(path), mmap=False).edges == model.edges
+        with np.load(str(path)) as data:
+            assert "sources" in data.files
+
+    def test_unsupported_version(self, tmp_path):
+        model = parse_model_string(sample_dags.SAMPLE_DAGS["Confounder"])
+        path = tmp_path / "model.npz"
+        save_model(model, str(path))
+        with np.load(str(path)) as data:
+            arrays = {name: data[name] for name in data.files}
+        arrays["version"] = np.array([99], dtype=np.int32)
+        np.savez(str(path), **arrays)
+        with pytest.raises(ValueError):
+            load_model(str(path))
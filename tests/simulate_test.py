@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src_py.causal_graph import parse_model_string
+from src_py.simulate import Linear, Logistic, StructuralCausalModel, Threshold, simpson_simulator
+from src_py.utils import generate_data
+
+
+def ols(df, outcome, columns):
+    x = np.column_stack([np.ones(len(df))] + [df[c] for c in columns])
+    return np.linalg.lstsq(x, df[outcome], rcond=None)[0]
+
+
+class TestStructuralCausalModel:
+    def test_linear_mechanisms(self):
+        model = parse_model_string(["z->x[T]", "z->y[O]", "x->y"])
+        scm = StructuralCausalModel(model, {"y": Linear({"x": 2., "z": -1.}, intercept=3.)})
+        df = scm.sample(100000, seed=0)
+        assert list(df.columns) == ["z", "x", "y"]
+        assert np.allclose(ols(df, "y", ["x", "z"]), [3., 2., -1.], atol=0.02)
+
+    def test_chunks_match_single_sample(self):
+        model = parse_model_string(["z->x", "x->y", "z->y"])
+        scm = StructuralCausalModel(model, {"x": Logistic({"z": 2.}), "y": Threshold({"x": 1.}, threshold=0.5)})
+        chunks = list(scm.iter_samples(1000, chunk_size=300, seed=1))
+        assert [len(c) for c in chunks] == [300, 300, 300, 100]
+        pd.testing.assert_frame_equal(pd.concat(chunks), scm.sample(1000, seed=1))
+        assert chunks[0]["x"].dtype == bool
+
+    def test_interventions_keep_the_noise(self):
+        model = parse_model_string(["z->x", "x->y"])
+        scm = StructuralCausalModel(model)
+        observed = scm.sample(100, seed=2)
+        intervened = scm.sample(100, seed=2, interventions={"x": 1.})
+        assert (intervened["x"] == 1.).all()
+        assert np.allclose(intervened["z"], observed["z"])
+        assert np.allclose(intervened["y"] - 1., observed["y"] - observed["x"])
+
+    def test_unobserved_nodes_are_dropped(self):
+        model = parse_model_string(["u[U]->x", "u->y", "x->y"])
+        scm = StructuralCausalModel(model)
+        assert list(scm.sample(10, seed=0).columns) == ["x", "y"]
+        assert list(scm.sample(10, seed=0, include_unobserved=True).columns) == ["u", "x", "y"]
+
+    def test_custom_mechanism(self):
+        model = parse_model_string(["x->y"])
+        scm = StructuralCausalModel(model, {"y": lambda parents, n, rng: parents["x"] ** 2})
+        df = scm.sample(50, seed=0)
+        assert np.allclose(df["y"], df["x"] ** 2)
+
+        scm = StructuralCausalModel(model, {"y": lambda parents, n, rng: np.zeros(n + 1)})
+        with pytest.raises(ValueError):
+            scm.sample(10)
+
+    def test_unknown_nodes(self):
+        model = parse_model_string(["x->y"])
+        with pytest.raises(ValueError):
+            StructuralCausalModel(model, {"z": Linear()})
+        with pytest.raises(ValueError):
+            StructuralCausalModel(model).sample(10, interventions={"z": 0})
+
+    def test_generate_data(self):
+        model = parse_model_string(["x->y"])
+        pd.testing.assert_frame_equal(generate_data(20, model, seed=3), StructuralCausalModel(model).sample(20, 3))
+
+
+class TestSimpsonSimulator:
+    def test_sign_flips(self):
+        df = simpson_simulator(1000, seed=1)
+        assert "U" not in df.columns
+        effects = [ols(df, "Y", ["X"] + [f"Z{i}" for i in range(1, k + 1)])[1] for k in range(8)]
+        assert effects[0] > 2 and effects[2] < 0
+        assert np.isclose(effects[-1], 1., atol=0.1)
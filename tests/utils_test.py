@@ -0,0 +1,56 @@
+import networkx as nx
+import pandas as pd
+
+import sample_dags
+from src_py import utils
+from src_py.causal_graph import NodeAttribute, parse_model_string
+
+
+def by_id(elements):
+    return {(e["data"].get("id"), e["data"].get("source"), e["data"].get("target")): e for e in elements}
+
+
+class TestCytoscapeParams:
+    def test_elements_match_cytoscape_data(self):
+        model = parse_model_string(sample_dags.SHRIER_PLATT_2008)
+        model.set_node_position("Coach", 10, 20)
+        elements, _, _, _ = utils.get_cytoscape_params_from_model(model)
+        expected = nx.readwrite.json_graph.cytoscape_data(model.graph)["elements"]
+        for kind in ["nodes", "edges"]:
+            actual = by_id(elements[kind])
+            assert {k: e["data"] for k, e in actual.items()} == {k: e["data"] for k, e in by_id(expected[kind]).items()}
+        coach = next(e for e in elements["nodes"] if e["data"]["id"] == "Coach")
+        assert coach["position"] == {"x": 10, "y": 20}
+
+    def test_elements_are_reused(self):
+        model = parse_model_string(["a[T]->b", "b->c[O]"])
+        elements, style, layout, context_menu = utils.get_cytoscape_params_from_model(model)
+        again, *static = utils.get_cytoscape_params_from_model(model)
+        assert again is elements
+        assert static[0] is style and static[1] is layout and static[2] is context_menu
+
+    def test_only_changed_elements_are_rebuilt(self):
+        model = parse_model_string(["a[T]->b", "b->c[O]", "d->c"])
+        elements, _, _, _ = utils.get_cytoscape_params_from_model(model)
+        unchanged = next(e for e in elements["nodes"] if e["data"]["id"] == "a")
+
+        model.update_node("d", NodeAttribute.ADJUSTED)
+        model.add_edge("c", "e")
+        model.update_paths()
+        elements, _, _, _ = utils.get_cytoscape_params_from_model(model)
+        nodes = {e["data"]["id"]: e for e in elements["nodes"]}
+        assert nodes["a"] is unchanged
+        assert nodes["d"]["data"]["adjusted"] and "e" in nodes
+        assert ("c", "e") in {(e["data"]["source"], e["data"]["target"]) for e in elements["edges"]}
+
+        model.delete_node("d")
+        elements, _, _, _ = utils.get_cytoscape_params_from_model(model)
+        assert {e["data"]["id"] for e in elements["nodes"]} == {"a", "b", "c", "e"}
+        assert ("d", "c") not in {(e["data"]["source"], e["data"]["target"]) for e in elements["edges"]}
+
+
+class TestIsDiscrete:
+    def test_column_types(self):
+        df = pd.DataFrame({"bool": [True, False], "int": [1, 2], "str": ["a", "b"], "float": [0.5, 1.5]})
+        df["category"] = df["str"].astype("category")
+        assert [utils.is_discrete(df[c]) for c in df.columns] == [True, True, True, False, True]
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+from src_py.causal_graph import ConditionalIndependence, parse_model_string
+from src_py import verify
+
+
+def generate_chain_data(n: int, discrete: bool = False) -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    if discrete:
+        a = rng.random(n) < 0.5
+        b = rng.random(n) < np.where(a, 0.8, 0.3)
+        c = rng.random(n) < np.where(b, 0.7, 0.2)
+        return pd.DataFrame({"a": a, "b": b, "c": c}).astype(int)
+    a = rng.normal(size=n)
+    b = a + rng.normal(size=n)
+    c = b + rng.normal(size=n)
+    return pd.DataFrame({"a": a, "b": b, "c": c})
+
+
+class TestIndependenceTests:
+    def test_fisher_z(self):
+        df = generate_chain_data(10000)
+        results = verify.run_independence_tests(df, [
+            ConditionalIndependence("a", "c", frozenset({"b"})),
+            ConditionalIndependence("a", "c"),
+        ])
+        assert list(results["method"]) == [verify.FISHER_Z] * 2
+        assert results["p_value"][0] > 0.01
+        assert results["p_value"][1] < 1e-6
+
+    def test_chi_square(self):
+        df = pd.DataFrame({"x": [0, 0, 1, 1] * 100, "y": [0, 1, 0, 1] * 100})
+        results = verify.run_independence_tests(df, [ConditionalIndependence("x", "y")])
+        assert results["method"][0] == verify.CHI_SQUARE
+        assert results["dof"][0] == 1
+        assert np.isclose(results["statistic"][0], 0.)
+        assert np.isclose(results["p_value"][0], 1.)
+
+    def test_g_test_detects_dependence(self):
+        df = pd.DataFrame({"x": [0, 1] * 100, "y": [0, 1] * 100})
+        results = verify.run_independence_tests(df, [ConditionalIndependence("x", "y")], method=verify.G_TEST)
+        assert results["p_value"][0] < 1e-6
+
+    def test_regression(self):
+        df = generate_chain_data(10000)
+        df["b"] = (df["b"] > 0).astype(int)
+        results = verify.run_independence_tests(df, [ConditionalIndependence("a", "b")])
+        assert results["method"][0] == verify.REGRESSION
+        assert results["p_value"][0] < 1e-6
+
+    def test_chi_square_bins_continuous_conditioning_set(self):
+        rng = np.random.default_rng(0)
+        z = rng.normal(size=10000)
+        x = (z + rng.normal(size=10000) > 0).astype(int)
+        y = (rng.random(10000) < np.where(x == 1, 0.8, 0.2)).astype(int)
+        df = pd.DataFrame({"x": x, "y": y, "z": z, "w": rng.integers(0, 2, 10000)})
+        results = verify.run_independence_tests(df, [
+            ConditionalIndependence("x", "y", frozenset({"z"})),
+            ConditionalIndependence("x", "w", frozenset({"z"})),
+        ])
+        assert list(results["method"]) == [verify.CHI_SQUARE] * 2
+        assert list(results["dof"]) == [5, 5]
+        assert results["p_value"][0] < 1e-6
+        assert results["p_value"][1] > 0.01
+
+    def test_implied_independencies_of_graph(self):
+        model = parse_model_string(["a->b", "b->c"])
+        results = verify.run_independence_tests(generate_chain_data(10000, discrete=True), model)
+        assert list(results["independence"]) == ["c ⟂ a | b"]
+        assert results["p_value"][0] > 0.01